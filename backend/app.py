@@ -1,8 +1,6 @@
-from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi import FastAPI, Request, Response, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from bs4 import BeautifulSoup
-import requests
 import openai
 import os
 from dotenv import load_dotenv
@@ -10,17 +8,58 @@ import httpx
 from datetime import datetime, timedelta
 import urllib.parse
 import asyncio
-from typing import Optional, Dict, Any
+import itertools
+from typing import Optional, Dict, Any, Awaitable, Callable, List
 import time
+from contextlib import asynccontextmanager
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from validation import (
    validate_stocks_request,
+   validate_bar_options,
+   validate_stream_format,
    validate_news_request,
    validate_finnhub_request,
    validate_search_request,
-   TimeoutMiddleware
+   validate_suggest_request,
+   validate_symbol,
+   VALID_SYMBOLS,
+   COMPANY_NAMES
+)
+from cache import CacheSweeper, SingleFlight
+from cache_backends import CacheBackend, MemoryBackend, create_backend
+from snapshot import SnapshotManager
+from upstream import HostConfig, UpstreamPool, TokenBucket, env_bool, env_float, env_int
+from budget import BudgetExhausted, PriorityBucket, UpstreamBudget, background_priority
+from breaker import CircuitOpen
+from deadline import DeadlineExceeded, deadline_scope
+from prewarm import DemandTracker, PrewarmScheduler, WarmTarget
+from bars import BarStore, columns_to_bars, date_window, shape_bars, shard_range, to_rfc3339
+from batch import (
+   error_detail,
+   error_item,
+   event_stream_response,
+   gather_bounded,
+   ok_item,
+   stream_bounded,
+   streaming_response,
+)
+from headlines import extract_headlines_async
+from responses import ResponseCache
+from middleware import CacheControlMiddleware, RequestContextMiddleware, TimeoutMiddleware
+from news_index import NewsIndex, NewsIngester
+from symbols import SymbolIndex
+from sentiment import (
+   SENTIMENT_ERROR_MESSAGE,
+   SHED_ERRORS,
+   LLMGate,
+   SentimentBatcher,
+   SentimentMemo,
+   analyze_with_memo,
+   memoized_sentiment,
+   parse_score,
+   stream_headlines_analysis,
 )
 
 load_dotenv()
@@ -29,18 +68,36 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
    raise RuntimeError("OPENAI_API_KEY is not set in environment")
 
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-app = FastAPI(
-   title="News Sentiment API",
-   max_request_size=1_000_000
-)
-
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
-# Cache times for each API
+client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# Outbound rate budgets per provider, set a little under each plan's quota.
+# User-facing misses are served before background refreshes, which also
+# leave a reserve untouched; a user call that would wait more than
+# UPSTREAM_MAX_WAIT_SECONDS is answered with 429 instead of queueing.
+UPSTREAM_MAX_WAIT = env_float("UPSTREAM_MAX_WAIT_SECONDS", 10.0)
+MARKETAUX_CALLS_PER_DAY = env_int("MARKETAUX_CALLS_PER_DAY", 100)
+# Background MarketAux work (news ingest, news prewarm) gets daily
+# allowances that add up to at most the quota less this user reserve
+MARKETAUX_USER_RESERVE_PER_DAY = env_int("MARKETAUX_USER_RESERVE_PER_DAY", 25)
+upstream_budget = UpstreamBudget({
+   "alpaca": PriorityBucket(
+       "alpaca", env_int("ALPACA_CALLS_PER_MINUTE", 190) / 60.0, 40, max_wait=UPSTREAM_MAX_WAIT
+   ),
+   "finnhub": PriorityBucket(
+       "finnhub", env_int("FINNHUB_CALLS_PER_MINUTE", 55) / 60.0, 15, max_wait=UPSTREAM_MAX_WAIT
+   ),
+   "marketaux": PriorityBucket(
+       "marketaux", MARKETAUX_CALLS_PER_DAY / 86400.0, 10, max_wait=UPSTREAM_MAX_WAIT
+   ),
+   "openai": PriorityBucket(
+       "openai", env_int("OPENAI_REQUESTS_PER_MINUTE", 450) / 60.0, 30, max_wait=UPSTREAM_MAX_WAIT
+   ),
+})
+
+# Caps concurrent OpenAI calls; excess /search misses queue on the event loop
+llm_gate = LLMGate(env_int("LLM_CONCURRENCY", 8), budget=lambda: upstream_budget.acquire("openai"))
+
+# Cache times for each API (soft TTL: entries are fresh for this long)
 CACHE_TIMES = {
    "news": 24,
    "finnhub": 24,
@@ -49,40 +106,238 @@ CACHE_TIMES = {
 }
 CACHE_SECONDS = {key: hours * 3600 for key, hours in CACHE_TIMES.items()}
 
-# Cache dictionaries
-news_cache = {}
-finnhub_cache = {}
-search_cache = {}
-stocks_cache = {}
+# Extra hours past CACHE_TIMES during which a stale entry is still served
+# while one background refresh runs (hard TTL = CACHE_TIMES + STALE_TIMES)
+STALE_TIMES = {
+   "news": 24,
+   "finnhub": 24,
+   "search": 4,
+   "stocks": 0.1
+}
+STALE_SECONDS = {key: hours * 3600 for key, hours in STALE_TIMES.items()}
+HARD_TTL_SECONDS = {key: CACHE_SECONDS[key] + STALE_SECONDS[key] for key in CACHE_SECONDS}
+
+# Per-namespace bounds; LRU entries are evicted once either limit is hit
+CACHE_LIMITS = {
+   "news": {"max_entries": 500, "max_bytes": 64 * 1024 * 1024},
+   "finnhub": {"max_entries": 500, "max_bytes": 32 * 1024 * 1024},
+   "search": {"max_entries": 500, "max_bytes": 4 * 1024 * 1024},
+   "stocks": {"max_entries": 2000, "max_bytes": 64 * 1024 * 1024},
+   "sentiment": {"max_entries": 5000, "max_bytes": 16 * 1024 * 1024},
+   "negative": {"max_entries": 2000, "max_bytes": 8 * 1024 * 1024},
+}
+CACHE_SWEEP_SECONDS = 60
+
+
+def make_cache(cache_type: str, ttl_seconds: Optional[float] = None) -> CacheBackend:
+   """Build a namespace's cache from CACHE_BACKEND_<NAME> (or CACHE_BACKEND)"""
+   default_kind = os.getenv("CACHE_BACKEND", "memory")
+   kind = os.getenv(f"CACHE_BACKEND_{cache_type.upper()}", default_kind).lower()
+   print(f"Cache backend for {cache_type}: {kind}")
+   if ttl_seconds is None:
+       ttl_seconds = HARD_TTL_SECONDS[cache_type]
+   return create_backend(kind, cache_type, ttl_seconds, CACHE_LIMITS[cache_type])
+
+
+# Cache stores
+news_cache = make_cache("news")
+finnhub_cache = make_cache("finnhub")
+search_cache = make_cache("search")
+stocks_cache = make_cache("stocks")
+
+# Sentiment text keyed by headline content rather than by company and time:
+# an unchanged headline set skips the OpenAI call
+SENTIMENT_MEMO_HOURS = env_int("SENTIMENT_MEMO_HOURS", 72)
+sentiment_memo = SentimentMemo(make_cache("sentiment", SENTIMENT_MEMO_HOURS * 3600))
+
+# Background refreshes analyze many companies per OpenAI call
+sentiment_batcher = SentimentBatcher(
+   client, llm_gate, sentiment_memo,
+   max_companies=env_int("SENTIMENT_BATCH_COMPANIES", 8),
+   max_headlines=env_int("SENTIMENT_BATCH_HEADLINES", 60),
+)
 
-def is_cache_valid(cache_entry: dict, cache_type: str) -> bool:
-   if not cache_entry:
-       return False
-   expiration_seconds = CACHE_SECONDS.get(cache_type, 3600)
-   return (time.time() - cache_entry["timestamp"]) < expiration_seconds
+# Short-lived answers for symbols the upstream has no (or too little) data
+# for, so they don't cost a full upstream fetch on every view
+NEGATIVE_CACHE_MINUTES = env_int("NEGATIVE_CACHE_MINUTES", 30)
+negative_cache = make_cache("negative", NEGATIVE_CACHE_MINUTES * 60)
 
+ALL_CACHES = [
+   news_cache, finnhub_cache, search_cache, stocks_cache,
+   sentiment_memo.backend, negative_cache,
+]
 
-def get_cached_data(cache_dict: dict, key: str, cache_type: str):
-   cache_entry = cache_dict.get(key)
-   if cache_entry and is_cache_valid(cache_entry, cache_type):
+# Endpoint results encoded once (orjson, gzip/br, ETag) and reused on hits
+response_cache = ResponseCache(
+   ttl_seconds=max(HARD_TTL_SECONDS.values()),
+   max_entries=env_int("RESPONSE_CACHE_ENTRIES", 2000),
+   max_bytes=env_int("RESPONSE_CACHE_MB", 64) * 1024 * 1024,
+)
+
+cache_sweeper = CacheSweeper(ALL_CACHES, interval=CACHE_SWEEP_SECONDS)
+
+# Long-lived in-memory namespaces are snapshotted to disk so a deploy or
+# crash doesn't cold-start them; point CACHE_SNAPSHOT_DIR at a volume
+SNAPSHOT_NAMESPACES = ("news", "finnhub", "search", "sentiment")
+snapshots = SnapshotManager(
+   [cache for cache in ALL_CACHES if cache.name in SNAPSHOT_NAMESPACES and isinstance(cache, MemoryBackend)],
+   directory=os.getenv("CACHE_SNAPSHOT_DIR", os.path.join(os.getenv("CACHE_DIR", ".cache"), "snapshots")),
+   interval=float(os.getenv("CACHE_SNAPSHOT_SECONDS", 600)),
+)
+
+# Concurrent misses for the same cache key share one upstream fetch
+inflight = SingleFlight()
+
+# Request counts per symbol; the prewarm scheduler refreshes hot symbols first
+demand = DemandTracker()
+SYMBOLS_BY_NAME = {name: symbol for symbol, name in COMPANY_NAMES.items()}
+
+
+def news_cache_key(symbol: str, canonical_name: str) -> str:
+   return f"news_{symbol.lower()}_{canonical_name.lower()}"
+
+
+def finnhub_cache_key(symbol: str, canonical_name: str) -> str:
+   return f"finnhub_{symbol.lower()}_{canonical_name.lower()}"
+
+
+def search_cache_key(company: str) -> str:
+   return f"search_{company.lower()}"
+
+# One pooled client per upstream host, opened in the lifespan hook. Alpaca
+# and Finnhub reads are idempotent, so their slow tail is hedged
+upstreams = UpstreamPool({
+   "alpaca": HostConfig("alpaca", timeout=10.0, hedge=True),
+   "marketaux": HostConfig("marketaux", timeout=20.0),
+   "finnhub": HostConfig("finnhub", timeout=10.0, hedge=True),
+   "google": HostConfig("google", timeout=10.0),
+}, budget=upstream_budget)
+
+
+async def get_cached_data(cache_dict: CacheBackend, key: str, cache_type: str):
+   """Return (data, age_seconds, stale) for a live entry, or None on a hard miss"""
+   cache_entry = await cache_dict.get(key)
+   if cache_entry:
+       age = time.time() - cache_entry.timestamp
+       stale = age >= CACHE_SECONDS.get(cache_type, 3600)
        hours_valid = CACHE_TIMES.get(cache_type, 1)
-       print(f"Cache HIT for {cache_type} key: {key} (valid for {hours_valid}h)")
-       return cache_entry["data"]
-   elif cache_entry:
-       del cache_dict[key]
-       print(f"Cache EXPIRED for {cache_type} key: {key}")
-   else:
-       print(f"Cache MISS for {cache_type} key: {key}")
+       state = "STALE" if stale else "HIT"
+       print(f"Cache {state} for {cache_type} key: {key} (age {int(age)}s, fresh for {hours_valid}h)")
+       return cache_entry.data, age, stale
+   print(f"Cache MISS for {cache_type} key: {key}")
    return None
 
 
-def set_cached_data(cache_dict: dict, key: str, data, cache_type: str):
-   cache_dict[key] = {
-       "data": data,
-       "timestamp": time.time()
-   }
+async def set_cached_data(cache_dict: CacheBackend, key: str, data, cache_type: str):
    hours_valid = CACHE_TIMES.get(cache_type, 1)
-   print(f"Cache SET for {cache_type} key: {key} (valid for {hours_valid}h)")
+   if await cache_dict.set(key, data):
+       print(f"Cache SET for {cache_type} key: {key} (valid for {hours_valid}h)")
+   else:
+       print(f"Cache SKIP for {cache_type} key: {key} (not stored by {cache_dict.kind} backend)")
+
+
+cache_serves = {name: {"hit": 0, "stale": 0, "miss": 0, "revalidations": 0} for name in CACHE_TIMES}
+revalidation_tasks = set()
+
+
+def schedule_revalidation(key: str, cache_type: str, fetch: Callable[[], Awaitable[Any]]):
+   """Refresh a stale entry in the background, at most once per key at a time"""
+   if inflight.running(key):
+       return
+   cache_serves[cache_type]["revalidations"] += 1
+
+   async def revalidate():
+       try:
+           # Detached from the request that noticed the stale entry: its
+           # deadline doesn't apply
+           with background_priority(), deadline_scope(None):
+               await inflight.do(key, fetch)
+       except Exception as e:
+           print(f"Revalidation failed for {cache_type} key: {key}: {type(e).__name__}")
+
+   task = asyncio.create_task(revalidate())
+   revalidation_tasks.add(task)
+   task.add_done_callback(revalidation_tasks.discard)
+
+
+async def read_through(
+   cache_dict: CacheBackend,
+   key: str,
+   cache_type: str,
+   fetch: Callable[[], Awaitable[Any]]
+):
+   """Stale-while-revalidate read returning (data, state, age_seconds).
+
+   Fresh and stale hits return immediately (a stale hit also schedules one
+   background refresh); hard misses wait on a coalesced upstream fetch.
+   """
+   cached = await get_cached_data(cache_dict, key, cache_type)
+   if cached:
+       data, age, stale = cached
+       if data:
+           cache_serves[cache_type]["stale" if stale else "hit"] += 1
+           if stale:
+               schedule_revalidation(key, cache_type, fetch)
+           return data, "STALE" if stale else "HIT", age
+
+   cache_serves[cache_type]["miss"] += 1
+   result = await inflight.do(key, fetch)
+   return result, "MISS", 0
+
+
+async def serve_cached(
+   cache_dict: CacheBackend,
+   key: str,
+   cache_type: str,
+   fetch: Callable[[], Awaitable[Any]],
+   request: Request
+) -> Response:
+   """read_through() for a single endpoint, as a pre-encoded response that
+   reports the cache state in headers"""
+   data, state, age = await read_through(cache_dict, key, cache_type, fetch)
+   return response_cache.respond(request, key, data, cache_headers(state, age))
+
+
+def cache_headers(state: str, age: float) -> Dict[str, str]:
+   return {
+       "Age": str(int(age)),
+       "X-Cache": state,
+       "X-Cache-Stale": "true" if state == "STALE" else "false",
+   }
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+   await upstreams.start()
+   snapshots.load()
+   snapshots.start()
+   cache_sweeper.start()
+   if NEWS_INDEX_ENABLED:
+       news_ingester.load()
+       news_ingester.start()
+   if PREWARM_ENABLED:
+       prewarm.start()
+   yield
+   await prewarm.stop()
+   if NEWS_INDEX_ENABLED:
+       await news_ingester.stop()
+   await cache_sweeper.stop()
+   await snapshots.stop()
+   await upstreams.close()
+   await client.close()
+   for cache in ALL_CACHES:
+       await cache.close()
+
+
+app = FastAPI(
+   title="News Sentiment API",
+   max_request_size=1_000_000,
+   lifespan=lifespan
+)
+
+limiter = Limiter(key_func=get_remote_address)
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 FRONTEND_ORIGINS = [
    #"http://localhost:5173",
@@ -91,15 +346,30 @@ FRONTEND_ORIGINS = [
    "https://scout-reels.vercel.app",
 ]
 
+# The symbol universe only changes with a deploy
+SYMBOLS_CACHE_SECONDS = 3600
+
+# Browser/CDN caching mirrors the server-side fresh and stale windows
+app.add_middleware(
+   CacheControlMiddleware,
+   cache_seconds={
+       f"/{cache_type}/": (CACHE_SECONDS[cache_type], STALE_SECONDS[cache_type])
+       for cache_type in ("stocks", "news", "finnhub")
+   } | {"/symbols/": (SYMBOLS_CACHE_SECONDS, SYMBOLS_CACHE_SECONDS)},
+   minimum_size=env_int("COMPRESS_MIN_BYTES", 1024),
+)
+
 app.add_middleware(
    CORSMiddleware,
    allow_origins=FRONTEND_ORIGINS,
    allow_credentials=True,
    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
    allow_headers=["*"],
+   expose_headers=["Age", "ETag", "Server-Timing", "X-Cache", "X-Cache-Stale", "X-Request-ID"],
 )
 
 app.add_middleware(TimeoutMiddleware)
+app.add_middleware(RequestContextMiddleware)
 
 class CompanyRequest(BaseModel):
    company: str
@@ -110,71 +380,365 @@ class CompanyRequest(BaseModel):
 # ============================================================================
 
 
+async def scrape_headlines(company: str) -> list:
+   """Top Google News headlines for a company"""
+   search_url = f"https://www.google.com/search?q={company}+news&tbm=nws"
+   resp = await upstreams.get("google", search_url, follow_redirects=True)
+   return await extract_headlines_async(resp.content)
+
+
+def sentiment_result(company: str, headlines: list, sentiment: str) -> dict:
+   """The /search result"""
+   return {
+       "sentiment": sentiment,
+       "headlines": headlines,
+       "company": company,
+   }
+
+
+async def fetch_sentiment(company: str, cache_key: str) -> dict:
+   """Scrape headlines and run OpenAI sentiment analysis, caching the result"""
+   headlines = await scrape_headlines(company)
+
+   if not headlines:
+       raise HTTPException(status_code=404, detail="No news found")
+
+   sentiment_analysis = await analyze_with_memo(client, llm_gate, sentiment_memo, company, headlines)
+
+   result = sentiment_result(company, headlines, sentiment_analysis)
+   # An API error is answered but not cached, so the next request retries
+   if sentiment_analysis != SENTIMENT_ERROR_MESSAGE:
+       await set_cached_data(search_cache, cache_key, result, "search")
+   return result
+
+
 @app.post("/search")
 @limiter.limit("20/minute")  # Lower limit for expensive OpenAI calls
 @limiter.limit("300/day")
-def handle_search(payload: CompanyRequest, request: Request):
+async def handle_search(payload: CompanyRequest, request: Request):
    """POST /search - OpenAI sentiment analysis (2 hour cache)"""
    try:
        company = validate_search_request(request, payload.company)
       
-       cache_key = f"search_{company.lower()}"
-       cached_result = get_cached_data(search_cache, cache_key, "search")
-       if cached_result:
-           return cached_result
+       demand.record(SYMBOLS_BY_NAME.get(company, company))
 
+       cache_key = search_cache_key(company)
+       return await serve_cached(
+           search_cache, cache_key, "search",
+           lambda: fetch_sentiment(company, cache_key), request
+       )
 
-       search_url = f"https://www.google.com/search?q={company}+news&tbm=nws"
-       resp = requests.get(search_url, timeout=10.0)
-       soup = BeautifulSoup(resp.content, "html.parser")
-       headlines = [h3.get_text(strip=True) for h3 in soup.find_all("h3")][:10]
 
+   except HTTPException:
+       raise
+   except Exception as e:
+       print(f"Error in /search: {type(e).__name__}: {str(e)}")
+       raise HTTPException(status_code=500, detail="Internal server error")
 
-       if not headlines:
-           raise HTTPException(status_code=404, detail="No news found")
 
+async def refresh_sentiments(companies: List[str], charge=None) -> List[str]:
+   """search_cache refresh for many companies: scrape each company's
+   headlines, analyze them in grouped prompts, cache every result.
+
+   Runs through inflight: a company a user miss is already fetching is
+   joined rather than refetched, and a user miss arriving meanwhile joins
+   the batch. ``charge`` is awaited per LLM call. Returns the companies
+   left uncached (no news, a failed fetch or an analysis error)."""
+   companies_by_key = {search_cache_key(company): company for company in companies}
+
+   async def fetch_batch(keys: List[str]) -> Dict[str, Any]:
+       batch = [companies_by_key[key] for key in keys]
+       scraped = await gather_bounded(batch, scrape_headlines, BATCH_CONCURRENCY, on_error=lambda company, e: [])
+       items = {company: headlines for company, headlines in zip(batch, scraped) if headlines}
+       sentiments = await sentiment_batcher.analyze_many(items, charge)
+
+       results: Dict[str, Any] = {}
+       for key, company in zip(keys, batch):
+           if company not in sentiments:
+               results[key] = HTTPException(status_code=404, detail="No news found")
+               continue
+           results[key] = sentiment_result(company, items[company], sentiments[company])
+           if sentiments[company] != SENTIMENT_ERROR_MESSAGE:
+               await set_cached_data(search_cache, key, results[key], "search")
+       return results
+
+   results = await inflight.do_many(list(companies_by_key), fetch_batch)
+   return [
+       company for key, company in companies_by_key.items()
+       if not isinstance(results.get(key), dict) or results[key]["sentiment"] == SENTIMENT_ERROR_MESSAGE
+   ]
+
+
+async def fetch_sentiment_streaming(company: str, cache_key: str, events: asyncio.Queue) -> dict:
+   """fetch_sentiment that also relays headlines, completion tokens and the
+   score (as soon as its line appears) to events"""
+   headlines = await scrape_headlines(company)
+
+   if not headlines:
+       raise HTTPException(status_code=404, detail="No news found")
+   events.put_nowait(("headlines", {"headlines": headlines}))
+
+   text = ""
+   score = None
+   memoized = await memoized_sentiment(sentiment_memo, company, headlines)
+   try:
+       if memoized is not None:
+           text = memoized
+           events.put_nowait(("token", {"text": text}))
+           score = parse_score(text)
+           if score is not None:
+               events.put_nowait(("score", {"score": score}))
+       else:
+           async for delta in stream_headlines_analysis(client, llm_gate, company, headlines):
+               text += delta
+               events.put_nowait(("token", {"text": delta}))
+               if score is None:
+                   score = parse_score(text)
+                   if score is not None:
+                       events.put_nowait(("score", {"score": score}))
+           sentiment_memo.llm_calls += 1
+           await sentiment_memo.put_set(company, headlines, text.strip())
+   except SHED_ERRORS:
+       raise
+   except Exception as ai_error:
+       print(f"OpenAI API error: {ai_error}")
+       text = SENTIMENT_ERROR_MESSAGE
+       events.put_nowait(("reset", {"text": text}))
+
+   result = sentiment_result(company, headlines, text.strip())
+   if text != SENTIMENT_ERROR_MESSAGE:
+       await set_cached_data(search_cache, cache_key, result, "search")
+   return result
+
+
+async def search_events(company: str, cache_key: str):
+   """(event, payload) pairs for /search/stream: score and result straight
+   from the cache on a hit, otherwise the live analysis as it streams"""
+   cached = await get_cached_data(search_cache, cache_key, "search")
+   if cached and cached[0]:
+       data, _, stale = cached
+       cache_serves["search"]["stale" if stale else "hit"] += 1
+       if stale:
+           schedule_revalidation(cache_key, "search", lambda: fetch_sentiment(company, cache_key))
+       score = parse_score(data.get("sentiment", ""))
+       if score is not None:
+           yield "score", {"score": score}
+       yield "result", {"cache": "STALE" if stale else "HIT", "data": data}
+       return
+
+   cache_serves["search"]["miss"] += 1
+   # If another request already started this fetch, inflight joins it and
+   # only the result event is sent
+   events: asyncio.Queue = asyncio.Queue()
+   task = asyncio.ensure_future(
+       inflight.do(cache_key, lambda: fetch_sentiment_streaming(company, cache_key, events))
+   )
+   try:
+       while True:
+           getter = asyncio.ensure_future(events.get())
+           done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+           if getter in done:
+               yield getter.result()
+               continue
+           getter.cancel()
+           break
+       while not events.empty():
+           yield events.get_nowait()
 
-       prompt = (
-           f"Analyze the sentiment of the following news headlines about {company}'s stock. "
-           "Provide a short summary of the sentiment and calculate the average sentiment score on a scale "
-           "of 0 (negative) to 10 (positive). Return only the summary in bullet points with specific yet short & concise "
-           "news examples and the average sentiment score as a number. Output should be in the exact format of: "
-           "Average Sentiment Score: _/10. Then the summary."
-       )
+       try:
+           result = task.result()
+       except Exception as e:
+           if not isinstance(e, HTTPException):
+               print(f"Error in /search/stream: {type(e).__name__}")
+           yield "error", error_detail(e)
+           return
+       yield "result", {"cache": "MISS", "data": result}
+   finally:
+       # The fetch itself is shielded by inflight and still fills the cache
+       task.cancel()
+
+
+@app.post("/search/stream")
+@limiter.limit("20/minute")
+@limiter.limit("300/day")
+async def handle_search_stream(payload: CompanyRequest, request: Request, stream: Optional[str] = None):
+   """POST /search/stream - /search relaying the completion as it is generated.
 
+   Events: headlines, token (text deltas), score (as soon as the "Average
+   Sentiment Score" line is complete), reset (the text was replaced by an
+   error message), then result or error. SSE by default, ?stream=ndjson
+   for NDJSON.
+   """
+   fmt = validate_stream_format(stream) or "sse"
+   company = validate_search_request(request, payload.company)
 
-       try:
-           ai_response = client.chat.completions.create(
-               model="gpt-4o",
-               messages=[
-                   {"role": "system", "content": prompt},
-                   {"role": "user", "content": ", ".join(headlines)},
-               ],
-           )
-           sentiment_analysis = ai_response.choices[0].message.content.strip()
-       except Exception as ai_error:
-           print(f"OpenAI API error: {ai_error}")
-           sentiment_analysis = "Unable to analyze sentiment due to API error."
+   demand.record(SYMBOLS_BY_NAME.get(company, company))
 
+   return event_stream_response(search_events(company, search_cache_key(company)), fmt)
 
-       result = {
-           "sentiment": sentiment_analysis,
-           "headlines": headlines,
-           "company": company,
-       }
 
 
-       set_cached_data(search_cache, cache_key, result, "search")
-       return result
 
+ALPACA_PAGE_LIMIT = 10000
+# Concurrent shard requests across all /stocks calls in this worker
+alpaca_shards = asyncio.Semaphore(env_int("ALPACA_SHARD_CONCURRENCY", 6))
+# Shards one fetch may fan out to (multi-symbol fetches use smaller shards,
+# so a wide batch can exceed what validation allows for one symbol)
+ALPACA_MAX_SHARDS = env_int("ALPACA_MAX_SHARDS", 40)
 
-   except HTTPException:
-       raise
-   except Exception as e:
-       print(f"Error in /search: {type(e).__name__}: {str(e)}")
-       raise HTTPException(status_code=500, detail="Internal server error")
+
+def alpaca_headers() -> dict:
+   ALPACA_API_KEY = os.getenv("ALPACA_API_KEY")
+   ALPACA_API_SECRET = os.getenv("ALPACA_API_SECRET")
+
+   if not ALPACA_API_KEY or not ALPACA_API_SECRET:
+       raise HTTPException(status_code=500, detail="Alpaca API credentials not configured")
+
+   return {
+       'APCA-API-KEY-ID': ALPACA_API_KEY,
+       'APCA-API-SECRET-KEY': ALPACA_API_SECRET,
+   }
 
 
+ALPACA_BAR_PARAMS = {
+   'feed': 'iex',
+   'adjustment': 'all',
+   'limit': ALPACA_PAGE_LIMIT,
+}
+
+
+async def fetch_alpaca_pages(url: str, headers: dict, params: dict) -> list:
+   """Pages of bars for one shard, following next_page_token"""
+   params = dict(params)
+   pages = []
+   async with alpaca_shards:
+       while True:
+           response = await upstreams.get("alpaca", url, headers=headers, params=params)
+           response.raise_for_status()
+           page = response.json()
+           pages.append(page.get("bars") or [])
+           if not page.get("next_page_token"):
+               return pages
+           params["page_token"] = page["next_page_token"]
+
+
+async def fetch_alpaca_shards(url: str, params: dict, timeframe: str, start_ts: int, end_ts: int, bars_per_shard: int) -> list:
+   """Split [start_ts, end_ts) into shards of about bars_per_shard bars and
+   fetch them concurrently; returns every page in shard order.
+
+   The first failing shard cancels the others, so a request that is already
+   an error stops spending the Alpaca budget.
+   """
+   headers = alpaca_headers()
+   params = {**ALPACA_BAR_PARAMS, **params, 'timeframe': timeframe}
+   shards = shard_range(start_ts, end_ts, timeframe, bars_per_shard)
+   if len(shards) > ALPACA_MAX_SHARDS:
+       raise HTTPException(status_code=400, detail=f"Date range too long for {timeframe} bars")
+   try:
+       async with asyncio.TaskGroup() as group:
+           tasks = [
+               group.create_task(
+                   fetch_alpaca_pages(url, headers, {**params, 'start': to_rfc3339(a), 'end': to_rfc3339(b)})
+               )
+               for a, b in shards
+           ]
+   except BaseExceptionGroup as errors:
+       raise errors.exceptions[0] from None
+   return [page for task in tasks for page in task.result()]
+
+
+async def fetch_alpaca_range(symbol: str, timeframe: str, start_ts: int, end_ts: int) -> list:
+   """All Alpaca bars in [start_ts, end_ts).
+
+   Long ranges are split into date shards of about one page each and fetched
+   concurrently; pages are joined once at the end in shard order.
+   """
+   url = f"https://data.alpaca.markets/v2/stocks/{symbol}/bars"
+   pages = await fetch_alpaca_shards(url, {}, timeframe, start_ts, end_ts, ALPACA_PAGE_LIMIT)
+   return list(itertools.chain.from_iterable(pages))
+
+
+async def fetch_alpaca_multi(symbols: list, timeframe: str, start_ts: int, end_ts: int) -> dict:
+   """Bars in [start_ts, end_ts) for several symbols from the multi-symbol
+   endpoint; the page limit is shared, so shards shrink with the symbol count"""
+   url = "https://data.alpaca.markets/v2/stocks/bars"
+   pages = await fetch_alpaca_shards(
+       url, {'symbols': ','.join(symbols)}, timeframe, start_ts, end_ts,
+       ALPACA_PAGE_LIMIT // len(symbols)
+   )
+   chunks = {symbol: [] for symbol in symbols}
+   for page in pages:
+       for symbol, bars in (page or {}).items():
+           chunks.setdefault(symbol, []).append(bars)
+   return {symbol: list(itertools.chain.from_iterable(parts)) for symbol, parts in chunks.items()}
+
+
+# Closed bars are served from here for any overlapping window; only the
+# uncovered edges of a request go to Alpaca
+bar_store = BarStore(
+   fetch_alpaca_range,
+   edge_ttl=CACHE_SECONDS["stocks"],
+   max_bars=env_int("BAR_STORE_MAX_BARS", 1_000_000),
+   max_age=env_int("BAR_STORE_MAX_AGE_SECONDS", 24 * 3600),
+   fetch_many=fetch_alpaca_multi,
+)
+
+
+def stocks_cache_key(
+   symbol: str,
+   start: str,
+   end: str,
+   timeframe: str,
+   fields: Optional[tuple] = None,
+   max_points: Optional[int] = None,
+   session: str = "all"
+) -> str:
+   key = f"stocks_{symbol}_{start}_{end}_{timeframe}"
+   if fields is not None:
+       key += f"_f{','.join(fields)}"
+   if max_points is not None:
+       key += f"_p{max_points}"
+   if session != "all":
+       key += f"_{session}"
+   return key
+
+
+async def fetch_stock_bars(
+   symbol: str,
+   start: str,
+   end: str,
+   timeframe: str,
+   cache_key: str,
+   fields: Optional[tuple] = None,
+   max_points: Optional[int] = None,
+   session: str = "all"
+) -> dict:
+   """Answer a bars request from the bar store and cache the response"""
+   start_ts, end_ts = date_window(start, end)
+   t, cols = await bar_store.query(symbol, timeframe, start_ts, end_ts)
+   return await cache_stock_bars(symbol, timeframe, t, cols, cache_key, fields, max_points, session)
+
+
+async def cache_stock_bars(
+   symbol: str,
+   timeframe: str,
+   t,
+   cols: dict,
+   cache_key: str,
+   fields: Optional[tuple] = None,
+   max_points: Optional[int] = None,
+   session: str = "all"
+) -> dict:
+   """Shape bar store columns into the /stocks response and cache it"""
+   t, cols = shape_bars(t, cols, timeframe, fields=fields, max_points=max_points, session=session)
+   result = {
+       "bars": columns_to_bars(t, cols),
+       "symbol": symbol,
+       "next_page_token": None,
+   }
+
+   await set_cached_data(stocks_cache, cache_key, result, "stocks")
+   return result
 
 
 @app.get("/stocks/{symbol}")
@@ -184,48 +748,32 @@ async def get_stock_data(
    start: str,
    end: str,
    timeframe: str,
-   request: Request
+   request: Request,
+   fields: Optional[str] = None,
+   max_points: Optional[int] = None,
+   session: Optional[str] = None
 ):
-   """Alpaca stock data (6 minute cache)"""
+   """Alpaca stock data (6 minute cache).
+
+   Optional: fields=c,v (t is always included), max_points=N (min/max
+   downsampling on close) and session=regular (09:30-16:00 New York).
+   """
    try:
        symbol, start, end, timeframe = validate_stocks_request(
            request, symbol, start, end, timeframe
        )
+       fields, max_points, session = validate_bar_options(fields, max_points, session)
       
-       cache_key = f"stocks_{symbol}_{start}_{end}_{timeframe}"
-       cached_result = get_cached_data(stocks_cache, cache_key, "stocks")
-       if cached_result:
-           return cached_result
-
+       cache_key = stocks_cache_key(symbol, start, end, timeframe, fields, max_points, session)
+       return await serve_cached(
+           stocks_cache, cache_key, "stocks",
+           lambda: fetch_stock_bars(
+               symbol, start, end, timeframe, cache_key,
+               fields=fields, max_points=max_points, session=session
+           ),
+           request
+       )
 
-       ALPACA_API_KEY = os.getenv("ALPACA_API_KEY")
-       ALPACA_API_SECRET = os.getenv("ALPACA_API_SECRET")
-      
-       if not ALPACA_API_KEY or not ALPACA_API_SECRET:
-           raise HTTPException(status_code=500, detail="Alpaca API credentials not configured")
-      
-       headers = {
-           'APCA-API-KEY-ID': ALPACA_API_KEY,
-           'APCA-API-SECRET-KEY': ALPACA_API_SECRET,
-       }
-      
-       url = f"https://data.alpaca.markets/v2/stocks/{symbol}/bars"
-       params = {
-           'start': start,
-           'end': end,
-           'timeframe': timeframe,
-           'feed': 'iex',
-           'adjustment': 'all',
-       }
-      
-       async with httpx.AsyncClient(timeout=10.0) as client_http:
-           response = await client_http.get(url, headers=headers, params=params)
-           response.raise_for_status()
-           result = response.json()
-          
-           set_cached_data(stocks_cache, cache_key, result, "stocks")
-           return result
-  
    except HTTPException:
        raise
    except httpx.TimeoutException:
@@ -238,6 +786,105 @@ async def get_stock_data(
 
 
 MARKETAUX_API_KEY = os.getenv("MARKETAUX_API_KEY")
+MARKETAUX_DOMAINS = 'bloomberg.com,reuters.com,wsj.com,cnbc.com,marketwatch.com,finance.yahoo.com,forbes.com,businessinsider.com'
+NEWS_LIMIT = 50
+NEWS_DAYS = 90
+
+
+async def fetch_news(canonical_name: str, cache_key: str) -> dict:
+   """Fetch recent MarketAux articles for a company and cache the response"""
+   thirty_days_ago = datetime.now() - timedelta(days=NEWS_DAYS)
+   date_string = thirty_days_ago.strftime('%Y-%m-%d')
+
+   params = {
+       'api_token': MARKETAUX_API_KEY,
+       'search': canonical_name,
+       'limit': str(NEWS_LIMIT),
+       'published_after': date_string,
+       'sort': 'relevance',
+       'sort_order': 'desc',
+       'language': 'en',
+       'domains': MARKETAUX_DOMAINS
+   }
+
+   query_params = urllib.parse.urlencode(params)
+   url = f"https://api.marketaux.com/v1/news/all?{query_params}"
+
+   response = await upstreams.get("marketaux", url)
+   response.raise_for_status()
+   result = response.json()
+
+   # Articles fetched the old way still feed the index
+   news_index.add_many(result.get("data") or [])
+   await set_cached_data(news_cache, cache_key, result, "news")
+   return result
+
+
+async def fetch_news_page(params: Dict[str, Any]) -> dict:
+   """One page of new articles for the ingester (symbols, published_after, page)"""
+   params = {
+       'api_token': MARKETAUX_API_KEY,
+       'limit': str(env_int("NEWS_INGEST_PAGE_LIMIT", NEWS_LIMIT)),
+       'language': 'en',
+       'filter_entities': 'true',
+       'domains': MARKETAUX_DOMAINS,
+       **params,
+   }
+   url = f"https://api.marketaux.com/v1/news/all?{urllib.parse.urlencode(params)}"
+   response = await upstreams.get("marketaux", url)
+   response.raise_for_status()
+   return response.json()
+
+
+# MarketAux calls per day left to background work, split between news
+# prewarm and the ingester (which gets the rest unless capped lower)
+MARKETAUX_BACKGROUND_PER_DAY = max(0, MARKETAUX_CALLS_PER_DAY - MARKETAUX_USER_RESERVE_PER_DAY)
+PREWARM_MARKETAUX_PER_DAY = min(env_int("PREWARM_MARKETAUX_PER_DAY", 15), MARKETAUX_BACKGROUND_PER_DAY)
+NEWS_INGEST_PER_DAY = min(
+   env_int("NEWS_INGEST_PER_DAY", MARKETAUX_BACKGROUND_PER_DAY),
+   MARKETAUX_BACKGROUND_PER_DAY - PREWARM_MARKETAUX_PER_DAY,
+)
+
+# Articles are pulled incrementally for the whole universe and indexed by
+# entity symbol, so /news is answered locally instead of one search per symbol.
+# NEWS_INGEST_SECONDS is a floor: passes are spaced so that a worst-case pass
+# (every chunk to max_pages) fits NEWS_INGEST_PER_DAY.
+news_index = NewsIndex(retention_days=NEWS_DAYS)
+news_ingester = NewsIngester(
+   news_index,
+   fetch_news_page,
+   VALID_SYMBOLS,
+   TokenBucket.per_day("marketaux-ingest", max(NEWS_INGEST_PER_DAY, 1), burst=10),
+   interval=env_int("NEWS_INGEST_SECONDS", 3600),
+   backfill_days=env_int("NEWS_BACKFILL_DAYS", 7),
+   symbols_per_request=env_int("NEWS_INGEST_SYMBOLS", 100),
+   max_pages=env_int("NEWS_INGEST_MAX_PAGES", 3),
+   min_articles=env_int("NEWS_INDEX_MIN_ARTICLES", 3),
+   snapshot_path=snapshots.path_for("news_index"),
+)
+NEWS_INDEX_ENABLED = (
+   bool(MARKETAUX_API_KEY) and NEWS_INGEST_PER_DAY > 0 and env_bool("NEWS_INDEX_ENABLED", True)
+)
+
+
+def indexed_news(symbol: str) -> dict:
+   """Index hits in the MarketAux response shape the frontend already reads"""
+   articles = news_index.query(symbol, limit=NEWS_LIMIT)
+   return {
+       "meta": {"found": news_index.count(symbol), "returned": len(articles), "limit": NEWS_LIMIT, "page": 1},
+       "data": articles,
+   }
+
+
+async def read_news(symbol: str, canonical_name: str):
+   """(data, state, age) from the news index when it covers symbol, else the cache"""
+   if NEWS_INDEX_ENABLED and news_ingester.covers(symbol):
+       news_ingester.served += 1
+       return indexed_news(symbol), "INDEX", time.time() - news_ingester.last_success
+   cache_key = news_cache_key(symbol, canonical_name)
+   return await read_through(
+       news_cache, cache_key, "news", lambda: fetch_news(canonical_name, cache_key)
+   )
 
 
 @app.get("/news/{symbol}")
@@ -247,41 +894,17 @@ async def get_news(
    symbol: str,
    company_name: str = Query(..., alias="companyName"),
 ):
-   """MarketAux news (10 hour cache)"""
+   """MarketAux news (local index, falling back to a 10 hour cache)"""
    try:
        symbol, canonical_name = validate_news_request(request, symbol, company_name)
       
-       cache_key = f"news_{symbol.lower()}_{canonical_name.lower()}"
-       cached_result = get_cached_data(news_cache, cache_key, "news")
-       if cached_result:
-           return cached_result
+       demand.record(symbol)
 
+       data, state, age = await read_news(symbol, canonical_name)
+       return response_cache.respond(
+           request, news_cache_key(symbol, canonical_name), data, cache_headers(state, age)
+       )
 
-       thirty_days_ago = datetime.now() - timedelta(days=90)
-       date_string = thirty_days_ago.strftime('%Y-%m-%d')
-      
-       params = {
-           'api_token': MARKETAUX_API_KEY,
-           'search': canonical_name,
-           'limit': '50',
-           'published_after': date_string,
-           'sort': 'relevance',
-           'sort_order': 'desc',
-           'language': 'en',
-           'domains': 'bloomberg.com,reuters.com,wsj.com,cnbc.com,marketwatch.com,finance.yahoo.com,forbes.com,businessinsider.com'
-       }
-      
-       query_params = urllib.parse.urlencode(params)
-       url = f"https://api.marketaux.com/v1/news/all?{query_params}"
-      
-       async with httpx.AsyncClient(timeout=20.0) as client_http:
-           response = await client_http.get(url)
-           response.raise_for_status()
-           result = response.json()
-          
-           set_cached_data(news_cache, cache_key, result, "news")
-           return result
-  
    except HTTPException:
        raise
    except httpx.TimeoutException:
@@ -294,25 +917,27 @@ async def get_news(
 FINNHUB_API_KEY = os.getenv("FINNHUB_API_KEY")
 FINNHUB_BASE_URL = "https://finnhub.io/api/v1"
 
-async def fetch_with_timeout(url: str, timeout: int = 10) -> Dict[Any, Any]:
-   async with httpx.AsyncClient(timeout=timeout) as client_http:
-       try:
-           response = await client_http.get(url)
-           response.raise_for_status()
-           return response.json()
-       except httpx.TimeoutException:
-           raise HTTPException(status_code=408, detail="Request timeout")
-       except httpx.HTTPStatusError as e:
-           if e.response.status_code == 401:
-               raise HTTPException(status_code=401, detail="Invalid API key")
-           elif e.response.status_code == 403:
-               raise HTTPException(status_code=403, detail="API access forbidden")
-           elif e.response.status_code == 429:
-               raise HTTPException(status_code=429, detail="Rate limit exceeded")
-           else:
-               raise HTTPException(status_code=e.response.status_code, detail=f"API error: {e.response.status_code}")
-       except Exception as e:
-           raise HTTPException(status_code=500, detail="External API error")
+async def fetch_with_timeout(url: str, timeout: Optional[float] = None) -> Dict[Any, Any]:
+   try:
+       kwargs = {"timeout": timeout} if timeout is not None else {}
+       response = await upstreams.get("finnhub", url, **kwargs)
+       response.raise_for_status()
+       return response.json()
+   except (BudgetExhausted, CircuitOpen, DeadlineExceeded):
+       raise
+   except httpx.TimeoutException:
+       raise HTTPException(status_code=408, detail="Request timeout")
+   except httpx.HTTPStatusError as e:
+       if e.response.status_code == 401:
+           raise HTTPException(status_code=401, detail="Invalid API key")
+       elif e.response.status_code == 403:
+           raise HTTPException(status_code=403, detail="API access forbidden")
+       elif e.response.status_code == 429:
+           raise HTTPException(status_code=429, detail="Rate limit exceeded")
+       else:
+           raise HTTPException(status_code=e.response.status_code, detail=f"API error: {e.response.status_code}")
+   except Exception as e:
+       raise HTTPException(status_code=500, detail="External API error")
 
 
 def safe_number(value: Any, fallback: float = 0.0) -> float:
@@ -357,6 +982,16 @@ def process_earnings_data(earnings_array: list) -> list:
    return list(reversed(processed_earnings))
 
 
+# The only fields of Finnhub's metric=all blob (hundreds of them) that are used
+FINNHUB_METRIC_FIELDS = ("grossMarginTTM", "peTTM", "10DayAverageTradingVolume", "52WeekHigh", "52WeekLow")
+
+
+def trim_metrics(metrics: dict) -> dict:
+   """Keep only FINNHUB_METRIC_FIELDS in the raw metrics passed through to clients"""
+   metric = metrics.get('metric') or {}
+   return {"metric": {field: metric[field] for field in FINNHUB_METRIC_FIELDS if field in metric}}
+
+
 def process_company_metrics(profile: dict, quote: dict, metrics: dict) -> dict:
    metrics_data = metrics.get('metric', {}) if metrics else {}
   
@@ -372,6 +1007,104 @@ def process_company_metrics(profile: dict, quote: dict, metrics: dict) -> dict:
    }
 
 
+async def fetch_finnhub_data(symbol: str, canonical_name: str, cache_key: str) -> dict:
+   """Fetch earnings, profile and metrics from Finnhub; cache complete results.
+
+   404s and incomplete payloads go to the negative cache instead and are
+   answered from there until it expires.
+   """
+   negative = await negative_cache.get(cache_key)
+   if negative:
+       print(f"Cache NEGATIVE for finnhub key: {cache_key}")
+       if "error" in negative.data:
+           raise HTTPException(status_code=negative.data["status"], detail=negative.data["error"])
+       return negative.data["data"]
+
+   endpoints = {
+       "earnings": f"{FINNHUB_BASE_URL}/stock/earnings?symbol={symbol}&token={FINNHUB_API_KEY}",
+       "profile": f"{FINNHUB_BASE_URL}/stock/profile2?symbol={symbol}&token={FINNHUB_API_KEY}",
+       "metrics": f"{FINNHUB_BASE_URL}/stock/metric?symbol={symbol}&metric=all&token={FINNHUB_API_KEY}"
+   }
+
+   tasks = [
+       fetch_with_timeout(endpoints["earnings"]),
+       fetch_with_timeout(endpoints["profile"]),
+       fetch_with_timeout(endpoints["metrics"]),
+   ]
+
+   results = await asyncio.gather(*tasks, return_exceptions=True)
+   earnings_data, profile_data, metrics_data = results
+   # A partial result is never cached, so fail the same way the call that
+   # was shed or short-circuited did
+   for result in results:
+       if isinstance(result, (BudgetExhausted, CircuitOpen, DeadlineExceeded)):
+           raise result
+
+   raw_data = {}
+   for key, result in zip(["earnings", "profile", "metrics"], results):
+       if isinstance(result, Exception):
+           raw_data[key] = {"error": str(result)}
+           print(f"Error fetching {key}: {result}")
+       elif key == "metrics":
+           raw_data[key] = trim_metrics(result)
+       else:
+           raw_data[key] = result
+
+   raw_data["quote"] = {"test": "disabled"}
+
+   processed_earnings = []
+   if not isinstance(earnings_data, Exception) and isinstance(earnings_data, list):
+       if len(earnings_data) == 0:
+           detail = f"No earnings data for {symbol}"
+           await negative_cache.set(cache_key, {"status": 404, "error": detail})
+           raise HTTPException(status_code=404, detail=detail)
+       processed_earnings = process_earnings_data(earnings_data)
+   elif isinstance(earnings_data, Exception):
+       raise HTTPException(status_code=500, detail="Failed to fetch earnings data")
+
+   profile = profile_data if not isinstance(profile_data, Exception) else {}
+   quote = {}
+   metrics = metrics_data if not isinstance(metrics_data, Exception) else {}
+
+   company_metrics = process_company_metrics(profile, quote, metrics)
+
+   validation_warnings = []
+   if not profile.get('marketCapitalization'):
+       validation_warnings.append("No market cap data")
+   if not metrics.get('metric'):
+       validation_warnings.append("No metrics data")
+
+   response_data = {
+       "symbol": symbol,
+       "company_name": canonical_name,
+       "timestamp": datetime.utcnow().isoformat(),
+       "earnings_data": processed_earnings,
+       "company_metrics": company_metrics,
+       "raw_data": raw_data,
+       "validation_warnings": validation_warnings
+   }
+
+   arrayChecker = ["marketCap", "grossMargin", "peRatio", "volume10Day", "weekHigh52", "weekLow52"]
+   count = sum(1 for s in arrayChecker if response_data["company_metrics"][s] == 0)
+
+   earnings_fields = ["expected", "actual", "surprise"]
+   missing_earnings_count = sum(
+       1 for quarter in response_data["earnings_data"]
+       if sum(1 for field in earnings_fields if quarter[field] == 0) == 3
+   )
+
+
+   if (len(response_data["company_metrics"]["logo"]) > 0 and
+       len(response_data["company_metrics"]["industry"]) > 0 and
+       count <= 3 and missing_earnings_count <= 2):
+       await set_cached_data(finnhub_cache, cache_key, response_data, "finnhub")
+   elif not any(isinstance(result, Exception) for result in results):
+       # Every call succeeded, the symbol just has sparse data
+       await negative_cache.set(cache_key, {"status": 200, "data": response_data})
+
+   return response_data
+
+
 @app.get("/finnhub/{symbol}")
 async def get_finnhub_data(
    request: Request,
@@ -385,83 +1118,14 @@ async def get_finnhub_data(
        if not FINNHUB_API_KEY or FINNHUB_API_KEY == "YOUR_FINNHUB_API_KEY":
            raise HTTPException(status_code=500, detail="Finnhub API key not configured")
       
-       cache_key = f"finnhub_{symbol.lower()}_{canonical_name.lower()}"
-       cached_result = get_cached_data(finnhub_cache, cache_key, "finnhub")
-       if cached_result:
-           return cached_result
-      
-       endpoints = {
-           "earnings": f"{FINNHUB_BASE_URL}/stock/earnings?symbol={symbol}&token={FINNHUB_API_KEY}",
-           "profile": f"{FINNHUB_BASE_URL}/stock/profile2?symbol={symbol}&token={FINNHUB_API_KEY}",
-           "metrics": f"{FINNHUB_BASE_URL}/stock/metric?symbol={symbol}&metric=all&token={FINNHUB_API_KEY}"
-       }
-      
-       tasks = [
-           fetch_with_timeout(endpoints["earnings"]),
-           fetch_with_timeout(endpoints["profile"]),
-           fetch_with_timeout(endpoints["metrics"]),
-       ]
-      
-       results = await asyncio.gather(*tasks, return_exceptions=True)
-       earnings_data, profile_data, metrics_data = results
-      
-       raw_data = {}
-       for key, result in zip(["earnings", "profile", "metrics"], results):
-           if isinstance(result, Exception):
-               raw_data[key] = {"error": str(result)}
-               print(f"Error fetching {key}: {result}")
-           else:
-               raw_data[key] = result
-      
-       raw_data["quote"] = {"test": "disabled"}
-      
-       processed_earnings = []
-       if not isinstance(earnings_data, Exception) and isinstance(earnings_data, list):
-           if len(earnings_data) == 0:
-               raise HTTPException(status_code=404, detail=f"No earnings data for {symbol}")
-           processed_earnings = process_earnings_data(earnings_data)
-       elif isinstance(earnings_data, Exception):
-           raise HTTPException(status_code=500, detail="Failed to fetch earnings data")
-      
-       profile = profile_data if not isinstance(profile_data, Exception) else {}
-       quote = {}
-       metrics = metrics_data if not isinstance(metrics_data, Exception) else {}
-      
-       company_metrics = process_company_metrics(profile, quote, metrics)
-      
-       validation_warnings = []
-       if not profile.get('marketCapitalization'):
-           validation_warnings.append("No market cap data")
-       if not metrics.get('metric'):
-           validation_warnings.append("No metrics data")
-      
-       response_data = {
-           "symbol": symbol,
-           "company_name": canonical_name,
-           "timestamp": datetime.utcnow().isoformat(),
-           "earnings_data": processed_earnings,
-           "company_metrics": company_metrics,
-           "raw_data": raw_data,
-           "validation_warnings": validation_warnings
-       }
-
-       arrayChecker = ["marketCap", "grossMargin", "peRatio", "volume10Day", "weekHigh52", "weekLow52"]
-       count = sum(1 for s in arrayChecker if response_data["company_metrics"][s] == 0)
-      
-       earnings_fields = ["expected", "actual", "surprise"]
-       missing_earnings_count = sum(
-           1 for quarter in response_data["earnings_data"]
-           if sum(1 for field in earnings_fields if quarter[field] == 0) == 3
-       )
+       demand.record(symbol)
 
+       cache_key = finnhub_cache_key(symbol, canonical_name)
+       return await serve_cached(
+           finnhub_cache, cache_key, "finnhub",
+           lambda: fetch_finnhub_data(symbol, canonical_name, cache_key), request
+       )
 
-       if (len(response_data["company_metrics"]["logo"]) > 0 and
-           len(response_data["company_metrics"]["industry"]) > 0 and
-           count <= 3 and missing_earnings_count <= 2):
-           set_cached_data(finnhub_cache, cache_key, response_data, "finnhub")
-      
-       return response_data
-  
    except HTTPException:
        raise
    except Exception as e:
@@ -469,38 +1133,442 @@ async def get_finnhub_data(
        raise HTTPException(status_code=500, detail="Internal server error")
 
 
+# ============================================================================
+# Batch endpoints: one round trip for several reels
+# ============================================================================
+
+BATCH_MAX_SYMBOLS = env_int("BATCH_MAX_SYMBOLS", 20)
+BATCH_CONCURRENCY = env_int("BATCH_CONCURRENCY", 6)
+
+
+class BatchSymbolsRequest(BaseModel):
+   symbols: List[str]
+
+
+class BatchStocksRequest(BatchSymbolsRequest):
+   start: str
+   end: str
+   timeframe: str
+   fields: Optional[str] = None
+   max_points: Optional[int] = None
+   session: Optional[str] = None
+
+
+def validate_batch_symbols(symbols: List[str]):
+   """Split requested symbols into valid ones (deduplicated, in order) and error items"""
+   if not symbols:
+       raise HTTPException(status_code=400, detail="No symbols given")
+   if len(symbols) > BATCH_MAX_SYMBOLS:
+       raise HTTPException(status_code=400, detail=f"Too many symbols (max {BATCH_MAX_SYMBOLS})")
+
+   valid, errors = [], {}
+   for raw in symbols:
+       try:
+           symbol = validate_symbol(raw)
+       except HTTPException as e:
+           errors[raw] = error_item(raw, e)
+           continue
+       if symbol not in valid:
+           valid.append(symbol)
+   return valid, errors
+
+
+def ordered_batch_results(requested: List[str], items: Dict[str, dict], errors: Dict[str, dict]) -> list:
+   """One result per requested symbol, in request order without duplicates"""
+   results = {}
+   for raw in requested:
+       key = raw if raw in errors else raw.strip().upper()
+       if key not in results:
+           results[key] = errors[raw] if raw in errors else items[key]
+   return list(results.values())
+
+
+class StockWindow:
+   """Validated window and shaping options shared by every symbol in a stocks batch"""
+
+   def __init__(self, start: str, end: str, timeframe: str, fields, max_points, session):
+       self.start = start
+       self.end = end
+       self.timeframe = timeframe
+       self.fields = fields
+       self.max_points = max_points
+       self.session = session
+
+   def cache_key(self, symbol: str) -> str:
+       return stocks_cache_key(
+           symbol, self.start, self.end, self.timeframe, self.fields, self.max_points, self.session
+       )
+
+   def fetch(self, symbol: str) -> Callable[[], Awaitable[dict]]:
+       return lambda: fetch_stock_bars(
+           symbol, self.start, self.end, self.timeframe, self.cache_key(symbol),
+           fields=self.fields, max_points=self.max_points, session=self.session
+       )
+
+
+def validate_stock_window(
+   request: Request,
+   symbol: str,
+   start: str,
+   end: str,
+   timeframe: str,
+   fields: Optional[str] = None,
+   max_points: Optional[int] = None,
+   session: Optional[str] = None
+) -> StockWindow:
+   _, start, end, timeframe = validate_stocks_request(request, symbol, start, end, timeframe)
+   fields, max_points, session = validate_bar_options(fields, max_points, session)
+   return StockWindow(start, end, timeframe, fields, max_points, session)
+
+
+async def iter_batch_stock_items(window: StockWindow, symbols: List[str]):
+   """Stocks results per symbol: cache hits first, then misses from one bar
+   store query that fetches symbols with the same gaps together"""
+   if not symbols:
+       return
+   misses = []
+   cached = await asyncio.gather(*(
+       get_cached_data(stocks_cache, window.cache_key(symbol), "stocks") for symbol in symbols
+   ))
+   for symbol, hit in zip(symbols, cached):
+       if hit and hit[0]:
+           data, _, stale = hit
+           cache_serves["stocks"]["stale" if stale else "hit"] += 1
+           if stale:
+               schedule_revalidation(window.cache_key(symbol), "stocks", window.fetch(symbol))
+           yield ok_item(symbol, data, "STALE" if stale else "HIT")
+       else:
+           cache_serves["stocks"]["miss"] += 1
+           misses.append(symbol)
+
+   if not misses:
+       return
+   start_ts, end_ts = date_window(window.start, window.end)
+   try:
+       columns = await bar_store.query_many(misses, window.timeframe, start_ts, end_ts)
+   except Exception as e:
+       print(f"Batch stocks fetch failed: {type(e).__name__}")
+       for symbol in misses:
+           yield error_item(symbol, e)
+       return
+   for symbol in misses:
+       t, cols = columns[symbol]
+       data = await cache_stock_bars(
+           symbol, window.timeframe, t, cols, window.cache_key(symbol),
+           window.fields, window.max_points, window.session
+       )
+       yield ok_item(symbol, data, "MISS")
+
+
+async def iter_with_errors(errors: Dict[str, dict], items):
+   for item in errors.values():
+       yield item
+   async for item in items:
+       yield item
+
+
+@app.post("/batch/stocks")
+@limiter.limit("30/minute")
+async def batch_stocks(payload: BatchStocksRequest, request: Request, stream: Optional[str] = None):
+   """Alpaca bars for several symbols over one window (?stream=ndjson|sse to
+   flush each symbol as it resolves)"""
+   stream = validate_stream_format(stream)
+   symbols, errors = validate_batch_symbols(payload.symbols)
+   window = None
+   if symbols:
+       window = validate_stock_window(
+           request, symbols[0], payload.start, payload.end, payload.timeframe,
+           payload.fields, payload.max_points, payload.session
+       )
+   items = iter_batch_stock_items(window, symbols)
+   if stream:
+       return streaming_response(iter_with_errors(errors, items), stream)
+   results = {item["symbol"]: item async for item in items}
+   return {"results": ordered_batch_results(payload.symbols, results, errors)}
+
+
+async def batch_news_item(symbol: str) -> dict:
+   canonical_name = COMPANY_NAMES.get(symbol)
+   if not canonical_name:
+       raise HTTPException(status_code=404, detail="Company name not found")
+   demand.record(symbol)
+   data, state, _ = await read_news(symbol, canonical_name)
+   return ok_item(symbol, data, state)
+
+
+async def batch_finnhub_item(symbol: str) -> dict:
+   canonical_name = COMPANY_NAMES.get(symbol, symbol)
+   demand.record(symbol)
+   cache_key = finnhub_cache_key(symbol, canonical_name)
+   data, state, _ = await read_through(
+       finnhub_cache, cache_key, "finnhub", lambda: fetch_finnhub_data(symbol, canonical_name, cache_key)
+   )
+   return ok_item(symbol, data, state)
+
+
+async def run_symbol_batch(payload: BatchSymbolsRequest, fetch_item, stream: Optional[str]):
+   """Fan out fetch_item over the batch, as one JSON body or a stream"""
+   stream = validate_stream_format(stream)
+   symbols, errors = validate_batch_symbols(payload.symbols)
+   if stream:
+       items = stream_bounded(symbols, fetch_item, BATCH_CONCURRENCY)
+       return streaming_response(iter_with_errors(errors, items), stream)
+   items = dict(zip(symbols, await gather_bounded(symbols, fetch_item, BATCH_CONCURRENCY)))
+   return {"results": ordered_batch_results(payload.symbols, items, errors)}
+
+
+@app.post("/batch/news")
+@limiter.limit("30/minute")
+async def batch_news(payload: BatchSymbolsRequest, request: Request, stream: Optional[str] = None):
+   """MarketAux news for several symbols"""
+   return await run_symbol_batch(payload, batch_news_item, stream)
+
+
+@app.post("/batch/finnhub")
+@limiter.limit("30/minute")
+async def batch_finnhub(payload: BatchSymbolsRequest, request: Request, stream: Optional[str] = None):
+   """Finnhub earnings/metrics for several symbols"""
+   if not FINNHUB_API_KEY or FINNHUB_API_KEY == "YOUR_FINNHUB_API_KEY":
+       raise HTTPException(status_code=500, detail="Finnhub API key not configured")
+   return await run_symbol_batch(payload, batch_finnhub_item, stream)
+
+
+# ============================================================================
+# Composite reel card: every section for one symbol
+# ============================================================================
+
+REEL_SECTIONS = ("bars", "metrics", "earnings", "news", "sentiment")
+# A slow section is reported as failed instead of holding the card back;
+# the upstream fetch keeps running and still fills the cache
+REEL_SECTION_TIMEOUT = env_int("REEL_SECTION_TIMEOUT_SECONDS", 25)
+
+
+def section_item(section: str, data: Any, cache: str) -> dict:
+   return {"section": section, "ok": True, "cache": cache, "data": data}
+
+
+def section_error(section: str, exc: BaseException) -> dict:
+   return {"section": section, "ok": False, "error": error_detail(exc)}
+
+
+def reel_sources(symbol: str, canonical_name: str, window: Optional[StockWindow]) -> Dict[str, Callable]:
+   """Source name -> coroutine function returning a list of section items.
+   Finnhub feeds both the metrics and earnings sections."""
+
+   async def bars():
+       data, state, _ = await read_through(
+           stocks_cache, window.cache_key(symbol), "stocks", window.fetch(symbol)
+       )
+       return [section_item("bars", data, state)]
+
+   async def finnhub():
+       if not FINNHUB_API_KEY or FINNHUB_API_KEY == "YOUR_FINNHUB_API_KEY":
+           raise HTTPException(status_code=500, detail="Finnhub API key not configured")
+       item = await batch_finnhub_item(symbol)
+       return [
+           section_item("metrics", item["data"]["company_metrics"], item["cache"]),
+           section_item("earnings", item["data"]["earnings_data"], item["cache"]),
+       ]
+
+   async def news():
+       item = await batch_news_item(symbol)
+       return [section_item("news", item["data"], item["cache"])]
+
+   async def sentiment():
+       cache_key = search_cache_key(canonical_name)
+       data, state, _ = await read_through(
+           search_cache, cache_key, "search", lambda: fetch_sentiment(canonical_name, cache_key)
+       )
+       return [section_item("sentiment", data, state)]
+
+   sources = {"finnhub": finnhub, "news": news, "sentiment": sentiment}
+   if window is not None:
+       sources["bars"] = bars
+   return sources
+
+
+REEL_SOURCE_SECTIONS = {
+   "bars": ("bars",),
+   "finnhub": ("metrics", "earnings"),
+   "news": ("news",),
+   "sentiment": ("sentiment",),
+}
+
+
+async def iter_reel_sections(sources: Dict[str, Callable]):
+   async def run(name):
+       return await asyncio.wait_for(sources[name](), timeout=REEL_SECTION_TIMEOUT)
+
+   def failed(name, exc):
+       return [section_error(section, exc) for section in REEL_SOURCE_SECTIONS[name]]
+
+   async for items in stream_bounded(list(sources), run, len(sources), on_error=failed):
+       for item in items:
+           yield item
+
+
+@app.get("/reel/{symbol}")
+@limiter.limit("60/minute")
+async def get_reel(
+   symbol: str,
+   request: Request,
+   start: Optional[str] = None,
+   end: Optional[str] = None,
+   timeframe: Optional[str] = None,
+   fields: Optional[str] = None,
+   max_points: Optional[int] = None,
+   session: Optional[str] = None,
+   stream: Optional[str] = None
+):
+   """Everything a reel card shows: bars (when start/end/timeframe are given),
+   metrics, earnings, news and sentiment. With ?stream=ndjson|sse each section
+   is flushed as soon as it resolves; failures are reported per section."""
+   stream = validate_stream_format(stream)
+   symbol = validate_symbol(symbol)
+   canonical_name = COMPANY_NAMES.get(symbol)
+   if not canonical_name:
+       raise HTTPException(status_code=404, detail="Company name not found")
+
+   window = None
+   if start or end or timeframe:
+       if not (start and end and timeframe):
+           raise HTTPException(status_code=400, detail="start, end and timeframe must be given together")
+       window = validate_stock_window(
+           request, symbol, start, end, timeframe, fields, max_points, session
+       )
+
+   sections = iter_reel_sections(reel_sources(symbol, canonical_name, window))
+   if stream:
+       return streaming_response(sections, stream)
+   return {
+       "symbol": symbol,
+       "sections": {item.pop("section"): item async for item in sections},
+   }
+
+
+# ============================================================================
+# Symbol search: autocomplete over the tracked universe
+# ============================================================================
+
+# Built once at import; immutable afterwards
+symbol_index = SymbolIndex.build()
+
+
+@app.get("/symbols/suggest")
+@limiter.limit("600/minute")
+async def suggest_symbols(request: Request, q: str = Query(...), limit: int = 10):
+   """Ranked symbol/company matches for a search box: symbol and name
+   prefixes, or typo-tolerant trigram matches when nothing starts with q"""
+   q, limit = validate_suggest_request(q, limit)
+   return {"query": q, "results": symbol_index.suggest(q, limit)}
+
+
+def build_prewarm_scheduler() -> PrewarmScheduler:
+   """Background refresh of the closed VALID_SYMBOLS universe.
+
+   Budgets are the background share of each provider's quota; user misses
+   still go straight to the upstream.
+   """
+   targets = []
+
+   if FINNHUB_API_KEY and FINNHUB_API_KEY != "YOUR_FINNHUB_API_KEY":
+       def finnhub_key(symbol):
+           return finnhub_cache_key(symbol, COMPANY_NAMES.get(symbol, symbol))
+
+       def refresh_finnhub(symbol):
+           key = finnhub_key(symbol)
+           name = COMPANY_NAMES.get(symbol, symbol)
+           return inflight.do(key, lambda: fetch_finnhub_data(symbol, name, key))
+
+       targets.append(WarmTarget(
+           "finnhub", finnhub_cache, finnhub_key, refresh_finnhub,
+           TokenBucket.per_minute("finnhub", env_int("PREWARM_FINNHUB_PER_MINUTE", 30), burst=3),
+           cost=3,
+           refresh_ahead=CACHE_SECONDS["finnhub"] * 0.15,
+           stale_seconds=STALE_SECONDS["finnhub"],
+       ))
+
+   if MARKETAUX_API_KEY and PREWARM_MARKETAUX_PER_DAY > 0:
+       def news_key(symbol):
+           name = COMPANY_NAMES.get(symbol)
+           if not name or (NEWS_INDEX_ENABLED and news_ingester.covers(symbol)):
+               return None
+           return news_cache_key(symbol, name)
+
+       async def refresh_news(symbol):
+           key = news_key(symbol)
+           if key is None:
+               # The news index took the symbol over since it was found due
+               return None
+           return await inflight.do(key, lambda: fetch_news(COMPANY_NAMES[symbol], key))
+
+       targets.append(WarmTarget(
+           "news", news_cache, news_key, refresh_news,
+           TokenBucket.per_day("marketaux", PREWARM_MARKETAUX_PER_DAY),
+           refresh_ahead=CACHE_SECONDS["news"] * 0.15,
+           stale_seconds=STALE_SECONDS["news"],
+       ))
+
+   def search_key(symbol):
+       name = COMPANY_NAMES.get(symbol)
+       return search_cache_key(name) if name else None
+
+   def refresh_search(symbol):
+       key = search_key(symbol)
+       return inflight.do(key, lambda: fetch_sentiment(COMPANY_NAMES[symbol], key))
+
+   async def refresh_search_batch(symbols, charge):
+       symbols_by_company = {COMPANY_NAMES[symbol]: symbol for symbol in symbols}
+       missed = await refresh_sentiments(list(symbols_by_company), charge)
+       return [symbols_by_company[company] for company in missed]
+
+   targets.append(WarmTarget(
+       "search", search_cache, search_key, refresh_search,
+       TokenBucket.per_minute("openai", env_int("PREWARM_OPENAI_PER_MINUTE", 10), burst=2),
+       refresh_ahead=CACHE_SECONDS["search"] * 0.15,
+       stale_seconds=STALE_SECONDS["search"],
+       retry_after=CACHE_SECONDS["search"] / 2,
+       refresh_many=refresh_search_batch,
+       batch_size=sentiment_batcher.max_companies,
+   ))
+
+   return PrewarmScheduler(targets, VALID_SYMBOLS, demand, interval=env_int("PREWARM_INTERVAL_SECONDS", 60))
+
+
+PREWARM_ENABLED = env_bool("PREWARM_ENABLED", True)
+prewarm = build_prewarm_scheduler()
+
+
 @app.get("/cache/stats")
-def get_cache_stats():
-   def get_cache_info(cache_dict, name):
-       total_entries = len(cache_dict)
-       valid_entries = sum(1 for entry in cache_dict.values() if is_cache_valid(entry, name))
-       expired_entries = total_entries - valid_entries
-       cache_hours = CACHE_TIMES.get(name, 1)
-       return {
-           "name": name,
-           "cache_hours": cache_hours,
-           "total_entries": total_entries,
-           "valid_entries": valid_entries,
-           "expired_entries": expired_entries
-       }
-  
+async def get_cache_stats():
    return {
        "cache_times": CACHE_TIMES,
-       "caches": [
-           get_cache_info(news_cache, "news"),
-           get_cache_info(finnhub_cache, "finnhub"),
-           get_cache_info(search_cache, "search"),
-           get_cache_info(stocks_cache, "stocks")
-       ]
+       "stale_times": STALE_TIMES,
+       "serves": cache_serves,
+       "caches": [await cache.stats() for cache in ALL_CACHES],
+       "inflight": inflight.stats(),
+       "snapshots": snapshots.stats(),
+       "prewarm": prewarm.stats(),
+       "sentiment_memo": sentiment_memo.stats(),
+       "sentiment_batches": sentiment_batcher.stats(),
+       "news_index": news_ingester.stats(),
+       "bar_store": bar_store.stats(),
+       "responses": response_cache.stats(),
+       "symbol_index": symbol_index.stats()
    }
 
 
+@app.get("/upstream/stats")
+def get_upstream_stats():
+   return {"hosts": upstreams.stats(), "llm": llm_gate.stats(), "budget": upstream_budget.stats()}
+
+
 @app.get("/cache/clear")
-def clear_all_caches():
-   news_cache.clear()
-   finnhub_cache.clear()
-   search_cache.clear()
-   stocks_cache.clear()
+async def clear_all_caches():
+   for cache in ALL_CACHES:
+       await cache.clear()
+   bar_store.clear()
+   response_cache.clear()
    return {"message": "All caches cleared"}
 
 
@@ -0,0 +1,385 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+TIMEFRAME_SECONDS = {
+    "1Min": 60,
+    "5Min": 300,
+    "15Min": 900,
+    "1Hour": 3600,
+    "1Day": 86400,
+    "1Week": 7 * 86400,
+}
+
+# Column name -> dtype, in Alpaca's bar field order
+BAR_FIELDS = {
+    "o": np.float64,
+    "h": np.float64,
+    "l": np.float64,
+    "c": np.float64,
+    "v": np.int64,
+    "n": np.int64,
+    "vw": np.float64,
+}
+
+# 1970-01-05 was a Monday; weekly bars are aligned to Monday 00:00 UTC
+_WEEK_ORIGIN = 4 * 86400
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+# Regular session, in seconds after local midnight
+REGULAR_OPEN = 9 * 3600 + 30 * 60
+REGULAR_CLOSE = 16 * 3600
+
+FetchRange = Callable[[str, str, int, int], Awaitable[List[Dict[str, Any]]]]
+FetchMany = Callable[[List[str], str, int, int], Awaitable[Dict[str, List[Dict[str, Any]]]]]
+
+
+def date_window(start: str, end: str) -> Tuple[int, int]:
+    """[start 00:00 UTC, day after end 00:00 UTC) for YYYY-MM-DD dates, like Alpaca"""
+    start_dt = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    end_dt = datetime.strptime(end, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)
+    return int(start_dt.timestamp()), int(end_dt.timestamp())
+
+
+def to_rfc3339(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def align_range(a: int, b: int, timeframe: str) -> Tuple[int, int]:
+    """Widen [a, b) to whole weeks for 1Week so a fetch never returns a partial week"""
+    if timeframe != "1Week":
+        return a, b
+    week = TIMEFRAME_SECONDS["1Week"]
+    a = a - (a - _WEEK_ORIGIN) % week
+    b = b + (-(b - _WEEK_ORIGIN)) % week
+    return a, b
+
+
+def shard_range(a: int, b: int, timeframe: str, bars_per_shard: int) -> List[Tuple[int, int]]:
+    """Split [a, b) into consecutive shards expected to hold ~bars_per_shard bars.
+
+    The estimate assumes bars for every hour of every day (IEX extended hours
+    are ~16h on weekdays), so real shards come in under the target and most
+    fit in a single Alpaca page. Boundaries are aligned to the timeframe.
+    """
+    tf = TIMEFRAME_SECONDS[timeframe]
+    span = max(bars_per_shard, 1) * tf
+    if timeframe == "1Week":
+        span = max(span - span % tf, tf)
+    else:
+        span = max(span - span % 86400, 86400)
+    shards = []
+    cursor = a
+    while cursor < b:
+        shards.append((cursor, min(cursor + span, b)))
+        cursor += span
+    return shards
+
+
+def bars_to_columns(bars: List[Dict[str, Any]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Alpaca bar dicts -> (epoch-second timestamps, column arrays)"""
+    if not bars:
+        return np.empty(0, dtype=np.int64), {f: np.empty(0, dtype=d) for f, d in BAR_FIELDS.items()}
+    t = np.array([bar["t"].rstrip("Z") for bar in bars], dtype="datetime64[s]").astype(np.int64)
+    cols = {
+        field: np.fromiter((bar.get(field) or 0 for bar in bars), dtype=dtype, count=len(bars))
+        for field, dtype in BAR_FIELDS.items()
+    }
+    return t, cols
+
+
+def columns_to_bars(t: np.ndarray, cols: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Column arrays -> Alpaca-shaped bar dicts"""
+    if len(t) == 0:
+        return []
+    stamps = np.char.add(np.datetime_as_string(t.astype("datetime64[s]"), unit="s"), "Z").tolist()
+    names = ["t"] + list(cols)
+    values = [stamps] + [cols[name].tolist() for name in cols]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def exchange_offsets(t: np.ndarray) -> np.ndarray:
+    """UTC offset in seconds of America/New_York for each timestamp.
+
+    The offset is looked up once per UTC day (at 12:00 UTC, i.e. before the
+    open), which is exact for every bar that can fall in a regular session.
+    """
+    if len(t) == 0:
+        return np.empty(0, dtype=np.int64)
+    days, inverse = np.unique(t // 86400, return_inverse=True)
+    offsets = np.fromiter(
+        (
+            EXCHANGE_TZ.utcoffset(datetime.fromtimestamp(int(day) * 86400 + 43200, tz=timezone.utc)).total_seconds()
+            for day in days
+        ),
+        dtype=np.int64,
+        count=len(days),
+    )
+    return offsets[inverse]
+
+
+def regular_session_mask(t: np.ndarray, timeframe: str) -> np.ndarray:
+    """True for bars overlapping the 09:30-16:00 New York session on weekdays.
+
+    Bars are matched by overlap rather than start time, so the 09:00 1Hour
+    bar (which holds 09:30-10:00 trading) is kept. Daily and weekly bars are
+    stamped at midnight New York time and span the whole session, so they
+    are always kept.
+    """
+    duration = TIMEFRAME_SECONDS[timeframe]
+    if duration >= 86400:
+        return np.ones(len(t), dtype=bool)
+    local = t + exchange_offsets(t)
+    seconds = local % 86400
+    # 1970-01-01 was a Thursday, so (days + 3) % 7 is 0 on Mondays
+    weekday = (local // 86400 + 3) % 7
+    return (weekday < 5) & (seconds + duration > REGULAR_OPEN) & (seconds < REGULAR_CLOSE)
+
+
+def minmax_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices of at most max_points rows that keep each bucket's low and high.
+
+    Rows are split into equal-count buckets; the first and last rows are always
+    kept so the series keeps its true start and end.
+    """
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = max((max_points - 2) // 2, 1)
+    bucket = np.arange(n) * buckets // n
+    # Sorted by (bucket, value): each bucket's first row is its min, last its max
+    order = np.lexsort((values, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(buckets), side="left")
+    ends = np.append(starts[1:], n) - 1
+    keep = np.concatenate(([0, n - 1], order[starts], order[ends]))
+    return np.unique(keep)
+
+
+def shape_bars(
+    t: np.ndarray,
+    cols: Dict[str, np.ndarray],
+    timeframe: str,
+    fields: Optional[Tuple[str, ...]] = None,
+    max_points: Optional[int] = None,
+    session: str = "all",
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Session filter, min/max downsample on close, then column projection"""
+    if session == "regular":
+        mask = regular_session_mask(t, timeframe)
+        t = t[mask]
+        cols = {field: col[mask] for field, col in cols.items()}
+    if max_points is not None and len(t) > max_points:
+        index = minmax_indices(cols["c"], max_points)
+        t = t[index]
+        cols = {field: col[index] for field, col in cols.items()}
+    if fields is not None:
+        cols = {field: cols[field] for field in fields}
+    return t, cols
+
+
+class BarSeries:
+    """Bars for one (symbol, timeframe), kept sorted by timestamp.
+
+    ``coverage`` is the sorted, merged list of [start, end) ranges that have
+    been fetched from Alpaca, including ranges that legitimately had no bars
+    (weekends, holidays). Bars that may still be forming are never marked as
+    covered; that trailing edge is re-fetched once ``edge_ttl`` has passed.
+    """
+
+    def __init__(self, symbol: str, timeframe: str):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.t = np.empty(0, dtype=np.int64)
+        self.cols = {field: np.empty(0, dtype=dtype) for field, dtype in BAR_FIELDS.items()}
+        self.coverage: List[Tuple[int, int]] = []
+        self.edge_checked: List[Tuple[int, int, float]] = []
+        self.created_at = time.time()
+        self.lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def missing(self, a: int, b: int) -> List[Tuple[int, int]]:
+        """Sub-ranges of [a, b) not covered yet"""
+        gaps = []
+        cursor = a
+        for start, end in self.coverage:
+            if end <= cursor:
+                continue
+            if start >= b:
+                break
+            if start > cursor:
+                gaps.append((cursor, min(start, b)))
+            cursor = max(cursor, end)
+            if cursor >= b:
+                break
+        if cursor < b:
+            gaps.append((cursor, b))
+        return gaps
+
+    def edge_fresh(self, a: int, b: int, edge_ttl: float) -> bool:
+        """True if [a, b) was fetched within edge_ttl seconds (only for open edges)"""
+        now = time.time()
+        self.edge_checked = [(s, e, at) for s, e, at in self.edge_checked if now - at < edge_ttl]
+        return any(s <= a and e >= b for s, e, _ in self.edge_checked)
+
+    def merge(self, t: np.ndarray, cols: Dict[str, np.ndarray], a: int, b: int, fetched_at: float) -> None:
+        """Add fetched bars for [a, b); re-fetched timestamps replace old values"""
+        if len(t):
+            all_t = np.concatenate([t, self.t])
+            # np.unique keeps the first occurrence, i.e. the freshly fetched bar
+            self.t, index = np.unique(all_t, return_index=True)
+            for field in self.cols:
+                self.cols[field] = np.concatenate([cols[field], self.cols[field]])[index]
+
+        closed_until = min(b, int(fetched_at) - TIMEFRAME_SECONDS[self.timeframe])
+        if closed_until > a:
+            self._cover(a, closed_until)
+        if closed_until < b:
+            self.edge_checked.append((max(a, closed_until), b, fetched_at))
+
+    def _cover(self, a: int, b: int) -> None:
+        ranges = sorted(self.coverage + [(a, b)])
+        merged = [ranges[0]]
+        for start, end in ranges[1:]:
+            if start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self.coverage = merged
+
+    def slice(self, a: int, b: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        lo, hi = np.searchsorted(self.t, [a, b], side="left")
+        return self.t[lo:hi], {field: col[lo:hi] for field, col in self.cols.items()}
+
+
+class BarStore:
+    """Range-aware columnar store of Alpaca bars.
+
+    Any [start, end) window is answered by slicing cached arrays; only the
+    uncovered parts are fetched. Series are evicted LRU once the total bar
+    count passes ``max_bars``, and dropped after ``max_age`` seconds because
+    split/dividend adjustments (adjustment=all) can rewrite closed bars.
+    """
+
+    def __init__(self, fetch_range: FetchRange, edge_ttl: float, max_bars: int, max_age: float,
+                 fetch_many: Optional[FetchMany] = None):
+        self.fetch_range = fetch_range
+        self.fetch_many = fetch_many
+        self.edge_ttl = edge_ttl
+        self.max_bars = max_bars
+        self.max_age = max_age
+        self._series: "OrderedDict[Tuple[str, str], BarSeries]" = OrderedDict()
+        self.queries = 0
+        self.full_hits = 0
+        self.gap_fetches = 0
+        self.multi_fetches = 0
+        self.evictions = 0
+
+    def _get_series(self, symbol: str, timeframe: str) -> BarSeries:
+        key = (symbol, timeframe)
+        series = self._series.get(key)
+        if series is not None and time.time() - series.created_at > self.max_age:
+            del self._series[key]
+            series = None
+        if series is None:
+            series = BarSeries(symbol, timeframe)
+            self._series[key] = series
+        self._series.move_to_end(key)
+        return series
+
+    def _evict(self) -> None:
+        total = sum(len(s) for s in self._series.values())
+        while total > self.max_bars and len(self._series) > 1:
+            _, series = self._series.popitem(last=False)
+            total -= len(series)
+            self.evictions += 1
+
+    def _gaps(self, series: BarSeries, a: int, b: int) -> List[Tuple[int, int]]:
+        return [
+            gap for gap in series.missing(a, b)
+            if not series.edge_fresh(gap[0], gap[1], self.edge_ttl)
+        ]
+
+    async def query(self, symbol: str, timeframe: str, a: int, b: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Bars in [a, b), fetching only what the store doesn't have"""
+        self.queries += 1
+        series = self._get_series(symbol, timeframe)
+        async with series.lock:
+            gaps = self._gaps(series, a, b)
+            if not gaps:
+                self.full_hits += 1
+            for gap_a, gap_b in gaps:
+                fetch_a, fetch_b = align_range(gap_a, gap_b, timeframe)
+                fetched_at = time.time()
+                bars = await self.fetch_range(symbol, timeframe, fetch_a, fetch_b)
+                t, cols = bars_to_columns(bars)
+                series.merge(t, cols, fetch_a, fetch_b, fetched_at)
+                self.gap_fetches += 1
+            result = series.slice(a, b)
+        self._evict()
+        return result
+
+    async def _fill_group(self, group: List[BarSeries], timeframe: str, gaps: List[Tuple[int, int]]) -> None:
+        symbols = [series.symbol for series in group]
+        for gap_a, gap_b in gaps:
+            fetch_a, fetch_b = align_range(gap_a, gap_b, timeframe)
+            fetched_at = time.time()
+            bars_by_symbol = await self.fetch_many(symbols, timeframe, fetch_a, fetch_b)
+            for series in group:
+                t, cols = bars_to_columns(bars_by_symbol.get(series.symbol) or [])
+                series.merge(t, cols, fetch_a, fetch_b, fetched_at)
+            self.multi_fetches += 1
+
+    async def query_many(
+        self, symbols: List[str], timeframe: str, a: int, b: int
+    ) -> Dict[str, Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """Bars in [a, b) for several symbols.
+
+        Symbols missing the same ranges are fetched together with fetch_many
+        (one multi-symbol request per gap); the rest go through query().
+        """
+        symbols = sorted(set(symbols))
+        if self.fetch_many is None or len(symbols) < 2:
+            results = await asyncio.gather(*(self.query(s, timeframe, a, b) for s in symbols))
+            return dict(zip(symbols, results))
+
+        self.queries += len(symbols)
+        all_series = [self._get_series(symbol, timeframe) for symbol in symbols]
+        async with contextlib.AsyncExitStack() as stack:
+            # Always locked in symbol order, so overlapping batches can't deadlock
+            for series in all_series:
+                await stack.enter_async_context(series.lock)
+            groups: Dict[Tuple[Tuple[int, int], ...], List[BarSeries]] = {}
+            for series in all_series:
+                groups.setdefault(tuple(self._gaps(series, a, b)), []).append(series)
+            for gaps, group in groups.items():
+                if not gaps:
+                    self.full_hits += len(group)
+            await asyncio.gather(*(
+                self._fill_group(group, timeframe, list(gaps)) for gaps, group in groups.items() if gaps
+            ))
+            results = {series.symbol: series.slice(a, b) for series in all_series}
+        self._evict()
+        return results
+
+    def clear(self) -> None:
+        self._series.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "series": len(self._series),
+            "bars": sum(len(s) for s in self._series.values()),
+            "max_bars": self.max_bars,
+            "queries": self.queries,
+            "full_hits": self.full_hits,
+            "gap_fetches": self.gap_fetches,
+            "multi_fetches": self.multi_fetches,
+            "evictions": self.evictions,
+        }
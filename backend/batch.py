@@ -0,0 +1,129 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+import httpx
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+# Proxies (nginx, Railway's edge) must not buffer streamed responses
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def error_detail(exc: BaseException) -> Dict[str, Any]:
+    """Status and message for one failed batch item, mirroring the single endpoints"""
+    if isinstance(exc, HTTPException):
+        return {"status": exc.status_code, "detail": exc.detail}
+    if isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return {"status": 504, "detail": "External API timeout"}
+    return {"status": 500, "detail": "Internal server error"}
+
+
+def ok_item(symbol: str, data: Any, cache: str) -> Dict[str, Any]:
+    return {"symbol": symbol, "ok": True, "cache": cache, "data": data}
+
+
+def error_item(symbol: str, exc: BaseException) -> Dict[str, Any]:
+    return {"symbol": symbol, "ok": False, "error": error_detail(exc)}
+
+
+ErrorItem = Callable[[str, BaseException], Any]
+
+
+async def _guarded(key: str, fn: Callable[[str], Awaitable[Any]], semaphore: asyncio.Semaphore,
+                   on_error: ErrorItem) -> Any:
+    async with semaphore:
+        try:
+            return await fn(key)
+        except Exception as e:
+            if not isinstance(e, HTTPException):
+                print(f"Batch item failed for {key}: {type(e).__name__}")
+            return on_error(key, e)
+
+
+async def gather_bounded(
+    symbols: Iterable[str],
+    fn: Callable[[str], Awaitable[Dict[str, Any]]],
+    limit: int,
+    on_error: ErrorItem = error_item,
+) -> List[Any]:
+    """Run fn for every symbol, at most ``limit`` at a time, in input order.
+
+    A failing symbol becomes an error item instead of failing the batch.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    return list(await asyncio.gather(*(_guarded(s, fn, semaphore, on_error) for s in symbols)))
+
+
+async def stream_bounded(
+    keys: Iterable[str],
+    fn: Callable[[str], Awaitable[Any]],
+    limit: int,
+    on_error: ErrorItem = error_item,
+) -> AsyncIterator[Any]:
+    """Like gather_bounded, but yields each result as soon as it resolves.
+
+    Pending work is cancelled if the consumer stops early (client disconnect).
+    """
+    semaphore = asyncio.Semaphore(limit)
+    tasks = [asyncio.create_task(_guarded(key, fn, semaphore, on_error)) for key in keys]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def encode_event(item: Any, fmt: str, event: str = "result") -> bytes:
+    payload = orjson.dumps(item)
+    if fmt == "sse":
+        return b"event: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+    return payload + b"\n"
+
+
+def event_stream_response(events: AsyncIterator[Tuple[str, Dict[str, Any]]], fmt: str) -> StreamingResponse:
+    """Flush each (event name, payload) pair as its own NDJSON line / SSE event.
+
+    NDJSON has no event names, so there the name is carried in a "type" field.
+    """
+
+    async def body() -> AsyncIterator[bytes]:
+        async for event, payload in events:
+            if fmt == "ndjson":
+                payload = {"type": event, **payload}
+            yield encode_event(payload, fmt, event=event)
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        headers=STREAM_HEADERS,
+    )
+
+
+def streaming_response(items: AsyncIterator[Dict[str, Any]], fmt: str) -> StreamingResponse:
+    """Flush each item as its own NDJSON line / SSE event, then a final summary.
+
+    Items carry their own ok/error fields, so a failure mid-stream is reported
+    inline rather than through the (already sent) status code.
+    """
+
+    async def body() -> AsyncIterator[bytes]:
+        ok = failed = 0
+        async for item in items:
+            if item.get("ok"):
+                ok += 1
+            else:
+                failed += 1
+            yield encode_event(item, fmt)
+        yield encode_event({"done": True, "ok": ok, "failed": failed}, fmt, event="done")
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        headers=STREAM_HEADERS,
+    )
@@ -0,0 +1,59 @@
+"""Headline extraction time per page: BeautifulSoup baseline vs the streaming parsers.
+
+Runs every extractor in headlines.EXTRACTORS over the synthetic Google
+News-style result pages in benchmarks/fixtures/ (small, typical and large;
+h3 headlines among inline styles, scripts, thumbnails and entities), checks
+each returns exactly what the bs4 reference returns, and reports the
+best-of-N time per page.
+
+    cd backend && python benchmarks/bench_headlines.py [--repeat 50] [--limit 10]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from headlines import EXTRACTORS, extract_headlines_bs4  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def best_of(extractor, html: bytes, limit: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extractor(html, limit)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10, help="headlines kept per page")
+    args = parser.parse_args()
+
+    pages = sorted(glob.glob(os.path.join(FIXTURES, "google_news_*.html")), key=os.path.getsize)
+    names = list(EXTRACTORS)
+    print(f"{'page':<26} {'KB':>5} " + " ".join(f"{name + ' ms':>10}" for name in names) + f" {'speedup':>8}")
+    for path in pages:
+        with open(path, "rb") as f:
+            html = f.read()
+        expected = extract_headlines_bs4(html, args.limit)
+        row = {}
+        for name in names:
+            got = EXTRACTORS[name](html, args.limit)
+            if got != expected:
+                sys.exit(f"{name} disagrees with bs4 on {os.path.basename(path)}: {got[:2]} != {expected[:2]}")
+            row[name] = best_of(EXTRACTORS[name], html, args.limit, args.repeat)
+        baseline = row.get("bs4", max(row.values()))
+        speedup = baseline / min(row.values())
+        print(f"{os.path.basename(path):<26} {len(html) // 1024:>5} "
+              + " ".join(f"{row[name] * 1000:>10.2f}" for name in names) + f" {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Per-request overhead of TimeoutMiddleware: pure ASGI vs the old BaseHTTPMiddleware.
+
+Runs the real app (all middleware, routing and the response cache) in
+process over httpx.ASGITransport twice: once as shipped, once with
+TimeoutMiddleware swapped for the BaseHTTPMiddleware version it replaced
+(call_next under asyncio.wait_for). Measures /test and a cached /finnhub
+hit, best of --rounds rounds of --requests sequential requests. No
+upstream is called; the /finnhub entry is seeded into the cache.
+
+    cd backend && python benchmarks/bench_middleware.py [--requests 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The app refuses to start without keys and would start background jobs
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("FINNHUB_API_KEY", "bench")
+os.environ.setdefault("PREWARM_ENABLED", "false")
+os.environ.setdefault("NEWS_INDEX_ENABLED", "false")
+os.environ.setdefault("CACHE_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="bench-snapshots-"))
+
+from fastapi import Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+import app as server  # noqa: E402
+from deadline import REQUEST_TIMEOUT_SECONDS, deadline_scope  # noqa: E402
+from middleware import TimeoutMiddleware  # noqa: E402
+
+SYMBOL = "AAPL"
+FINNHUB_PAYLOAD = {
+    "symbol": SYMBOL,
+    "earnings": [
+        {"period": f"2024-{month:02d}-30", "actual": 1.4 + i / 10, "estimate": 1.35 + i / 10, "surprise": 0.05}
+        for i, month in enumerate((3, 6, 9, 12))
+    ],
+    "profile": {"name": "Apple Inc", "ticker": SYMBOL, "exchange": "NASDAQ", "finnhubIndustry": "Technology"},
+    "metrics": {f"metric{i}": i * 1.5 for i in range(120)},
+}
+
+
+class LegacyTimeoutMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware TimeoutMiddleware that middleware.TimeoutMiddleware replaced"""
+
+    async def dispatch(self, request: Request, call_next):
+        try:
+            with deadline_scope(REQUEST_TIMEOUT_SECONDS):
+                return await asyncio.wait_for(call_next(request), timeout=REQUEST_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return JSONResponse(status_code=504, content={"detail": "Request timeout"})
+
+
+def use_timeout_middleware(cls) -> None:
+    server.app.user_middleware = [
+        Middleware(cls, **m.options) if m.cls in (TimeoutMiddleware, LegacyTimeoutMiddleware) else m
+        for m in server.app.user_middleware
+    ]
+    server.app.middleware_stack = None
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int, rounds: int) -> float:
+    """Best microseconds per request over rounds"""
+    for _ in range(requests // 10):
+        await client.get(path)
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path)
+        best = min(best, (time.perf_counter() - started) / requests * 1e6)
+    return best
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = ("/test", f"/finnhub/{SYMBOL}")
+    results = {}
+    async with server.app.router.lifespan_context(server.app):
+        cache_key = server.finnhub_cache_key(SYMBOL, server.COMPANY_NAMES.get(SYMBOL, SYMBOL))
+        await server.set_cached_data(server.finnhub_cache, cache_key, FINNHUB_PAYLOAD, "finnhub")
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for label, cls in (("BaseHTTPMiddleware", LegacyTimeoutMiddleware), ("pure ASGI", TimeoutMiddleware)):
+                use_timeout_middleware(cls)
+                response = await client.get(paths[1])
+                if response.headers.get("x-cache") != "HIT":
+                    sys.exit(f"/finnhub was not served from the cache: {response.status_code}")
+                results[label] = [await measure(client, path, args.requests, args.rounds) for path in paths]
+
+    print(f"{'TimeoutMiddleware':<20} " + " ".join(f"{path + ' us':>18}" for path in paths))
+    for label, timings in results.items():
+        print(f"{label:<20} " + " ".join(f"{t:>18.0f}" for t in timings))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
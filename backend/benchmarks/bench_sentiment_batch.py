@@ -0,0 +1,139 @@
+"""Throughput and cost of grouped sentiment refreshes against a mock LLM.
+
+Refreshes N companies (10 headlines each) two ways through the real
+AsyncOpenAI client, with the chat completions endpoint served by a local
+mock: one /search prompt per company (analyze_with_memo), and grouped
+multi-company prompts (SentimentBatcher). The mock answers after a fixed
+latency plus a per-output-token delay, and reports token usage the way the
+API does (~4 characters per token), so the cost column uses gpt-4o list
+prices.
+
+    cd backend && python benchmarks/bench_sentiment_batch.py [--companies 400]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import openai
+import orjson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cache_backends import MemoryBackend  # noqa: E402
+from sentiment import LLMGate, SentimentBatcher, SentimentMemo, analyze_with_memo  # noqa: E402
+
+# USD per 1M tokens
+INPUT_PRICE = 2.50
+OUTPUT_PRICE = 10.00
+SUMMARY = "Average Sentiment Score: 6/10\n- Steady demand noted across recent coverage\n- Margin outlook mixed"
+
+
+def tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class MockLLM:
+    """Chat completions handler for httpx.MockTransport"""
+
+    def __init__(self, latency: float, per_token: float):
+        self.latency = latency
+        self.per_token = per_token
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = orjson.loads(request.content)
+        messages = body["messages"]
+        if body.get("response_format"):
+            companies = []
+            for company_id, block in enumerate(messages[1]["content"].split("\n\n"), 1):
+                companies.append({"id": company_id, "sentiment": SUMMARY})
+            content = orjson.dumps({"companies": companies}).decode()
+        else:
+            content = SUMMARY
+        prompt = sum(tokens(m["content"]) for m in messages)
+        completion = tokens(content)
+        self.calls += 1
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        await asyncio.sleep(self.latency + completion * self.per_token)
+        return httpx.Response(200, json={
+            "id": f"mock-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt, "completion_tokens": completion,
+                      "total_tokens": prompt + completion},
+        })
+
+
+def universe(n: int):
+    return {
+        f"Company {i}": [f"Company {i} headline {j}: quarterly update on revenue and guidance" for j in range(10)]
+        for i in range(n)
+    }
+
+
+def memo_backend(name: str) -> MemoryBackend:
+    return MemoryBackend(name, 3600, 100_000, 256 * 1024 * 1024)
+
+
+async def run(mode: str, items, args) -> dict:
+    llm = MockLLM(args.latency, args.per_token)
+    client = openai.AsyncOpenAI(
+        api_key="mock", base_url="http://mock/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(llm)),
+    )
+    gate = LLMGate(args.concurrency)
+    memo = SentimentMemo(memo_backend("sentiment"))
+    started = time.perf_counter()
+    if mode == "single":
+        await asyncio.gather(*(
+            analyze_with_memo(client, gate, memo, company, headlines) for company, headlines in items.items()
+        ))
+    else:
+        batcher = SentimentBatcher(client, gate, memo,
+                                   max_companies=args.group_companies, max_headlines=args.group_headlines)
+        await batcher.analyze_many(items)
+    elapsed = time.perf_counter() - started
+    await client.close()
+    cost = (llm.prompt_tokens * INPUT_PRICE + llm.completion_tokens * OUTPUT_PRICE) / 1e6
+    return {
+        "mode": mode,
+        "calls": llm.calls,
+        "prompt_tokens": llm.prompt_tokens,
+        "completion_tokens": llm.completion_tokens,
+        "seconds": elapsed,
+        "companies_per_second": len(items) / elapsed,
+        "cost_usd": cost,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8, help="LLMGate limit")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock seconds per call")
+    parser.add_argument("--per-token", type=float, default=0.0005, help="mock seconds per output token")
+    parser.add_argument("--group-companies", type=int, default=8)
+    parser.add_argument("--group-headlines", type=int, default=80)
+    args = parser.parse_args()
+
+    items = universe(args.companies)
+    print(f"{args.companies} companies x 10 headlines, concurrency {args.concurrency}, "
+          f"mock latency {args.latency}s + {args.per_token * 1000:g}ms/token")
+    print(f"{'mode':<8} {'calls':>6} {'prompt tok':>11} {'output tok':>11} {'seconds':>8} {'co/s':>7} {'cost $':>8}")
+    for mode in ("single", "grouped"):
+        r = await run(mode, items, args)
+        print(f"{r['mode']:<8} {r['calls']:>6} {r['prompt_tokens']:>11} {r['completion_tokens']:>11} "
+              f"{r['seconds']:>8.2f} {r['companies_per_second']:>7.1f} {r['cost_usd']:>8.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
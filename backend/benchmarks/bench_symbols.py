@@ -0,0 +1,100 @@
+"""/symbols/suggest latency over the whole symbol universe.
+
+Times SymbolIndex.build() and SymbolIndex.suggest() for every prefix of
+every tracked symbol, company name and CSV alias, and for one transposition
+typo per name (answered by the trigram fallback), reporting p50/p99/max.
+Then times GET /symbols/suggest through the real app in process over
+httpx.ASGITransport (all middleware included, rate limit off, no upstream
+calls).
+
+    cd backend && python benchmarks/bench_symbols.py [--requests 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The app refuses to start without keys and would start background jobs
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("PREWARM_ENABLED", "false")
+os.environ.setdefault("NEWS_INDEX_ENABLED", "false")
+os.environ.setdefault("CACHE_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="bench-snapshots-"))
+
+import app as server  # noqa: E402
+from symbols import SymbolIndex, compact, normalize  # noqa: E402
+
+
+def queries(index: SymbolIndex):
+    """(prefix queries, typo queries that match no prefix)"""
+    prefixes, typos = [], []
+    for entry, symbol in enumerate(index.symbols):
+        for text in (symbol, index.names[entry]) + index.aliases.get(symbol, ()):
+            prefixes += [text[:n] for n in range(1, len(text) + 1)]
+        name = index.names[entry]
+        if len(name) > 4:
+            typo = name[:2] + name[3] + name[2] + name[4:]
+            if not (index.prefixes.get(normalize(typo)) or index.prefixes.get(compact(typo))):
+                typos.append(typo)
+    return prefixes, typos
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return (timings[len(timings) // 2], timings[int(len(timings) * 0.99)], timings[-1])
+
+
+async def endpoint(path: str, requests: int, rounds: int) -> float:
+    """Best microseconds per request over rounds"""
+    best = float("inf")
+    # Thousands of requests from one client would hit the per-IP rate limit
+    server.limiter.enabled = False
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get(path)
+            if response.status_code != 200:
+                sys.exit(f"{path}: {response.status_code}")
+            for _ in range(requests // 10):
+                await client.get(path)
+            for _ in range(rounds):
+                started = time.perf_counter()
+                for _ in range(requests):
+                    await client.get(path)
+                best = min(best, (time.perf_counter() - started) / requests * 1e6)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = SymbolIndex.build()
+    print(f"build: {(time.perf_counter() - started) * 1000:.1f} ms, {index.stats()}")
+
+    prefixes, typos = queries(index)
+    print(f"{'queries':<10} {'count':>7} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for label, batch in (("prefix", prefixes), ("typo", typos)):
+        timings = []
+        for query in batch:
+            started = time.perf_counter_ns()
+            index.suggest(query, args.limit)
+            timings.append((time.perf_counter_ns() - started) / 1000)
+        p50, p99, worst = percentiles(timings)
+        print(f"{label:<10} {len(batch):>7} {p50:>8.1f} {p99:>8.1f} {worst:>8.1f}")
+
+    for path in ("/test", "/symbols/suggest?q=walt%20d", "/symbols/suggest?q=nvidai"):
+        print(f"GET {path}: {asyncio.run(endpoint(path, args.requests, args.rounds)):.0f} us/request")
+
+
+if __name__ == "__main__":
+    main()
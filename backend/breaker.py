@@ -0,0 +1,97 @@
+import time
+from typing import Any, Dict
+
+from fastapi import HTTPException
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(HTTPException):
+    """Raised instead of calling a host whose circuit is open"""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{host} temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+        self.host = host
+
+    def __str__(self) -> str:
+        return self.detail
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one upstream host.
+
+    ``failure_threshold`` consecutive failures (transport errors, timeouts,
+    5xx) open the circuit, and calls then fail fast with CircuitOpen for
+    ``reset_timeout`` seconds. After that one probe call is let through
+    (half-open): success closes the circuit, failure re-opens it with the
+    timeout doubled, up to ``max_reset_timeout``.
+    """
+
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 300.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    def before_call(self) -> None:
+        """Raise CircuitOpen unless a call may go out now"""
+        if self.state == CLOSED:
+            return
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if self.state == OPEN and remaining <= 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpen(self.host, max(remaining, 1.0))
+
+    def record_success(self) -> None:
+        self._probing = False
+        self.failures = 0
+        if self.state != CLOSED:
+            print(f"Circuit for {self.host} closed")
+        self.state = CLOSED
+        self.reset_timeout = self.base_reset_timeout
+
+    def release(self) -> None:
+        """A call ended without an outcome (e.g. cancelled); free the probe slot"""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self._probing = False
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        print(f"Circuit for {self.host} open for {self.reset_timeout:g}s after {self.failures} failures")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "reset_timeout": self.reset_timeout,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from deadline import DEADLINE_MARGIN_SECONDS, remaining
+from upstream import TokenBucket
+
+# Lower runs first: user-facing misses ahead of prewarm/revalidation work
+USER = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {USER: "user", BACKGROUND: "background"}
+
+# Priority of the upstream calls made from the current task (tasks inherit it)
+upstream_priority: ContextVar[int] = ContextVar("upstream_priority", default=USER)
+
+
+@contextmanager
+def background_priority():
+    """Mark upstream calls made inside the block (and tasks it starts) as background"""
+    token = upstream_priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        upstream_priority.reset(token)
+
+
+class BudgetExhausted(HTTPException):
+    """The provider's budget can't cover a user call within the wait limit"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(
+            status_code=429,
+            detail=f"{provider} rate budget exhausted",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+        self.provider = provider
+
+    def __str__(self) -> str:
+        return self.detail
+
+
+class WaitStats:
+    __slots__ = ("granted", "shed", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.granted = 0
+        self.shed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "granted": self.granted,
+            "shed": self.shed,
+            "avg_wait_ms": round(self.wait_total / max(self.granted, 1) * 1000, 3),
+            "max_wait_ms": round(self.wait_max * 1000, 3),
+        }
+
+
+class PriorityBucket(TokenBucket):
+    """Token bucket whose waiters are served in priority order.
+
+    User calls may spend the bucket down to zero; background calls stop at
+    ``reserve`` (a fraction of capacity), leaving headroom so a burst of
+    user misses doesn't queue behind prewarm traffic. A user call whose
+    estimated wait exceeds ``max_wait`` (or what is left of its request
+    deadline) is shed with BudgetExhausted rather than queued past the
+    request timeout; background calls just wait.
+    """
+
+    def __init__(self, name: str, rate_per_second: float, capacity: float,
+                 reserve: float = 0.25, max_wait: float = 10.0):
+        super().__init__(name, rate_per_second, capacity)
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._seq = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.waits = {priority: WaitStats() for priority in PRIORITY_NAMES}
+
+    def _floor(self, priority: int) -> float:
+        return 0.0 if priority == USER else self.capacity * self.reserve
+
+    def _ahead(self, priority: int) -> float:
+        return sum(cost for p, _, cost, future in self._waiters if p <= priority and not future.done())
+
+    def _take(self, cost: float) -> None:
+        self.tokens -= cost
+        self.granted += 1
+
+    def _record(self, priority: int, waited: float) -> None:
+        stats = self.waits[priority]
+        stats.granted += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+
+    async def acquire(self, cost: float = 1.0, priority: Optional[int] = None) -> None:
+        """Wait for cost tokens in priority order (the task's upstream_priority by default)"""
+        if priority is None:
+            priority = upstream_priority.get()
+        self._refill()
+        if not self._waiters and self.tokens - cost >= self._floor(priority):
+            self._take(cost)
+            self._record(priority, 0.0)
+            return
+
+        wait = (self._ahead(priority) + cost + self._floor(priority) - self.tokens) / self.rate
+        max_wait = self.max_wait
+        left = remaining()
+        if left is not None:
+            max_wait = min(max_wait, left - DEADLINE_MARGIN_SECONDS)
+        if priority == USER and wait > max_wait:
+            self.waits[priority].shed += 1
+            raise BudgetExhausted(self.name, wait)
+
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, (priority, self._seq, cost, future))
+        self._schedule()
+        started = time.monotonic()
+        await future
+        self._record(priority, time.monotonic() - started)
+
+    def try_acquire(self, cost: float = 1.0) -> bool:
+        """Take cost tokens only if that keeps the background reserve intact
+        (for optional extra calls such as hedges); never waits"""
+        self._refill()
+        if self._waiters or self.tokens - cost < self._floor(BACKGROUND):
+            return False
+        self._take(cost)
+        return True
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self._waiters[0][3].done():
+            heapq.heappop(self._waiters)
+        if not self._waiters:
+            return
+        priority, _, cost, _ = self._waiters[0]
+        delay = max(0.0, (cost + self._floor(priority) - self.tokens) / self.rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        self._refill()
+        while self._waiters:
+            priority, _, cost, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens - cost < self._floor(priority):
+                break
+            heapq.heappop(self._waiters)
+            self._take(cost)
+            future.set_result(None)
+        self._schedule()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "reserve": self.reserve,
+            "queued": sum(1 for *_, future in self._waiters if not future.done()),
+            **{PRIORITY_NAMES[p]: stats.to_dict() for p, stats in self.waits.items()},
+        }
+
+
+class UpstreamBudget:
+    """Outbound request budgets, one PriorityBucket per provider"""
+
+    def __init__(self, buckets: Dict[str, PriorityBucket]):
+        self.buckets = buckets
+
+    async def acquire(self, provider: str, cost: float = 1.0) -> None:
+        bucket = self.buckets.get(provider)
+        if bucket is not None:
+            await bucket.acquire(cost)
+
+    def try_acquire(self, provider: str, cost: float = 1.0) -> bool:
+        bucket = self.buckets.get(provider)
+        return bucket is None or bucket.try_acquire(cost)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: bucket.stats() for name, bucket in self.buckets.items()}
@@ -0,0 +1,257 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+
+def estimate_size(data: Any) -> int:
+    """Approximate size in bytes of a JSON-shaped value"""
+    try:
+        return len(orjson.dumps(data, default=str))
+    except (TypeError, orjson.JSONEncodeError):
+        return len(repr(data))
+
+
+class CacheEntry:
+    __slots__ = ("data", "timestamp", "expires_at", "size")
+
+    def __init__(self, data: Any, timestamp: float, expires_at: float, size: int):
+        self.data = data
+        self.timestamp = timestamp
+        self.expires_at = expires_at
+        self.size = size
+
+
+class TTLCache:
+    """Bounded LRU cache with a fixed TTL per namespace.
+
+    Entries live in an OrderedDict kept in LRU order, so lookups, inserts and
+    evictions are O(1). A second OrderedDict keeps keys in expiry order (every
+    entry in a namespace shares the same TTL), which lets ``sweep`` drop
+    expired entries without scanning the live ones.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.pop(key, None)
+        self._expiry.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the live entry for key, or None if missing/expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry for key without touching LRU order or counters"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, data: Any, timestamp: Optional[float] = None, size: Optional[int] = None) -> bool:
+        """Store data under key, evicting LRU entries to stay within bounds.
+
+        Pass the original timestamp to restore an entry with its remaining TTL.
+        """
+        if size is None:
+            size = estimate_size(data)
+        if size > self.max_bytes:
+            self.rejected += 1
+            return False
+
+        timestamp = time.time() if timestamp is None else timestamp
+        entry = CacheEntry(data, timestamp, timestamp + self.ttl_seconds, size)
+        if entry.expires_at <= time.time():
+            return False
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._expiry[key] = entry.expires_at
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._remove(key) is not None
+
+    def items(self) -> List[Tuple[str, CacheEntry]]:
+        """Snapshot of live entries, least recently used first"""
+        now = time.time()
+        with self._lock:
+            return [(key, entry) for key, entry in self._entries.items() if entry.expires_at > now]
+
+    def sweep(self) -> int:
+        """Remove expired entries, oldest first. Returns the number removed"""
+        removed = 0
+        now = time.time()
+        with self._lock:
+            while self._expiry:
+                key, expires_at = next(iter(self._expiry.items()))
+                if expires_at > now:
+                    break
+                self._remove(key)
+                removed += 1
+            self.expirations += removed
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._expiry.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "cache_hours": self.ttl_seconds / 3600,
+                "total_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "rejected": self.rejected,
+            }
+
+
+class CacheSweeper:
+    """Background task that periodically sweeps expired entries from cache backends"""
+
+    def __init__(self, caches: Iterable[Any], interval: float = 60.0):
+        self.caches = list(caches)
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for cache in self.caches:
+                try:
+                    removed = await cache.sweep()
+                except Exception as e:
+                    print(f"Cache SWEEP error for {cache.name}: {type(e).__name__}")
+                    continue
+                if removed:
+                    print(f"Cache SWEEP for {cache.name}: removed {removed} expired entries")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single call.
+
+    The first caller for a key starts the work as its own task; concurrent
+    callers await that task and share its result or exception. Running the
+    work in a separate task means a cancelled caller (client disconnect,
+    request timeout) does not cancel the fetch the others are waiting on.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            print(f"Coalesced request for key: {key}")
+        return await asyncio.shield(task)
+
+    async def do_many(self, keys: List[str], fn: Callable[[List[str]], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Coalesce a batch: keys already in flight are joined, the rest are
+        fetched by one call of fn(missing keys), which returns key -> result
+        (or an exception for that key). While it runs each missing key counts
+        as in flight, so do(key) callers join the batch instead of refetching.
+        Returns key -> result or exception, in the order of keys."""
+        missing = [key for key in dict.fromkeys(keys) if key not in self._calls]
+        if missing:
+            batch = asyncio.ensure_future(fn(missing))
+            for key in missing:
+                task = asyncio.ensure_future(self._pick(batch, key))
+                self._calls[key] = task
+                task.add_done_callback(lambda t, key=key: self._forget(key, t))
+                self.leaders += 1
+        tasks = {key: self._calls[key] for key in keys if key in self._calls}
+        self.coalesced += len(tasks) - len(missing)
+        results = await asyncio.gather(*(asyncio.shield(t) for t in tasks.values()), return_exceptions=True)
+        return dict(zip(tasks, results))
+
+    @staticmethod
+    async def _pick(batch: "asyncio.Future", key: str) -> Any:
+        result = (await asyncio.shield(batch))[key]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def running(self, key: str) -> bool:
+        return key in self._calls
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter has gone away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
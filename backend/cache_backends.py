@@ -0,0 +1,413 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+from cache import CacheEntry, TTLCache
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+
+def encode_entry(data: Any, timestamp: float) -> bytes:
+    return orjson.dumps({"t": timestamp, "d": data})
+
+
+def decode_entry(raw: bytes) -> Tuple[float, Any]:
+    payload = orjson.loads(raw)
+    return payload["t"], payload["d"]
+
+
+class CacheBackend:
+    """Storage for one cache namespace.
+
+    Every backend shares the TTLCache contract: entries expire ttl_seconds
+    after they are set, and get() returns a CacheEntry or None.
+    """
+
+    kind = "base"
+
+    def __init__(self, name: str, ttl_seconds: float):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    async def set(self, key: str, data: Any) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def peek_expiry(self, key: str) -> Optional[float]:
+        """Expiry time of key without counting a hit or miss, or None if absent"""
+        raise NotImplementedError
+
+    async def sweep(self) -> int:
+        return 0
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "backend": self.kind,
+            "cache_hours": self.ttl_seconds / 3600,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Per-process bounded LRU (see cache.TTLCache)"""
+
+    kind = "memory"
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int, max_bytes: int):
+        super().__init__(name, ttl_seconds)
+        self.cache = TTLCache(name, ttl_seconds, max_entries=max_entries, max_bytes=max_bytes)
+        self.snapshot = None
+
+    def attach_snapshot(self, reader) -> None:
+        """Fall back to a snapshot.SnapshotReader for keys not yet in memory"""
+        self.snapshot = reader
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.cache.get(key)
+        if entry is None and self.snapshot is not None:
+            restored = self.snapshot.pop(key)
+            if restored is not None and self.cache.set(key, restored.data, restored.timestamp, restored.size):
+                print(f"Cache RESTORED for {self.name} key: {key} from snapshot")
+                return self.cache.peek(key)
+        return entry
+
+    async def set(self, key: str, data: Any) -> bool:
+        if self.snapshot is not None:
+            self.snapshot.discard(key)
+        return self.cache.set(key, data)
+
+    async def delete(self, key: str) -> bool:
+        if self.snapshot is not None:
+            self.snapshot.discard(key)
+        return self.cache.delete(key)
+
+    async def peek_expiry(self, key: str) -> Optional[float]:
+        entry = self.cache.peek(key)
+        if entry is not None:
+            return entry.expires_at
+        if self.snapshot is not None:
+            return self.snapshot.expires_at(key)
+        return None
+
+    async def sweep(self) -> int:
+        return self.cache.sweep()
+
+    async def clear(self) -> None:
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+        self.cache.clear()
+
+    async def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "backend": self.kind}
+
+
+class FallbackBackend(CacheBackend):
+    """A shared backend that degrades to a per-process memory cache.
+
+    When the store fails (server down, disk full, locked file) the operation
+    is counted in ``errors`` and served from a local TTLCache instead, so an
+    outage costs cache sharing, not requests. Entries written to the
+    fallback stay readable after the store recovers, until they expire.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int, max_bytes: int):
+        super().__init__(name, ttl_seconds)
+        self.fallback = TTLCache(name, ttl_seconds, max_entries=max_entries, max_bytes=max_bytes)
+        self.errors = 0
+
+    def _failed(self, operation: str, e: Exception) -> None:
+        self.errors += 1
+        print(f"{self.kind.capitalize()} {operation} error for {self.name}: {type(e).__name__}")
+
+    def _fallback_get(self, key: str) -> Optional[CacheEntry]:
+        if not len(self.fallback):
+            return None
+        return self.fallback.get(key)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {**await super().stats(), "errors": self.errors, "fallback_entries": len(self.fallback)}
+
+
+class DiskBackend(FallbackBackend):
+    """SQLite file shared by every worker on the same host.
+
+    WAL mode lets several uvicorn workers read concurrently while one writes.
+    Queries run in a worker thread to keep file I/O off the event loop.
+    Beyond max_entries or max_bytes the oldest writes are evicted: on set()
+    once the tracked size passes max_bytes, and in sweep().
+    """
+
+    kind = "disk"
+
+    def __init__(self, name: str, ttl_seconds: float, path: str, max_entries: int, max_bytes: int):
+        super().__init__(name, ttl_seconds, max_entries, max_bytes)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, timestamp REAL NOT NULL, "
+            "expires_at REAL NOT NULL, value BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at)")
+        # Upper bound on the stored bytes (replaced values are counted twice
+        # until the next trim recomputes it)
+        self._bytes = self._size()
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    async def _run(self, sql: str, params: tuple = ()):
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def _run_write(self, sql: str, params: tuple = ()) -> int:
+        return await asyncio.to_thread(self._write, sql, params)
+
+    def _size(self) -> int:
+        return self._execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries")[0][0]
+
+    def _trim(self) -> int:
+        """Drop the oldest writes beyond max_bytes, then beyond max_entries"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM (SELECT key, "
+                "SUM(LENGTH(value)) OVER (ORDER BY timestamp DESC, key) AS running FROM entries) "
+                "WHERE running > ?)",
+                (self.max_bytes,),
+            ).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries "
+                "ORDER BY timestamp DESC, key LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()[0]
+        self.evictions += removed
+        return removed
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        try:
+            rows = await self._run(
+                "SELECT timestamp, expires_at, value FROM entries WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            )
+        except sqlite3.Error as e:
+            self._failed("GET", e)
+            rows = []
+        if not rows:
+            entry = self._fallback_get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+        timestamp, expires_at, value = rows[0]
+        self.hits += 1
+        return CacheEntry(orjson.loads(value), timestamp, expires_at, len(value))
+
+    async def set(self, key: str, data: Any) -> bool:
+        now = time.time()
+        value = orjson.dumps(data)
+        if len(value) > self.max_bytes:
+            return False
+        try:
+            await self._run_write(
+                "INSERT OR REPLACE INTO entries (key, timestamp, expires_at, value) VALUES (?, ?, ?, ?)",
+                (key, now, now + self.ttl_seconds, value),
+            )
+        except sqlite3.Error as e:
+            self._failed("SET", e)
+            return self.fallback.set(key, data, now, len(value))
+        self.fallback.delete(key)
+        self._bytes += len(value)
+        if self._bytes > self.max_bytes:
+            await asyncio.to_thread(self._trim)
+        return True
+
+    async def delete(self, key: str) -> bool:
+        self.fallback.delete(key)
+        try:
+            await self._run_write("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            self._failed("DELETE", e)
+            return False
+        return True
+
+    async def peek_expiry(self, key: str) -> Optional[float]:
+        try:
+            rows = await self._run("SELECT expires_at FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error:
+            rows = []
+        if rows:
+            return rows[0][0]
+        entry = self.fallback.peek(key)
+        return entry.expires_at if entry is not None else None
+
+    async def sweep(self) -> int:
+        removed = self.fallback.sweep()
+        try:
+            removed += await self._run_write("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            removed += await asyncio.to_thread(self._trim)
+        except sqlite3.Error as e:
+            self._failed("SWEEP", e)
+        return removed
+
+    async def clear(self) -> None:
+        self.fallback.clear()
+        await self._run_write("DELETE FROM entries")
+        self._bytes = 0
+
+    async def stats(self) -> Dict[str, Any]:
+        rows = await self._run("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries")
+        entries, size = rows[0]
+        return {
+            **await super().stats(),
+            "path": self.path,
+            "total_entries": entries,
+            "max_entries": self.max_entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisBackend(FallbackBackend):
+    """Any Redis-protocol server (Redis, Valkey, KeyDB, Dragonfly).
+
+    Expiry is delegated to the server with SET EX, and size bounds to its
+    maxmemory policy, so sweep() only has the memory fallback to expire.
+    """
+
+    kind = "redis"
+
+    def __init__(self, name: str, ttl_seconds: float, url: str, max_entries: int, max_bytes: int,
+                 prefix: str = "scout", client=None):
+        super().__init__(name, ttl_seconds, max_entries, max_bytes)
+        if client is None and redis_asyncio is None:
+            raise RuntimeError("redis cache backend selected but the redis package is not installed")
+        self.url = url
+        self.prefix = f"{prefix}:{name}:"
+        self._client = client if client is not None else redis_asyncio.from_url(url)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        try:
+            raw = await self._client.get(self.prefix + key)
+        except Exception as e:
+            # A cache outage should degrade to local memory, not fail the request
+            self._failed("GET", e)
+            raw = None
+        if raw is None:
+            entry = self._fallback_get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+        timestamp, data = decode_entry(raw)
+        self.hits += 1
+        return CacheEntry(data, timestamp, timestamp + self.ttl_seconds, len(raw))
+
+    async def set(self, key: str, data: Any) -> bool:
+        now = time.time()
+        raw = encode_entry(data, now)
+        try:
+            await self._client.set(self.prefix + key, raw, ex=max(int(self.ttl_seconds), 1))
+        except Exception as e:
+            self._failed("SET", e)
+            return self.fallback.set(key, data, now, len(raw))
+        self.fallback.delete(key)
+        return True
+
+    async def delete(self, key: str) -> bool:
+        local = self.fallback.delete(key)
+        try:
+            return bool(await self._client.delete(self.prefix + key)) or local
+        except Exception as e:
+            self._failed("DELETE", e)
+            return local
+
+    async def peek_expiry(self, key: str) -> Optional[float]:
+        try:
+            ttl_ms = await self._client.pttl(self.prefix + key)
+        except Exception:
+            ttl_ms = -2
+        if ttl_ms > 0:
+            return time.time() + ttl_ms / 1000
+        entry = self.fallback.peek(key)
+        return entry.expires_at if entry is not None else None
+
+    async def sweep(self) -> int:
+        return self.fallback.sweep()
+
+    async def clear(self) -> None:
+        self.fallback.clear()
+        keys = [key async for key in self._client.scan_iter(match=self.prefix + "*", count=500)]
+        for i in range(0, len(keys), 500):
+            await self._client.delete(*keys[i:i + 500])
+
+    async def stats(self) -> Dict[str, Any]:
+        return {**await super().stats(), "url": self.url.split("@")[-1]}
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_backend(kind: str, name: str, ttl_seconds: float, limits: Dict[str, int]) -> CacheBackend:
+    """Build the backend selected for a namespace.
+
+    If a disk or redis backend can't be set up (no redis package, unusable
+    CACHE_DIR) the namespace runs on the memory backend instead.
+    """
+    max_entries, max_bytes = limits["max_entries"], limits["max_bytes"]
+    try:
+        if kind == "disk":
+            cache_dir = os.getenv("CACHE_DIR", ".cache")
+            path = os.path.join(cache_dir, f"{name}.sqlite3")
+            return DiskBackend(name, ttl_seconds, path, max_entries, max_bytes)
+        if kind == "redis":
+            url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            return RedisBackend(name, ttl_seconds, url, max_entries, max_bytes)
+    except (RuntimeError, OSError, sqlite3.Error) as e:
+        print(f"Cache backend {kind} unavailable for {name}, using memory: {type(e).__name__}")
+        return MemoryBackend(name, ttl_seconds, max_entries, max_bytes)
+    if kind == "memory":
+        return MemoryBackend(name, ttl_seconds, max_entries, max_bytes)
+    raise ValueError(f"Unknown cache backend: {kind}")
@@ -0,0 +1,57 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException
+
+# Whole-request budget enforced by TimeoutMiddleware
+REQUEST_TIMEOUT_SECONDS = 30.0
+# Kept back from every upstream timeout so the handler can still respond
+DEADLINE_MARGIN_SECONDS = 0.5
+
+# time.monotonic() by which the current request must be answered, if any
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    """Too little of the request budget is left to start another upstream call"""
+
+    def __init__(self):
+        super().__init__(status_code=504, detail="Request deadline exceeded")
+
+    def __str__(self) -> str:
+        return self.detail
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Run the block with a deadline ``seconds`` from now (None: no deadline,
+    e.g. background work started from inside a request)"""
+    token = request_deadline.set(None if seconds is None else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def call_timeout(default: float) -> float:
+    """Timeout for one upstream call: ``default`` capped by the remaining budget.
+
+    Raises DeadlineExceeded when the call couldn't finish in time anyway.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    left -= DEADLINE_MARGIN_SECONDS
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(default, left)
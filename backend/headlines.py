@@ -0,0 +1,105 @@
+import asyncio
+import os
+from html.parser import HTMLParser
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+MAX_HEADLINES = 10
+# Pages are fed in chunks so the streaming extractors can stop early
+CHUNK_SIZE = 32 * 1024
+
+Extractor = Callable[[bytes, int], List[str]]
+
+
+def extract_headlines_bs4(html: bytes, limit: int = MAX_HEADLINES) -> List[str]:
+    """Reference implementation: h3 text via BeautifulSoup's html.parser"""
+    soup = BeautifulSoup(html, "html.parser")
+    return [h3.get_text(strip=True) for h3 in soup.find_all("h3")][:limit]
+
+
+class _H3Parser(HTMLParser):
+    """Collects h3 text like get_text(strip=True): every text node stripped, joined"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.headlines: List[str] = []
+        self._depth = 0
+        self._parts: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "h3":
+            self._depth += 1
+
+    def handle_endtag(self, tag):
+        if tag == "h3" and self._depth:
+            self._depth -= 1
+            if not self._depth:
+                self.headlines.append("".join(self._parts))
+                self._parts = []
+
+    def handle_data(self, data):
+        if self._depth:
+            stripped = data.strip()
+            if stripped:
+                self._parts.append(stripped)
+
+
+def extract_headlines_stdlib(html: bytes, limit: int = MAX_HEADLINES) -> List[str]:
+    """Streaming html.parser pass that stops once ``limit`` h3s are closed"""
+    parser = _H3Parser()
+    text = html.decode("utf-8", errors="replace")
+    for start in range(0, len(text), CHUNK_SIZE):
+        parser.feed(text[start:start + CHUNK_SIZE])
+        if len(parser.headlines) >= limit:
+            break
+    return parser.headlines[:limit]
+
+
+def extract_headlines_lxml(html: bytes, limit: int = MAX_HEADLINES) -> List[str]:
+    """libxml2 pull parser restricted to h3 elements, stopping at ``limit``"""
+    parser = etree.HTMLPullParser(events=("end",), tag="h3")
+    headlines: List[str] = []
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start:start + CHUNK_SIZE])
+        for _, element in parser.read_events():
+            headlines.append("".join(part.strip() for part in element.itertext()))
+            if len(headlines) >= limit:
+                return headlines
+    parser.close()
+    for _, element in parser.read_events():
+        headlines.append("".join(part.strip() for part in element.itertext()))
+    return headlines[:limit]
+
+
+EXTRACTORS: Dict[str, Extractor] = {
+    "bs4": extract_headlines_bs4,
+    "stdlib": extract_headlines_stdlib,
+}
+if etree is not None:
+    EXTRACTORS["lxml"] = extract_headlines_lxml
+
+
+def select_extractor(name: str) -> Extractor:
+    """HEADLINE_EXTRACTOR: lxml, stdlib, bs4 or auto (lxml when installed)"""
+    name = name.strip().lower()
+    if name == "auto":
+        name = "lxml" if "lxml" in EXTRACTORS else "stdlib"
+    if name not in EXTRACTORS:
+        print(f"Headline extractor {name!r} unavailable, using stdlib")
+        name = "stdlib"
+    print(f"Headline extractor: {name}")
+    return EXTRACTORS[name]
+
+
+extract_headlines = select_extractor(os.getenv("HEADLINE_EXTRACTOR", "auto"))
+
+
+async def extract_headlines_async(html: bytes, limit: int = MAX_HEADLINES) -> List[str]:
+    """Parse off the event loop so large pages don't stall other requests"""
+    return await asyncio.to_thread(extract_headlines, html, limit)
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from deadline import REQUEST_TIMEOUT_SECONDS, deadline_scope
+from responses import MIN_COMPRESS_BYTES, body_etag, compress, etag_matches, preferred_encoding
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Client-supplied request IDs are echoed back only if they look like one
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def add_vary(headers: MutableHeaders, name: str) -> None:
+    """Add name to Vary unless it (or *) is already listed"""
+    listed = {field.strip().lower() for value in headers.getlist("vary") for field in value.split(",")}
+    if name.lower() not in listed and "*" not in listed:
+        headers.add_vary_header(name)
+
+
+class TimeoutMiddleware:
+    """Answers 504 if the app hasn't started its response within ``timeout``.
+
+    Pure ASGI: the app runs in the caller's task under asyncio.timeout, so
+    there is no extra task or memory stream per request. The budget is also
+    published as the request deadline for upstream calls. Once the response
+    has started the timeout is lifted, so streamed bodies may run longer.
+    """
+
+    def __init__(self, app: ASGIApp, timeout: float = REQUEST_TIMEOUT_SECONDS):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+        budget = asyncio.timeout(self.timeout)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                budget.reschedule(None)
+            await send(message)
+
+        try:
+            with deadline_scope(self.timeout):
+                async with budget:
+                    await self.app(scope, receive, send_wrapper)
+        except TimeoutError:
+            if started or not budget.expired():
+                raise
+            response = JSONResponse(status_code=504, content={"detail": "Request timeout"})
+            await response(scope, receive, send)
+
+
+class RequestContextMiddleware:
+    """Tags every response with X-Request-ID and a Server-Timing app duration.
+
+    The ID is the client's X-Request-ID when it is well formed, otherwise a
+    new random one; it is also left in ``scope["state"]["request_id"]``. The
+    duration is measured up to the start of the response.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id", "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = os.urandom(8).hex()
+        scope.setdefault("state", {})["request_id"] = request_id
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                headers["Server-Timing"] = f"app;dur={(time.perf_counter() - started) * 1000:.2f}"
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class CacheControlMiddleware:
+    """Compression, ETags and Cache-Control for buffered API responses.
+
+    GET/HEAD responses under a path prefix in ``cache_seconds`` get
+    ``Cache-Control: public, max-age=<fresh>, stale-while-revalidate=<stale>``
+    so the browser and any CDN in front of the app can reuse them (the Age
+    header the endpoints already send counts against max-age). Responses
+    sent in one body message also get br or gzip compression when they are
+    JSON/text of at least ``minimum_size`` bytes, and GETs get a strong ETag
+    (answering a matching If-None-Match with 304). Streamed responses
+    (NDJSON/SSE) and bodies an endpoint already encoded pass through.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        cache_seconds: Dict[str, Tuple[float, float]],
+        minimum_size: int = MIN_COMPRESS_BYTES,
+    ):
+        self.app = app
+        # Longest prefix first so /stocks/ wins over a shorter match
+        self.cache_seconds = sorted(cache_seconds.items(), key=lambda item: -len(item[0]))
+        self.minimum_size = minimum_size
+
+    def cache_control(self, scope: Scope) -> Optional[str]:
+        if scope["method"] not in ("GET", "HEAD"):
+            return None
+        for prefix, (fresh, stale) in self.cache_seconds:
+            if scope["path"].startswith(prefix):
+                return f"public, max-age={int(fresh)}, stale-while-revalidate={int(stale)}"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        conditional = scope["method"] == "GET"
+        cache_control = self.cache_control(scope)
+        start: Optional[Message] = None
+        body: List[bytes] = []
+        streaming = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                # Streamed: flush what we have and get out of the way
+                streaming = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(body), "more_body": True})
+                return
+            await self.finish(start, b"".join(body), request_headers, conditional, cache_control, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def finish(self, start: Message, body: bytes, request_headers: Headers,
+                     conditional: bool, cache_control: Optional[str], send: Send) -> None:
+        headers = MutableHeaders(scope=start)
+        status = start["status"]
+        if status not in (200, 304):
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        if cache_control and "cache-control" not in headers:
+            headers["Cache-Control"] = cache_control
+        if status == 304:
+            await send(start)
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if conditional and "etag" not in headers:
+            headers["ETag"] = f'"{body_etag(body)}"'
+        if conditional and etag_matches(request_headers.get("if-none-match", ""), headers["etag"]):
+            for name in ("content-length", "content-type", "content-encoding"):
+                del headers[name]
+            start["status"] = 304
+            await send(start)
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        compressible = headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+        if compressible and "content-encoding" not in headers:
+            add_vary(headers, "Accept-Encoding")
+            encoding = preferred_encoding(request_headers.get("accept-encoding", ""))
+            if encoding is not None and len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                if "etag" in headers:
+                    headers["ETag"] = f'{headers["etag"][:-1]}-{encoding}"'
+
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
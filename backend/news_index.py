@@ -0,0 +1,349 @@
+import asyncio
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import orjson
+
+from budget import background_priority
+from snapshot import SnapshotReader, write_snapshot
+from upstream import TokenBucket
+
+# One MarketAux news/all page
+FetchPage = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def parse_published(value: str) -> float:
+    """MarketAux published_at (ISO 8601, 'Z' suffix) -> epoch seconds"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def to_published_after(ts: float) -> str:
+    """Epoch seconds -> MarketAux published_after format"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class NewsIndex:
+    """In-memory article store with an inverted index on entity symbol.
+
+    Articles are de-duplicated by UUID and by URL (the same story is
+    sometimes re-published under a new UUID). Each symbol maps to the UUIDs
+    of the articles that mention it; articles older than ``retention_days``
+    are pruned.
+    """
+
+    def __init__(self, retention_days: int = 90):
+        self.retention_seconds = retention_days * 86400
+        self.articles: Dict[str, Dict[str, Any]] = {}
+        self._published: Dict[str, float] = {}
+        self._by_url: Dict[str, str] = {}
+        self._by_symbol: Dict[str, Set[str]] = {}
+        self.watermark = 0.0
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    def add(self, article: Dict[str, Any]) -> bool:
+        """Index one article; False if it is a duplicate, expired or malformed"""
+        uuid = article.get("uuid")
+        url = article.get("url")
+        try:
+            published = parse_published(article["published_at"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        if not uuid or uuid in self.articles or (url and url in self._by_url):
+            self.duplicates += 1
+            return False
+        if published < time.time() - self.retention_seconds:
+            return False
+
+        self.articles[uuid] = article
+        self._published[uuid] = published
+        if url:
+            self._by_url[url] = uuid
+        for symbol in self.symbols_of(article):
+            self._by_symbol.setdefault(symbol, set()).add(uuid)
+        self.watermark = max(self.watermark, published)
+        return True
+
+    def add_many(self, articles: Iterable[Dict[str, Any]]) -> int:
+        return sum(1 for article in articles if self.add(article))
+
+    @staticmethod
+    def symbols_of(article: Dict[str, Any]) -> Set[str]:
+        return {
+            entity["symbol"].upper()
+            for entity in article.get("entities") or []
+            if entity.get("symbol")
+        }
+
+    def count(self, symbol: str) -> int:
+        return len(self._by_symbol.get(symbol, ()))
+
+    def query(self, symbol: str, limit: int = 50, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Articles mentioning symbol, strongest entity match first, then newest"""
+
+        def rank(uuid: str) -> Tuple[float, float]:
+            match = max(
+                (entity.get("match_score") or 0.0
+                 for entity in self.articles[uuid].get("entities") or []
+                 if (entity.get("symbol") or "").upper() == symbol),
+                default=0.0,
+            )
+            return match, self._published[uuid]
+
+        uuids = [
+            uuid for uuid in self._by_symbol.get(symbol, ())
+            if since is None or self._published[uuid] >= since
+        ]
+        uuids.sort(key=rank, reverse=True)
+        return [self.articles[uuid] for uuid in uuids[:limit]]
+
+    def prune(self) -> int:
+        cutoff = time.time() - self.retention_seconds
+        expired = [uuid for uuid, published in self._published.items() if published < cutoff]
+        for uuid in expired:
+            article = self.articles.pop(uuid)
+            del self._published[uuid]
+            if article.get("url"):
+                self._by_url.pop(article["url"], None)
+            for symbol in self.symbols_of(article):
+                uuids = self._by_symbol.get(symbol)
+                if uuids is not None:
+                    uuids.discard(uuid)
+                    if not uuids:
+                        del self._by_symbol[symbol]
+        return len(expired)
+
+    def records(self) -> List[Tuple[str, float, float, bytes]]:
+        """Snapshot records (see snapshot.write_snapshot); expiry is the retention cutoff"""
+        return [
+            (uuid, self._published[uuid], self._published[uuid] + self.retention_seconds, orjson.dumps(article))
+            for uuid, article in self.articles.items()
+        ]
+
+    def load(self, reader: SnapshotReader) -> int:
+        loaded = 0
+        for _, _, _, value in reader.raw_records():
+            loaded += self.add(orjson.loads(value))
+        reader.close()
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "articles": len(self.articles),
+            "symbols": len(self._by_symbol),
+            "duplicates": self.duplicates,
+            "watermark": to_published_after(self.watermark) if self.watermark else None,
+        }
+
+
+class NewsIngester:
+    """Pulls new MarketAux articles for the symbol universe into a NewsIndex.
+
+    The universe is split into chunks of ``symbols_per_request`` symbols.
+    Each pass asks, per chunk, for articles published after that chunk's
+    watermark, oldest first, so upstream calls scale with new-article volume
+    rather than with symbols x refreshes; a chunk cut short by ``max_pages``
+    resumes from its watermark on the next pass. A symbol is served from the
+    index (``covers``) while its chunk has caught up to the newest article
+    within the last two intervals and the index holds ``min_articles`` for
+    it; a chunk still behind is not served. Watermarks are snapshotted per
+    symbol next to the index, so a restart resumes each chunk where it
+    stopped even if the universe was re-chunked.
+    """
+
+    def __init__(
+        self,
+        index: NewsIndex,
+        fetch_page: FetchPage,
+        universe: Iterable[str],
+        bucket: TokenBucket,
+        interval: float = 900.0,
+        backfill_days: int = 7,
+        symbols_per_request: int = 100,
+        max_pages: int = 5,
+        min_articles: int = 3,
+        snapshot_path: Optional[str] = None,
+    ):
+        self.index = index
+        self.fetch_page = fetch_page
+        self.universe = sorted(universe)
+        self.bucket = bucket
+        self.backfill_days = backfill_days
+        self.symbols_per_request = symbols_per_request
+        self.max_pages = max_pages
+        self.min_articles = min_articles
+        self.snapshot_path = snapshot_path
+        self.chunks = [
+            self.universe[i:i + symbols_per_request]
+            for i in range(0, len(self.universe), symbols_per_request)
+        ]
+        # Passes are spaced so a worst-case pass fits the bucket's daily rate
+        self.interval = max(interval, self.calls_per_pass / bucket.rate)
+        self.watermarks: Dict[int, float] = {}
+        # Per-symbol watermarks restored from the snapshot
+        self.restored_watermarks: Dict[str, float] = {}
+        self.synced: Dict[str, float] = {}
+        # Chunks whose last pass stopped at max_pages before the newest article
+        self.behind: Set[int] = set()
+        self.last_success = 0.0
+        self.requests = 0
+        self.ingested = 0
+        self.failures = 0
+        self.served = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def calls_per_pass(self) -> int:
+        """Upstream calls in a pass that takes every chunk to max_pages"""
+        return len(self.chunks) * self.max_pages
+
+    def covers(self, symbol: str) -> bool:
+        fresh = time.time() - self.synced.get(symbol, 0.0) < 2 * self.interval + 60
+        return fresh and self.index.count(symbol) >= self.min_articles
+
+    def published_after(self, chunk: int) -> float:
+        if chunk not in self.watermarks:
+            # After a restart, resume from the chunk's least advanced symbol.
+            # The index's newest article is no cursor: it may have come from
+            # another chunk's pass, past pages this chunk never fetched.
+            self.watermarks[chunk] = min(self.restored_watermarks.get(symbol, 0.0) for symbol in self.chunks[chunk])
+        floor = time.time() - self.backfill_days * 86400
+        return max(self.watermarks[chunk], floor)
+
+    async def _ingest_chunk(self, chunk: int) -> int:
+        published_after = to_published_after(self.published_after(chunk))
+        added = 0
+        complete = False
+        for page in range(1, self.max_pages + 1):
+            await self.bucket.acquire()
+            self.requests += 1
+            result = await self.fetch_page({
+                "symbols": ",".join(self.chunks[chunk]),
+                "published_after": published_after,
+                "sort": "published_at",
+                "sort_order": "asc",
+                "page": page,
+            })
+            articles = result.get("data") or []
+            added += self.index.add_many(articles)
+            for article in articles:
+                try:
+                    published = parse_published(article["published_at"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                self.watermarks[chunk] = max(self.watermarks[chunk], published)
+            meta = result.get("meta") or {}
+            if not articles or meta.get("returned", len(articles)) < meta.get("limit", len(articles) + 1):
+                complete = True
+                break
+        if complete:
+            self.behind.discard(chunk)
+            now = time.time()
+            for symbol in self.chunks[chunk]:
+                self.synced[symbol] = now
+        else:
+            # More pages than max_pages: the watermark is the resume cursor,
+            # and the chunk's symbols aren't served until it catches up
+            self.behind.add(chunk)
+            for symbol in self.chunks[chunk]:
+                self.synced.pop(symbol, None)
+        self.ingested += added
+        return added
+
+    async def ingest(self) -> int:
+        """One pass over the universe; returns the number of new articles"""
+        added = 0
+        for chunk in range(len(self.chunks)):
+            added += await self._ingest_chunk(chunk)
+        self.index.prune()
+        self.last_success = time.time()
+        return added
+
+    @property
+    def watermarks_path(self) -> str:
+        return self.snapshot_path + ".watermarks"
+
+    def watermark_records(self) -> List[Tuple[str, float, float, bytes]]:
+        """Snapshot records of each symbol's chunk watermark; past the
+        backfill window they no longer matter, so that is their expiry"""
+        backfill = self.backfill_days * 86400
+        # Restored ones still stand for chunks no pass has reached yet
+        by_symbol = dict(self.restored_watermarks)
+        for chunk, watermark in self.watermarks.items():
+            by_symbol.update(dict.fromkeys(self.chunks[chunk], watermark))
+        return [(symbol, watermark, watermark + backfill, b"") for symbol, watermark in by_symbol.items()]
+
+    def load(self) -> None:
+        if not self.snapshot_path:
+            return
+        reader = SnapshotReader(self.snapshot_path)
+        try:
+            reader.open()
+            print(f"News index: {self.index.load(reader)} articles restored")
+        except (OSError, ValueError, struct.error) as e:
+            reader.close()
+            print(f"News index restore failed: {type(e).__name__}")
+        reader = SnapshotReader(self.watermarks_path)
+        try:
+            reader.open()
+            self.restored_watermarks = {symbol: watermark for symbol, watermark, _, _ in reader.raw_records()}
+        except (OSError, ValueError, struct.error) as e:
+            print(f"News watermarks restore failed: {type(e).__name__}")
+        finally:
+            reader.close()
+
+    def save(self) -> None:
+        if self.snapshot_path:
+            try:
+                write_snapshot(self.snapshot_path, self.index.records())
+                write_snapshot(self.watermarks_path, self.watermark_records())
+            except OSError as e:
+                print(f"News index write failed: {type(e).__name__}")
+
+    async def _run(self):
+        with background_priority():
+            await self._loop()
+
+    async def _loop(self):
+        while True:
+            try:
+                added = await self.ingest()
+                print(f"News ingest: {added} new articles, {len(self.index)} indexed")
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                self.failures += 1
+                print(f"News ingest failed: {type(e).__name__}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.save)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.index.stats(),
+            "running": self._task is not None,
+            "interval": self.interval,
+            "synced_symbols": sum(1 for symbol in self.universe if symbol in self.synced),
+            "behind_chunks": len(self.behind),
+            "last_success": self.last_success,
+            "requests": self.requests,
+            "ingested": self.ingested,
+            "failures": self.failures,
+            "served": self.served,
+            "budget": self.bucket.stats(),
+        }
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from budget import background_priority
+from upstream import TokenBucket
+
+
+class DemandTracker:
+    """Decaying per-symbol request counts, used to refresh hot symbols first"""
+
+    def __init__(self, half_life_seconds: float = 6 * 3600):
+        self.half_life_seconds = half_life_seconds
+        self.counts: Counter = Counter()
+        self._last_decay = time.monotonic()
+
+    def record(self, symbol: str) -> None:
+        self.counts[symbol] += 1
+
+    def decay(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decay < self.half_life_seconds:
+            return
+        self._last_decay = now
+        self.counts = Counter({s: c // 2 for s, c in self.counts.items() if c > 1})
+
+    def ranked(self, universe: Iterable[str]) -> List[str]:
+        """Universe ordered by demand, most requested first (ties alphabetical)"""
+        return sorted(universe, key=lambda s: (-self.counts.get(s, 0), s))
+
+    def top(self, n: int = 10) -> List[List[Any]]:
+        return [[symbol, count] for symbol, count in self.counts.most_common(n)]
+
+
+class WarmTarget:
+    """One cache namespace to keep warm.
+
+    key_for maps a symbol to its cache key (or None to skip the symbol),
+    refresh re-fetches and caches it, and each refresh spends ``cost`` tokens
+    of the provider's background budget. Entries are stored until their hard
+    TTL, so stale_seconds is subtracted to find when they stop being fresh.
+
+    With refresh_many set, due symbols are refreshed ``batch_size`` at a time
+    in one call, for providers that support batching. refresh_many is given
+    a ``charge`` callable and spends ``cost`` through it per upstream call it
+    actually makes, since a batch may take several calls or none. It
+    returns the symbols it could not refresh, which count as failures and
+    are retried after ``retry_after`` like a refresh that raised.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cache,
+        key_for: Callable[[str], Optional[str]],
+        refresh: Callable[[str], Awaitable[Any]],
+        bucket: TokenBucket,
+        cost: float = 1.0,
+        refresh_ahead: float = 3600.0,
+        retry_after: float = 3600.0,
+        stale_seconds: float = 0.0,
+        refresh_many: Optional[Callable[[List[str], Callable[[], Awaitable[None]]], Awaitable[List[str]]]] = None,
+        batch_size: int = 1,
+    ):
+        self.name = name
+        self.cache = cache
+        self.key_for = key_for
+        self.refresh = refresh
+        self.bucket = bucket
+        self.cost = cost
+        self.refresh_ahead = refresh_ahead
+        self.retry_after = retry_after
+        self.stale_seconds = stale_seconds
+        self.refresh_many = refresh_many
+        self.batch_size = batch_size if refresh_many is not None else 1
+        self.attempted: Dict[str, float] = {}
+        self.refreshed = 0
+        self.failures = 0
+        self.last_pass_due = 0
+
+
+class PrewarmScheduler:
+    """Refreshes a closed symbol universe ahead of cache expiry.
+
+    Each target runs its own loop: find the symbols whose entry is missing or
+    within ``refresh_ahead`` of expiring, order them by demand, then refresh
+    them one at a time (or one batch at a time) as the provider's token
+    bucket allows.
+    """
+
+    def __init__(self, targets: List[WarmTarget], universe: Iterable[str],
+                 demand: DemandTracker, interval: float = 60.0):
+        self.targets = targets
+        self.universe = sorted(universe)
+        self.demand = demand
+        self.interval = interval
+        self._tasks: List[asyncio.Task] = []
+
+    async def due(self, target: WarmTarget) -> List[str]:
+        now = time.time()
+        due = []
+        for symbol in self.demand.ranked(self.universe):
+            key = target.key_for(symbol)
+            if key is None:
+                continue
+            if now - target.attempted.get(symbol, 0) < target.retry_after:
+                continue
+            expires_at = await target.cache.peek_expiry(key)
+            if expires_at is None or expires_at - target.stale_seconds - now <= target.refresh_ahead:
+                due.append(symbol)
+        return due
+
+    async def _run_target(self, target: WarmTarget):
+        with background_priority():
+            await self._warm(target)
+
+    async def _warm(self, target: WarmTarget):
+        while True:
+            self.demand.decay()
+            try:
+                due = await self.due(target)
+            except Exception as e:
+                print(f"Prewarm {target.name}: scan failed: {type(e).__name__}")
+                due = []
+            target.last_pass_due = len(due)
+            if due:
+                print(f"Prewarm {target.name}: {len(due)} symbols due")
+            for i in range(0, len(due), target.batch_size):
+                chunk = due[i:i + target.batch_size]
+                if target.refresh_many is None:
+                    await target.bucket.acquire(target.cost)
+                now = time.time()
+                for symbol in chunk:
+                    target.attempted[symbol] = now
+                try:
+                    missed = []
+                    if target.refresh_many is not None:
+                        missed = await target.refresh_many(chunk, lambda: target.bucket.acquire(target.cost))
+                    else:
+                        await target.refresh(chunk[0])
+                    target.refreshed += len(chunk) - len(missed)
+                    if missed:
+                        target.failures += len(missed)
+                        print(f"Prewarm {target.name} failed for {', '.join(missed)}")
+                except Exception as e:
+                    target.failures += len(chunk)
+                    print(f"Prewarm {target.name} failed for {', '.join(chunk)}: {type(e).__name__}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run_target(t)) for t in self.targets]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": bool(self._tasks),
+            "universe": len(self.universe),
+            "top_symbols": self.demand.top(),
+            "targets": {
+                t.name: {
+                    "refreshed": t.refreshed,
+                    "failures": t.failures,
+                    "last_pass_due": t.last_pass_due,
+                    "budget": t.bucket.stats(),
+                }
+                for t in self.targets
+            },
+        }
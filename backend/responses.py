@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this aren't worth a compressed variant
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def body_etag(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def preferred_encoding(accept_encoding: str) -> Optional[str]:
+    """br when accepted and available, then gzip, else None (identity)"""
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+class EncodedBody:
+    """A JSON response body encoded once: orjson bytes, compressed variants and a strong ETag"""
+
+    __slots__ = ("source", "body", "variants", "etag")
+
+    def __init__(self, source: Any):
+        self.source = source
+        self.body = orjson.dumps(source)
+        self.variants: Dict[str, bytes] = {}
+        if len(self.body) >= MIN_COMPRESS_BYTES:
+            self.variants = {encoding: compress(self.body, encoding) for encoding in SUPPORTED_ENCODINGS}
+        self.etag = body_etag(self.body)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+    def representation(self, accept_encoding: str) -> Tuple[bytes, Optional[str], str]:
+        """(body, Content-Encoding or None, ETag) for the client's Accept-Encoding"""
+        encoding = preferred_encoding(accept_encoding)
+        if encoding in self.variants:
+            return self.variants[encoding], encoding, f'"{self.etag}-{encoding}"'
+        return self.body, None, f'"{self.etag}"'
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """Codings from Accept-Encoding, minus any refused with q=0"""
+    accepted = []
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.append(coding.lower())
+    return accepted
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison (RFC 9110 13.1.2), treating every encoding of a body as the same"""
+    if if_none_match.strip() == "*":
+        return True
+    base = etag.strip('"').split("-")[0]
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"').split("-")[0] == base:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Encoded bodies for cached endpoint results, keyed like the data caches.
+
+    An encoding is reused while the cached data it was built from is
+    unchanged: the same object for the in-memory backends, an equal one for
+    backends that decode on every read. A hit then writes stored bytes
+    instead of running jsonable_encoder, json.dumps and compression again.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self.cache = TTLCache("responses", ttl_seconds, max_entries, max_bytes)
+        self.encodes = 0
+        self.reused = 0
+        self.not_modified = 0
+
+    def encoded(self, key: str, data: Any) -> EncodedBody:
+        entry = self.cache.get(key)
+        if entry is not None and (entry.data.source is data or entry.data.source == data):
+            self.reused += 1
+            return entry.data
+        encoded = EncodedBody(data)
+        self.encodes += 1
+        self.cache.set(key, encoded, size=encoded.size)
+        return encoded
+
+    def respond(self, request: Request, key: str, data: Any, headers: Dict[str, str]) -> Response:
+        """200 with the negotiated encoding, or 304 if the client's copy is current"""
+        encoded = self.encoded(key, data)
+        body, encoding, etag = encoded.representation(request.headers.get("accept-encoding", ""))
+        headers = {**headers, "ETag": etag, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "brotli": brotli is not None,
+            "encodes": self.encodes,
+            "reused": self.reused,
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,351 @@
+import asyncio
+import hashlib
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from budget import BudgetExhausted
+from deadline import DeadlineExceeded, call_timeout
+
+SENTIMENT_MODEL = "gpt-4o"
+SENTIMENT_ERROR_MESSAGE = "Unable to analyze sentiment due to API error."
+# Load shedding (429/504) reaches the client as is: never turned into
+# SENTIMENT_ERROR_MESSAGE or retried with another prompt
+SHED_ERRORS = (BudgetExhausted, DeadlineExceeded)
+# Per-call timeouts, further capped by the request deadline (the client default is 10 min)
+LLM_TIMEOUT_SECONDS = 20.0
+LLM_GROUP_TIMEOUT_SECONDS = 60.0
+SCORE_PATTERN = re.compile(r"Average Sentiment Score:\s*\**\s*(\d+(?:\.\d+)?)\s*/\s*10")
+
+
+# What /search returns for a headline set; grouped prompts ask for the same text per company
+SENTIMENT_INSTRUCTIONS = (
+    "Provide a short summary of the sentiment and calculate the average sentiment score on a scale "
+    "of 0 (negative) to 10 (positive). Return only the summary in bullet points with specific yet short & concise "
+    "news examples and the average sentiment score as a number. Output should be in the exact format of: "
+    "Average Sentiment Score: _/10. Then the summary."
+)
+
+
+def build_prompt(company: str) -> str:
+    return f"Analyze the sentiment of the following news headlines about {company}'s stock. " + SENTIMENT_INSTRUCTIONS
+
+
+def build_messages(company: str, headlines: List[str]) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": build_prompt(company)},
+        {"role": "user", "content": ", ".join(headlines)},
+    ]
+
+
+class LLMGate:
+    """Bounded concurrency for LLM calls with queue-depth metrics.
+
+    ``budget``, if given, is awaited before each call to spend the
+    provider's rate budget (and may raise to shed the call).
+    """
+
+    def __init__(self, limit: int, budget: Optional[Callable[[], Awaitable[None]]] = None):
+        self.limit = limit
+        self.budget = budget
+        self._semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.active = 0
+        self.max_waiting = 0
+        self.calls = 0
+        self.wait_total = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            if self.budget is not None:
+                await self.budget()
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_total += time.perf_counter() - started
+        self.calls += 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "calls": self.calls,
+            "avg_wait_ms": round(self.wait_total / max(self.calls, 1) * 1000, 3),
+        }
+
+
+async def analyze_headlines(client, gate: LLMGate, company: str, headlines: List[str]) -> str:
+    """Run the sentiment prompt through the async OpenAI client; API errors
+    give SENTIMENT_ERROR_MESSAGE, SHED_ERRORS propagate"""
+    try:
+        async with gate.slot():
+            ai_response = await client.chat.completions.create(
+                model=SENTIMENT_MODEL,
+                messages=build_messages(company, headlines),
+                timeout=call_timeout(LLM_TIMEOUT_SECONDS),
+            )
+        return ai_response.choices[0].message.content.strip()
+    except SHED_ERRORS:
+        raise
+    except Exception as ai_error:
+        print(f"OpenAI API error: {ai_error}")
+        return SENTIMENT_ERROR_MESSAGE
+
+
+def parse_score(text: str) -> Optional[float]:
+    """The "Average Sentiment Score: _/10" value, or None if not (yet) present"""
+    match = SCORE_PATTERN.search(text)
+    return float(match.group(1)) if match else None
+
+
+async def stream_headlines_analysis(client, gate: LLMGate, company: str, headlines: List[str]) -> AsyncIterator[str]:
+    """Same prompt as analyze_headlines, yielding text deltas as they arrive.
+
+    Unlike analyze_headlines, API errors propagate: the caller has already
+    relayed part of the text and decides what replaces it.
+    """
+    async with gate.slot():
+        stream = await client.chat.completions.create(
+            model=SENTIMENT_MODEL,
+            messages=build_messages(company, headlines),
+            stream=True,
+            timeout=call_timeout(LLM_TIMEOUT_SECONDS),
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def normalize_headline(headline: str) -> str:
+    return " ".join(headline.lower().split())
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:32]
+
+
+def build_group_messages(groups: List[Tuple[str, List[str]]]) -> List[Dict[str, str]]:
+    """The /search prompt for several companies at once"""
+    system = (
+        "Analyze the sentiment of the following numbered news headlines about several companies' stocks. "
+        "For each company, using only its own headlines: " + SENTIMENT_INSTRUCTIONS + " Return JSON in the "
+        'exact format of: {"companies": [{"id": <company number>, "sentiment": "<the output for that company>"}]} '
+        "with one entry per company."
+    )
+    blocks = []
+    for company_id, (company, headlines) in enumerate(groups, 1):
+        numbered = "\n".join(f"{i}. {headline}" for i, headline in enumerate(headlines, 1))
+        blocks.append(f"Company {company_id}: {company}\n{numbered}")
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": "\n\n".join(blocks)},
+    ]
+
+
+def parse_group(raw: str, groups: List[Tuple[str, List[str]]]) -> Dict[str, str]:
+    """company -> sentiment text for every company whose text keeps the
+    "Average Sentiment Score: _/10" contract"""
+    try:
+        companies = {int(entry["id"]): entry for entry in orjson.loads(raw)["companies"]}
+    except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        return {}
+    parsed = {}
+    for company_id, (company, _) in enumerate(groups, 1):
+        entry = companies.get(company_id)
+        if not isinstance(entry, dict) or not isinstance(entry.get("sentiment"), str):
+            continue
+        text = entry["sentiment"].strip()
+        if parse_score(text) is None:
+            continue
+        parsed[company] = text
+    return parsed
+
+
+class SentimentMemo:
+    """Content-addressed memo of /search sentiment text.
+
+    Sentiment is a pure function of the model, the prompt and the headlines,
+    so results are keyed on a hash of the normalized headline set instead of
+    on time: an unchanged top-10 costs no LLM call at all. Only text in the
+    /search prompt's own format is stored, whichever path produced it.
+    """
+
+    def __init__(self, backend, model: str = SENTIMENT_MODEL):
+        self.backend = backend
+        self.model = model
+        self.set_hits = 0
+        self.set_misses = 0
+        self.llm_calls = 0
+
+    def set_key(self, company: str, headlines: List[str]) -> str:
+        normalized = sorted({normalize_headline(h) for h in headlines})
+        return "set:" + _digest(self.model, company.lower(), *normalized)
+
+    async def get_set(self, company: str, headlines: List[str]) -> Optional[str]:
+        entry = await self.backend.get(self.set_key(company, headlines))
+        if entry is None:
+            self.set_misses += 1
+            return None
+        self.set_hits += 1
+        return entry.data["sentiment"]
+
+    async def put_set(self, company: str, headlines: List[str], sentiment: str) -> None:
+        if sentiment and sentiment != SENTIMENT_ERROR_MESSAGE:
+            await self.backend.set(self.set_key(company, headlines), {"sentiment": sentiment})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "set_hits": self.set_hits,
+            "set_misses": self.set_misses,
+            "llm_calls": self.llm_calls,
+        }
+
+
+async def memoized_sentiment(memo: SentimentMemo, company: str, headlines: List[str]) -> Optional[str]:
+    """The memoized text for an unchanged headline set, or None"""
+    return await memo.get_set(company, headlines)
+
+
+# Awaited before each LLM call a background job makes, to spend its own budget
+Charge = Optional[Callable[[], Awaitable[None]]]
+
+
+async def analyze_with_memo(client, gate: LLMGate, memo: SentimentMemo, company: str, headlines: List[str],
+                            charge: Charge = None) -> str:
+    """analyze_headlines that returns the memoized text for an unchanged headline set"""
+    memoized = await memo.get_set(company, headlines)
+    if memoized is not None:
+        return memoized
+    if charge is not None:
+        await charge()
+    memo.llm_calls += 1
+    sentiment = await analyze_headlines(client, gate, company, headlines)
+    await memo.put_set(company, headlines, sentiment)
+    return sentiment
+
+
+class SentimentBatcher:
+    """Analyzes many companies' headlines with grouped multi-company prompts.
+
+    Used for background refreshes of the whole universe: instead of one chat
+    call (and one copy of the system prompt) per company, companies whose
+    headline set isn't memoized are packed into groups of up to
+    ``max_companies`` companies / ``max_headlines`` headlines and analyzed
+    with one JSON call per group. Each company's answer is the /search
+    prompt's output (checked for the "Average Sentiment Score: _/10" line)
+    and goes through the SentimentMemo. Companies the model leaves out of a
+    group's answer fall back to analyze_with_memo.
+    """
+
+    def __init__(self, client, gate: LLMGate, memo: SentimentMemo,
+                 max_companies: int = 8, max_headlines: int = 60):
+        self.client = client
+        self.gate = gate
+        self.memo = memo
+        self.max_companies = max_companies
+        self.max_headlines = max_headlines
+        self.group_calls = 0
+        self.group_failures = 0
+        self.fallbacks = 0
+
+    def pack(self, pending: Dict[str, List[str]]) -> List[List[Tuple[str, List[str]]]]:
+        groups: List[List[Tuple[str, List[str]]]] = []
+        current: List[Tuple[str, List[str]]] = []
+        size = 0
+        for company, headlines in pending.items():
+            if current and (len(current) >= self.max_companies or size + len(headlines) > self.max_headlines):
+                groups.append(current)
+                current, size = [], 0
+            current.append((company, headlines))
+            size += len(headlines)
+        if current:
+            groups.append(current)
+        return groups
+
+    async def _analyze_group(self, group: List[Tuple[str, List[str]]],
+                             charge: Charge = None) -> Dict[str, str]:
+        if charge is not None:
+            await charge()
+        self.group_calls += 1
+        self.memo.llm_calls += 1
+        try:
+            async with self.gate.slot():
+                ai_response = await self.client.chat.completions.create(
+                    model=SENTIMENT_MODEL,
+                    messages=build_group_messages(group),
+                    response_format={"type": "json_object"},
+                    timeout=call_timeout(LLM_GROUP_TIMEOUT_SECONDS),
+                )
+            return parse_group(ai_response.choices[0].message.content, group)
+        except SHED_ERRORS:
+            raise
+        except Exception as ai_error:
+            self.group_failures += 1
+            print(f"OpenAI API error (group of {len(group)}): {ai_error}")
+            return {}
+
+    async def analyze_many(self, items: Dict[str, List[str]], charge: Charge = None) -> Dict[str, str]:
+        """company -> sentiment text for every company with headlines.
+
+        ``charge`` is awaited once per LLM call actually made (group calls and
+        fallbacks), never for memoized sets. If a group call is shed, the
+        other groups' answers are still memoized, then the shed is raised
+        without running any fallbacks.
+        """
+        results: Dict[str, str] = {}
+        pending: Dict[str, List[str]] = {}
+        for company, headlines in items.items():
+            memoized = await self.memo.get_set(company, headlines)
+            if memoized is not None:
+                results[company] = memoized
+            else:
+                pending[company] = headlines
+
+        answered: Dict[str, str] = {}
+        shed: Optional[BaseException] = None
+        for group_result in await asyncio.gather(
+            *(self._analyze_group(g, charge) for g in self.pack(pending)), return_exceptions=True
+        ):
+            if isinstance(group_result, BaseException):
+                shed = shed or group_result
+            else:
+                answered.update(group_result)
+
+        unanswered: Dict[str, List[str]] = {}
+        for company, headlines in pending.items():
+            if company not in answered:
+                unanswered[company] = headlines
+                continue
+            await self.memo.put_set(company, headlines, answered[company])
+            results[company] = answered[company]
+        if shed is not None:
+            raise shed
+
+        for company, headlines in unanswered.items():
+            self.fallbacks += 1
+            results[company] = await analyze_with_memo(
+                self.client, self.gate, self.memo, company, headlines, charge
+            )
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "group_calls": self.group_calls,
+            "group_failures": self.group_failures,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,213 @@
+import asyncio
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+from cache import CacheEntry
+
+# File layout: MAGIC, then one record per entry:
+#   <key_len:u32><timestamp:f64><expires_at:f64><value_len:u32><key><orjson value>
+# Headers can be walked without decoding any value, so opening a snapshot only
+# costs one pass over ~24 bytes per entry; values are decoded on first read.
+MAGIC = b"SCOUTSNAP1\n"
+RECORD_HEADER = struct.Struct("<IddI")
+
+
+class SnapshotReader:
+    """Lazily decoded, memory-mapped view of a snapshot file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._index: Dict[str, Tuple[int, int, float, float]] = {}
+        self.restored = 0
+        self.corrupt = 0
+
+    def open(self) -> int:
+        """Index the unexpired records in the file. Returns the record count"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) <= len(MAGIC):
+            return 0
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            print(f"Snapshot {self.path} has an unknown format, ignoring it")
+            self.close()
+            return 0
+
+        now = time.time()
+        offset = len(MAGIC)
+        end = len(self._map)
+        while offset + RECORD_HEADER.size <= end:
+            key_len, timestamp, expires_at, value_len = RECORD_HEADER.unpack_from(self._map, offset)
+            key_start = offset + RECORD_HEADER.size
+            value_start = key_start + key_len
+            offset = value_start + value_len
+            if offset > end:
+                break  # Truncated tail from an interrupted write
+            if expires_at > now:
+                key = self._map[key_start:value_start].decode()
+                self._index[key] = (value_start, value_len, timestamp, expires_at)
+        return len(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def pop(self, key: str) -> Optional[CacheEntry]:
+        """Decode and remove one entry, or None if absent/expired/undecodable"""
+        record = self._index.pop(key, None)
+        if record is None or self._map is None:
+            return None
+        value_start, value_len, timestamp, expires_at = record
+        if expires_at <= time.time():
+            return None
+        try:
+            data = orjson.loads(self._map[value_start:value_start + value_len])
+        except orjson.JSONDecodeError:
+            # A damaged record is a miss; it was popped, so it is dropped
+            self.corrupt += 1
+            return None
+        self.restored += 1
+        return CacheEntry(data, timestamp, expires_at, value_len)
+
+    def expires_at(self, key: str) -> Optional[float]:
+        record = self._index.get(key)
+        return record[3] if record is not None else None
+
+    def discard(self, key: str) -> None:
+        self._index.pop(key, None)
+
+    def raw_records(self) -> List[Tuple[str, float, float, bytes]]:
+        """Unrestored, unexpired records as raw bytes, for carrying into the next snapshot"""
+        if self._map is None:
+            return []
+        now = time.time()
+        return [
+            (key, timestamp, expires_at, self._map[start:start + length])
+            for key, (start, length, timestamp, expires_at) in list(self._index.items())
+            if expires_at > now
+        ]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._index.clear()
+
+
+def write_snapshot(path: str, records: Iterable[Tuple[str, float, float, bytes]]) -> int:
+    """Atomically write (key, timestamp, expires_at, value bytes) records.
+
+    Each writer gets its own temp file, so several workers snapshotting to
+    the same directory never interleave; the last os.replace wins.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    count = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            for key, timestamp, expires_at, value in records:
+                key_bytes = key.encode()
+                f.write(RECORD_HEADER.pack(len(key_bytes), timestamp, expires_at, len(value)))
+                f.write(key_bytes)
+                f.write(value)
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return count
+
+
+class SnapshotManager:
+    """Persists memory-backed caches to disk and restores them lazily.
+
+    At startup each namespace's snapshot is memory-mapped and indexed; a
+    value is only decoded when its key is first requested. Snapshots are
+    rewritten every ``interval`` seconds and once more at shutdown.
+    """
+
+    def __init__(self, backends: Iterable, directory: str, interval: float = 600.0):
+        self.backends = list(backends)
+        self.directory = directory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.last_written: Dict[str, int] = {}
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.snap")
+
+    def load(self) -> None:
+        for backend in self.backends:
+            reader = SnapshotReader(self.path_for(backend.name))
+            try:
+                count = reader.open()
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Snapshot load failed for {backend.name}: {type(e).__name__}")
+                reader.close()
+                continue
+            backend.attach_snapshot(reader)
+            print(f"Snapshot for {backend.name}: {count} entries available")
+
+    def _records(self, backend) -> List[Tuple[str, float, float, bytes]]:
+        records = []
+        if backend.snapshot is not None:
+            records.extend(backend.snapshot.raw_records())
+        for key, entry in backend.cache.items():
+            records.append((key, entry.timestamp, entry.expires_at, orjson.dumps(entry.data)))
+        return records
+
+    def write(self) -> None:
+        for backend in self.backends:
+            try:
+                count = write_snapshot(self.path_for(backend.name), self._records(backend))
+                self.last_written[backend.name] = count
+            except (OSError, ValueError) as e:
+                # ValueError: clear() closed the mapped snapshot mid-copy
+                print(f"Snapshot write failed for {backend.name}: {type(e).__name__}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.write)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.write)
+        print(f"Snapshot written: {self.last_written}")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            backend.name: {
+                "pending": len(backend.snapshot) if backend.snapshot is not None else 0,
+                "restored": backend.snapshot.restored if backend.snapshot is not None else 0,
+                "corrupt": backend.snapshot.corrupt if backend.snapshot is not None else 0,
+                "last_written": self.last_written.get(backend.name, 0),
+            }
+            for backend in self.backends
+        }
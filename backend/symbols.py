@@ -0,0 +1,195 @@
+import csv
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from validation import COMPANY_NAMES, VALID_SYMBOLS
+
+ALIASES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sp_500_companies.csv")
+
+MAX_SUGGESTIONS = 25
+# Trigram matches below this Jaccard similarity are noise
+MIN_SIMILARITY = 0.3
+
+# Match kinds, best first
+EXACT = 0
+SYMBOL = 1
+NAME = 2
+WORD = 3
+FUZZY = 4
+MATCH_NAMES = {EXACT: "exact", SYMBOL: "symbol", NAME: "name", WORD: "word", FUZZY: "fuzzy"}
+
+# Ignored when matching CSV names to canonical ones ("Chubb Limited" is Chubb)
+CORPORATE_SUFFIXES = frozenset({
+    "inc", "incorporated", "corporation", "corp", "company", "companies", "co",
+    "plc", "ltd", "limited", "holdings", "group", "the",
+})
+
+_PARENTHESIZED = re.compile(r"\(.*?\)")
+_JOINERS = re.compile(r"[.'’-]")
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase words split on punctuation: "Coca-Cola (Class B)" -> "coca cola" """
+    text = _PARENTHESIZED.sub(" ", text.lower())
+    return " ".join(_SEPARATORS.split(text)).strip()
+
+
+def compact(text: str) -> str:
+    """Words joined across punctuation: "Coca-Cola" -> "cocacola", "e.l.f." -> "elf" """
+    return _SEPARATORS.sub("", _JOINERS.sub("", _PARENTHESIZED.sub(" ", text.lower())))
+
+
+def name_words(name: str) -> Tuple[str, ...]:
+    """Significant words of a company name, for matching names across sources"""
+    text = _JOINERS.sub("", _PARENTHESIZED.sub(" ", name.lower()))
+    return tuple(word for word in _SEPARATORS.split(text) if word and word not in CORPORATE_SUFFIXES)
+
+
+def trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def load_aliases(path: str, names: Dict[str, str]) -> Dict[str, List[str]]:
+    """Map the names in the S&P 500 CSV onto tracked symbols.
+
+    The CSV has names only, so a name is matched to the canonical name with
+    the same significant words (or the same letters, "ExxonMobil"), else to
+    the longest canonical name its words start with ("Meta Platforms"), else
+    to the one canonical name starting with its words ("Cisco"). Companies we
+    don't track are skipped.
+    """
+    by_words = {name_words(name): symbol for symbol, name in names.items()}
+    by_letters = {"".join(words): symbol for words, symbol in by_words.items()}
+    try:
+        with open(path, newline="") as f:
+            rows = list(csv.reader(f, skipinitialspace=True))
+    except OSError as e:
+        print(f"Symbol aliases not loaded: {type(e).__name__}")
+        return {}
+
+    aliases: Dict[str, List[str]] = {}
+    for alias in (cell.strip() for row in rows for cell in row):
+        words = name_words(alias)
+        if not words:
+            continue
+        symbol = by_words.get(words) or by_letters.get("".join(words))
+        if symbol is None:
+            symbol = next((by_words[words[:n]] for n in range(len(words) - 1, 0, -1) if words[:n] in by_words), None)
+        if symbol is None:
+            longer = [s for w, s in by_words.items() if w[:len(words)] == words]
+            symbol = longer[0] if len(longer) == 1 else None
+        if symbol is not None and alias != names[symbol]:
+            aliases.setdefault(symbol, []).append(alias)
+    return aliases
+
+
+class SymbolIndex:
+    """Immutable autocomplete index over tracked symbols and company names.
+
+    Built once: every prefix of every search key (the symbol, the name, each
+    word of the name, CSV aliases) maps straight to its best MAX_SUGGESTIONS
+    entries, already ranked, so a prefix lookup is one dict probe. This is
+    the prefix trie flattened into a dict. Queries that aren't a prefix of
+    anything (typos, "nvidai") fall back to a trigram inverted index ranked
+    by Jaccard similarity.
+    """
+
+    def __init__(self, names: Dict[str, str], aliases: Optional[Dict[str, Iterable[str]]] = None):
+        aliases = aliases or {}
+        self.symbols: Tuple[str, ...] = tuple(sorted(names))
+        self.names: Tuple[str, ...] = tuple(names[symbol] for symbol in self.symbols)
+        self.aliases: Dict[str, Tuple[str, ...]] = {
+            symbol: tuple(aliases[symbol]) for symbol in self.symbols if aliases.get(symbol)
+        }
+
+        # (kind, key length, entry) per prefix; kept as the best per entry
+        candidates: Dict[str, Dict[int, Tuple[int, int]]] = {}
+        keys: List[Tuple[str, int]] = []
+
+        def add(key: str, kind: int, entry: int) -> None:
+            for end in range(1, len(key) + 1):
+                prefix = key[:end]
+                rank = (EXACT if kind == SYMBOL and end == len(key) else kind, len(key))
+                best = candidates.setdefault(prefix, {})
+                if entry not in best or rank < best[entry]:
+                    best[entry] = rank
+
+        for entry, symbol in enumerate(self.symbols):
+            for key in {symbol.lower(), compact(symbol)}:
+                add(key, SYMBOL, entry)
+            for name in (self.names[entry],) + self.aliases.get(symbol, ()):
+                for key in {normalize(name), compact(name)}:
+                    if key:
+                        add(key, NAME, entry)
+                        keys.append((key, entry))
+                words = normalize(name).split()
+                for word in words[1:]:
+                    add(word, WORD, entry)
+
+        self.prefixes: Dict[str, Tuple[Tuple[int, int], ...]] = {
+            prefix: tuple(
+                (rank[0], entry) for entry, rank in
+                sorted(best.items(), key=lambda item: (item[1], self.symbols[item[0]]))[:MAX_SUGGESTIONS]
+            )
+            for prefix, best in candidates.items()
+        }
+
+        self.key_entries: Tuple[int, ...] = tuple(entry for _, entry in keys)
+        self.key_sizes: Tuple[int, ...] = tuple(len(trigrams(key)) for key, _ in keys)
+        postings: Dict[str, List[int]] = {}
+        for key_id, (key, _) in enumerate(keys):
+            for gram in trigrams(key):
+                postings.setdefault(gram, []).append(key_id)
+        self.postings: Dict[str, Tuple[int, ...]] = {gram: tuple(ids) for gram, ids in postings.items()}
+
+    @classmethod
+    def build(cls, path: str = ALIASES_CSV) -> "SymbolIndex":
+        names = {symbol: COMPANY_NAMES.get(symbol, symbol) for symbol in VALID_SYMBOLS}
+        return cls(names, load_aliases(path, names))
+
+    def fuzzy(self, query: str, limit: int) -> List[Tuple[float, int]]:
+        """(similarity, entry) by trigram Jaccard, best first"""
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        best: Dict[int, float] = {}
+        for key_id, count in shared.items():
+            entry = self.key_entries[key_id]
+            similarity = count / (len(grams) + self.key_sizes[key_id] - count)
+            if similarity >= MIN_SIMILARITY and similarity > best.get(entry, 0.0):
+                best[entry] = similarity
+        ranked = sorted(best.items(), key=lambda item: (-item[1], self.symbols[item[0]]))
+        return [(similarity, entry) for entry, similarity in ranked[:limit]]
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict[str, object]]:
+        """Ranked suggestions: exact symbol, symbol prefix, name prefix, word
+        prefix; trigram matches only when nothing starts with the query"""
+        limit = min(limit, MAX_SUGGESTIONS)
+        text = normalize(query)
+        hits = self.prefixes.get(text) or self.prefixes.get(compact(query))
+        if hits:
+            return [self.result(entry, MATCH_NAMES[kind]) for kind, entry in hits[:limit]]
+        if len(text) < 3:
+            return []
+        return [self.result(entry, MATCH_NAMES[FUZZY], similarity) for similarity, entry in self.fuzzy(text, limit)]
+
+    def result(self, entry: int, match: str, similarity: float = 1.0) -> Dict[str, object]:
+        return {
+            "symbol": self.symbols[entry],
+            "name": self.names[entry],
+            "match": match,
+            "score": round(similarity, 3),
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "symbols": len(self.symbols),
+            "aliases": sum(len(aliases) for aliases in self.aliases.values()),
+            "prefixes": len(self.prefixes),
+            "trigrams": len(self.postings),
+        }
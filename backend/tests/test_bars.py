@@ -0,0 +1,151 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bars import (
+    EXCHANGE_TZ,
+    TIMEFRAME_SECONDS,
+    BarStore,
+    bars_to_columns,
+    date_window,
+    minmax_indices,
+    regular_session_mask,
+    to_rfc3339,
+)
+
+DAY = 86400
+
+
+def fake_bars(a, b, timeframe, close=100.0):
+    step = TIMEFRAME_SECONDS[timeframe]
+    first = a + (-a) % step
+    return [
+        {"t": to_rfc3339(ts), "o": close, "h": close, "l": close, "c": close, "v": 1, "n": 1, "vw": close}
+        for ts in range(first, b, step)
+    ]
+
+
+class FakeAlpaca:
+    """fetch_range / fetch_many recording the windows asked for"""
+
+    def __init__(self, close=100.0):
+        self.close = close
+        self.ranges = []
+        self.many = []
+
+    async def fetch_range(self, symbol, timeframe, a, b):
+        self.ranges.append((symbol, a, b))
+        return fake_bars(a, b, timeframe, self.close)
+
+    async def fetch_many(self, symbols, timeframe, a, b):
+        self.many.append((tuple(symbols), a, b))
+        return {symbol: fake_bars(a, b, timeframe, self.close) for symbol in symbols}
+
+
+def store(alpaca, edge_ttl=60.0):
+    return BarStore(alpaca.fetch_range, edge_ttl, max_bars=100_000, max_age=3600, fetch_many=alpaca.fetch_many)
+
+
+def test_partial_overlap_fetches_only_the_gap():
+    alpaca = FakeAlpaca()
+    bars = store(alpaca)
+    a, b = date_window("2024-01-01", "2024-01-10")
+    c, d = date_window("2024-01-06", "2024-01-15")
+
+    asyncio.run(bars.query("AAPL", "1Day", a, b))
+    t, cols = asyncio.run(bars.query("AAPL", "1Day", c, d))
+
+    assert alpaca.ranges == [("AAPL", a, b), ("AAPL", b, d)]
+    assert t.tolist() == list(range(c, d, DAY))
+    assert bars.stats()["full_hits"] == 0
+
+    asyncio.run(bars.query("AAPL", "1Day", a, d))
+    assert len(alpaca.ranges) == 2
+    assert bars.stats()["full_hits"] == 1
+
+
+def test_refetch_replaces_bars_and_coverage_merges():
+    alpaca = FakeAlpaca(close=100.0)
+    bars = store(alpaca)
+    a, b = date_window("2024-01-01", "2024-01-10")
+    series = bars._get_series("AAPL", "1Day")
+    asyncio.run(bars.query("AAPL", "1Day", a, b))
+
+    t, cols = bars_to_columns(fake_bars(a + 3 * DAY, b + 3 * DAY, "1Day", close=101.0))
+    series.merge(t, cols, a + 3 * DAY, b + 3 * DAY, time.time())
+
+    assert series.coverage == [(a, b + 3 * DAY)]
+    assert len(series) == 13
+    assert series.cols["c"][:3].tolist() == [100.0] * 3
+    assert series.cols["c"][3:].tolist() == [101.0] * 10
+
+
+def test_open_edge_is_refetched_after_edge_ttl():
+    alpaca = FakeAlpaca()
+    now = int(time.time())
+    a, b = now - now % DAY - 2 * DAY, now - now % 60 + 60
+
+    fresh = store(alpaca, edge_ttl=60.0)
+    asyncio.run(fresh.query("AAPL", "1Min", a, b))
+    asyncio.run(fresh.query("AAPL", "1Min", a, b))
+    assert len(alpaca.ranges) == 1
+    # Only closed bars count as covered
+    assert fresh._get_series("AAPL", "1Min").coverage[-1][1] < b
+
+    alpaca.ranges.clear()
+    expired = store(alpaca, edge_ttl=0.0)
+    asyncio.run(expired.query("AAPL", "1Min", a, b))
+    asyncio.run(expired.query("AAPL", "1Min", a, b))
+    assert len(alpaca.ranges) == 2
+    assert alpaca.ranges[1][1] >= b - 2 * 60
+
+
+def test_query_many_groups_symbols_by_shared_gaps():
+    alpaca = FakeAlpaca()
+    bars = store(alpaca)
+    a, b = date_window("2024-01-01", "2024-01-10")
+    c, d = date_window("2024-01-06", "2024-01-15")
+    asyncio.run(bars.query("AAPL", "1Day", a, b))
+
+    results = asyncio.run(bars.query_many(["MSFT", "AAPL", "NVDA"], "1Day", c, d))
+
+    assert sorted(alpaca.many) == [(("AAPL",), b, d), (("MSFT", "NVDA"), c, d)]
+    assert {symbol: len(t) for symbol, (t, _) in results.items()} == {"AAPL": 10, "MSFT": 10, "NVDA": 10}
+
+    asyncio.run(bars.query_many(["AAPL", "MSFT", "NVDA"], "1Day", c, d))
+    assert len(alpaca.many) == 2
+
+
+def test_downsample_keeps_first_last_min_and_max():
+    values = np.array([5.0, 3, 9, 4, 1, 6, 7, 2, 8, 5, 4, 6, 5, 6, 4.5, 5.5, 3, 7, 5, 6])
+    index = minmax_indices(values, 6)
+    assert len(index) <= 6
+    assert index.tolist() == sorted(index.tolist())
+    kept = set(index.tolist())
+    assert {0, len(values) - 1, int(values.argmin()), int(values.argmax())} <= kept
+
+    assert minmax_indices(values, 50).tolist() == list(range(len(values)))
+
+
+def new_york(day, hour, minute=0):
+    local = datetime(2024, 3, day, hour, minute, tzinfo=EXCHANGE_TZ)
+    return int(local.astimezone(timezone.utc).timestamp())
+
+
+def test_session_keeps_bars_overlapping_the_open():
+    # Tuesday 2024-03-12 (after the DST change), Saturday 2024-03-16
+    hourly = np.array([
+        new_york(12, 8), new_york(12, 9), new_york(12, 15), new_york(12, 16), new_york(16, 10),
+    ])
+    assert regular_session_mask(hourly, "1Hour").tolist() == [False, True, True, False, False]
+
+    five_minute = np.array([new_york(12, 9, 25), new_york(12, 9, 30), new_york(12, 15, 55)])
+    assert regular_session_mask(five_minute, "5Min").tolist() == [False, True, True]
+
+    # Standard time: 2024-03-08 is a Friday before the change
+    assert regular_session_mask(np.array([new_york(8, 9)]), "1Hour").tolist() == [True]
+
+    daily = np.array([new_york(16, 0)])
+    assert regular_session_mask(daily, "1Day").tolist() == [True]
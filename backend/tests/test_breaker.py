@@ -0,0 +1,74 @@
+import pytest
+
+import breaker
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def tripped(clock):
+    circuit = CircuitBreaker("test", failure_threshold=3, reset_timeout=30.0, max_reset_timeout=100.0)
+    for _ in range(3):
+        circuit.before_call()
+        circuit.record_failure()
+    assert circuit.state == OPEN
+    return circuit
+
+
+def test_failures_below_threshold_keep_it_closed(clock):
+    circuit = CircuitBreaker("test", failure_threshold=3)
+    for _ in range(2):
+        circuit.record_failure()
+    circuit.record_success()
+    circuit.record_failure()
+    assert circuit.state == CLOSED
+
+
+def test_open_fails_fast_until_reset_timeout(clock):
+    circuit = tripped(clock)
+    clock[0] += 29
+    with pytest.raises(CircuitOpen) as rejected:
+        circuit.before_call()
+    assert rejected.value.status_code == 503
+    assert circuit.rejected == 1
+
+
+def test_half_open_lets_one_probe_through_then_closes(clock):
+    circuit = tripped(clock)
+    clock[0] += 30
+    circuit.before_call()
+    assert circuit.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        circuit.before_call()
+
+    circuit.record_success()
+    assert circuit.state == CLOSED
+    assert circuit.reset_timeout == 30.0
+    circuit.before_call()
+
+
+def test_failed_probe_reopens_with_doubled_timeout(clock):
+    circuit = tripped(clock)
+    for expected in (60.0, 100.0, 100.0):
+        clock[0] += circuit.reset_timeout
+        circuit.before_call()
+        circuit.record_failure()
+        assert circuit.state == OPEN
+        assert circuit.reset_timeout == expected
+    clock[0] += 99
+    with pytest.raises(CircuitOpen):
+        circuit.before_call()
+
+
+def test_released_probe_frees_the_slot(clock):
+    circuit = tripped(clock)
+    clock[0] += 30
+    circuit.before_call()
+    circuit.release()
+    circuit.before_call()
+    assert circuit.state == HALF_OPEN
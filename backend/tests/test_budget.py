@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from budget import BACKGROUND, USER, BudgetExhausted, PriorityBucket, background_priority
+from deadline import deadline_scope
+
+
+def test_user_callers_are_served_before_background():
+    async def run():
+        bucket = PriorityBucket("test", rate_per_second=50.0, capacity=1, reserve=0.0)
+        await bucket.acquire(priority=USER)
+        order = []
+
+        async def caller(label, priority):
+            await bucket.acquire(priority=priority)
+            order.append(label)
+
+        background = [asyncio.create_task(caller(f"background {n}", BACKGROUND)) for n in range(2)]
+        await asyncio.sleep(0)
+        user = asyncio.create_task(caller("user", USER))
+        await asyncio.gather(*background, user)
+        return order
+
+    assert asyncio.run(run()) == ["user", "background 0", "background 1"]
+
+
+def test_background_priority_is_inherited():
+    async def run():
+        bucket = PriorityBucket("test", rate_per_second=0.001, capacity=4, reserve=0.5)
+        with background_priority():
+            await bucket.acquire()
+            await bucket.acquire()
+            # Down to the reserve: background waits, user calls don't
+            blocked = asyncio.create_task(bucket.acquire())
+            await asyncio.sleep(0.01)
+            assert not blocked.done()
+        await bucket.acquire()
+        blocked.cancel()
+        return bucket.stats()
+
+    stats = asyncio.run(run())
+    assert stats["user"]["granted"] == 1
+    assert stats["background"]["granted"] == 2
+
+
+def test_user_call_is_shed_past_max_wait():
+    async def run():
+        bucket = PriorityBucket("openai", rate_per_second=1.0, capacity=1, max_wait=0.5)
+        await bucket.acquire(priority=USER)
+        with pytest.raises(BudgetExhausted) as shed:
+            await bucket.acquire(priority=USER)
+        return bucket, shed.value
+
+    bucket, shed = asyncio.run(run())
+    assert shed.status_code == 429
+    assert shed.headers["Retry-After"] == "1"
+    assert bucket.waits[USER].shed == 1
+
+
+def test_user_call_is_shed_past_the_request_deadline():
+    async def run():
+        bucket = PriorityBucket("openai", rate_per_second=1.0, capacity=1, max_wait=10.0)
+        await bucket.acquire(priority=USER)
+        with deadline_scope(0.8):
+            with pytest.raises(BudgetExhausted):
+                await bucket.acquire(priority=USER)
+
+    asyncio.run(run())
+
+
+def test_try_acquire_leaves_the_reserve():
+    async def run():
+        bucket = PriorityBucket("test", rate_per_second=0.001, capacity=4, reserve=0.25)
+        granted = [bucket.try_acquire() for _ in range(4)]
+        # A user call may still spend the reserved token
+        await asyncio.wait_for(bucket.acquire(priority=USER), timeout=0.1)
+        return granted
+
+    assert asyncio.run(run()) == [True, True, True, False]
@@ -0,0 +1,188 @@
+import asyncio
+import sqlite3
+import time
+
+import fakeredis.aioredis
+import pytest
+
+import cache_backends
+from cache_backends import DiskBackend, MemoryBackend, RedisBackend, create_backend
+
+LIMITS = {"max_entries": 100, "max_bytes": 1024 * 1024}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class BrokenRedis:
+    """Async client whose every command fails like an unreachable server"""
+
+    def __getattr__(self, name):
+        async def command(*args, **kwargs):
+            raise ConnectionError("connection refused")
+        return command
+
+
+@pytest.fixture
+def disk(tmp_path):
+    backend = DiskBackend("test", 60, str(tmp_path / "test.sqlite3"), **LIMITS)
+    yield backend
+    run(backend.close())
+
+
+@pytest.fixture
+def redis():
+    return RedisBackend("test", 60, "redis://fake", **LIMITS, client=fakeredis.aioredis.FakeRedis())
+
+
+@pytest.fixture(params=["memory", "disk", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend("test", 60, **LIMITS)
+    if request.param == "disk":
+        return DiskBackend("test", 60, str(tmp_path / "test.sqlite3"), **LIMITS)
+    return RedisBackend("test", 60, "redis://fake", **LIMITS, client=fakeredis.aioredis.FakeRedis())
+
+
+def test_get_set_delete(backend):
+    async def scenario():
+        assert await backend.get("AAPL") is None
+        assert await backend.set("AAPL", {"bars": [1, 2, 3], "name": "Apple"})
+        entry = await backend.get("AAPL")
+        assert entry.data == {"bars": [1, 2, 3], "name": "Apple"}
+        assert entry.expires_at == pytest.approx(entry.timestamp + 60)
+        assert await backend.peek_expiry("AAPL") == pytest.approx(time.time() + 60, abs=2)
+        await backend.delete("AAPL")
+        assert await backend.get("AAPL") is None
+        stats = await backend.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 2)
+
+    run(scenario())
+
+
+def test_clear(backend):
+    async def scenario():
+        await backend.set("a", 1)
+        await backend.set("b", 2)
+        await backend.clear()
+        assert await backend.get("a") is None
+        assert await backend.get("b") is None
+
+    run(scenario())
+
+
+def test_disk_entries_expire(tmp_path):
+    backend = DiskBackend("test", 0.05, str(tmp_path / "test.sqlite3"), **LIMITS)
+
+    async def scenario():
+        await backend.set("AAPL", {"price": 1})
+        assert await backend.get("AAPL") is not None
+        await asyncio.sleep(0.1)
+        assert await backend.get("AAPL") is None
+        assert await backend.sweep() == 1
+        assert await backend.peek_expiry("AAPL") is None
+
+    run(scenario())
+    run(backend.close())
+
+
+def test_redis_ttl_is_set_on_server(redis):
+    async def scenario():
+        await redis.set("AAPL", {"price": 1})
+        assert 0 < await redis._client.pttl("scout:test:AAPL") <= 60_000
+
+    run(scenario())
+
+
+def test_disk_evicts_oldest_beyond_max_bytes(tmp_path):
+    backend = DiskBackend("test", 60, str(tmp_path / "test.sqlite3"), max_entries=100, max_bytes=250)
+
+    async def scenario():
+        for i in range(5):
+            await backend.set(f"k{i}", "x" * 90)
+        stats = await backend.stats()
+        assert stats["bytes"] <= 250
+        assert stats["evictions"] == 3
+        assert await backend.get("k0") is None
+        assert (await backend.get("k4")).data == "x" * 90
+        # A value that could never fit is refused rather than wiping the store
+        assert not await backend.set("huge", "x" * 300)
+        assert await backend.get("k4") is not None
+
+    run(scenario())
+    run(backend.close())
+
+
+def test_disk_evicts_oldest_beyond_max_entries(tmp_path):
+    backend = DiskBackend("test", 60, str(tmp_path / "test.sqlite3"), max_entries=2, max_bytes=1024)
+
+    async def scenario():
+        for i in range(4):
+            await backend.set(f"k{i}", i)
+        assert await backend.sweep() == 2
+        assert await backend.get("k1") is None
+        assert (await backend.get("k3")).data == 3
+
+    run(scenario())
+    run(backend.close())
+
+
+def test_redis_outage_falls_back_to_memory():
+    backend = RedisBackend("test", 60, "redis://fake", **LIMITS, client=BrokenRedis())
+
+    async def scenario():
+        assert await backend.set("AAPL", {"price": 1})
+        assert (await backend.get("AAPL")).data == {"price": 1}
+        assert await backend.get("MSFT") is None
+        assert await backend.peek_expiry("AAPL") == pytest.approx(time.time() + 60, abs=2)
+        stats = await backend.stats()
+        assert stats["errors"] == 3
+        assert stats["fallback_entries"] == 1
+
+    run(scenario())
+
+
+def test_redis_recovery_prefers_server(redis):
+    broken = BrokenRedis()
+    server = redis._client
+
+    async def scenario():
+        redis._client = broken
+        await redis.set("AAPL", "written during outage")
+        redis._client = server
+        assert (await redis.get("AAPL")).data == "written during outage"
+        await redis.set("AAPL", "fresh")
+        assert (await redis.get("AAPL")).data == "fresh"
+        assert (await redis.stats())["fallback_entries"] == 0
+
+    run(scenario())
+
+
+def test_disk_errors_fall_back_to_memory(disk, monkeypatch):
+    def fail(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(disk, "_execute", fail)
+    monkeypatch.setattr(disk, "_write", fail)
+
+    async def scenario():
+        assert await disk.set("AAPL", [1, 2])
+        assert (await disk.get("AAPL")).data == [1, 2]
+        assert await disk.peek_expiry("AAPL") is not None
+        assert disk.errors == 2
+
+    run(scenario())
+
+
+def test_create_backend_falls_back_to_memory(tmp_path, monkeypatch):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    monkeypatch.setenv("CACHE_DIR", str(blocker))
+    assert isinstance(create_backend("disk", "news", 60, LIMITS), MemoryBackend)
+
+    monkeypatch.setattr(cache_backends, "redis_asyncio", None)
+    assert isinstance(create_backend("redis", "news", 60, LIMITS), MemoryBackend)
+
+    with pytest.raises(ValueError):
+        create_backend("memcached", "news", 60, LIMITS)
@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from middleware import CacheControlMiddleware
+
+PAYLOAD = {"data": ["x" * 40] * 100}
+
+
+async def plain(request):
+    return JSONResponse(PAYLOAD)
+
+
+async def varies(request):
+    return JSONResponse(PAYLOAD, headers={"Vary": "Origin, accept-encoding"})
+
+
+app = CacheControlMiddleware(
+    Starlette(routes=[Route("/news/plain", plain), Route("/news/varies", varies)]),
+    cache_seconds={"/news/": (60, 60)},
+)
+
+
+def get(path, accept_encoding):
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, headers={"Accept-Encoding": accept_encoding})
+    return asyncio.run(request())
+
+
+def test_vary_added_once():
+    for accept_encoding in ("gzip", "identity"):
+        response = get("/news/plain", accept_encoding)
+        assert response.headers.get_list("vary") == ["Accept-Encoding"]
+
+
+def test_existing_vary_not_duplicated():
+    for accept_encoding in ("gzip", "identity"):
+        response = get("/news/varies", accept_encoding)
+        assert response.headers.get_list("vary") == ["Origin, accept-encoding"]
+        assert response.json() == PAYLOAD
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from news_index import NewsIndex, NewsIngester, parse_published
+from upstream import TokenBucket
+
+PAGE_LIMIT = 2
+
+
+def article(n, published, symbols=("AAA",)):
+    return {
+        "uuid": f"a{n}",
+        "url": f"https://news.example.com/{n}",
+        "published_at": datetime.fromtimestamp(published, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+        "entities": [{"symbol": symbol, "match_score": 10.0} for symbol in symbols],
+    }
+
+
+class FakeMarketAux:
+    """news/all over a fixed article list: symbols, published_after, oldest first, paged"""
+
+    def __init__(self, articles):
+        self.articles = articles
+        self.calls = 0
+
+    async def __call__(self, params):
+        self.calls += 1
+        after = datetime.fromisoformat(params["published_after"]).replace(tzinfo=timezone.utc).timestamp()
+        symbols = set(params["symbols"].split(","))
+        matching = [
+            a for a in self.articles
+            if parse_published(a["published_at"]) >= after and symbols & {e["symbol"] for e in a["entities"]}
+        ]
+        start = (params["page"] - 1) * PAGE_LIMIT
+        data = matching[start:start + PAGE_LIMIT]
+        return {"meta": {"returned": len(data), "limit": PAGE_LIMIT}, "data": data}
+
+
+def ingester(fetch, max_pages, symbols_per_request=100, snapshot_path=None):
+    return NewsIngester(
+        NewsIndex(), fetch, ["AAA", "BBB"], TokenBucket("test", 1000.0, 100),
+        interval=60, symbols_per_request=symbols_per_request, max_pages=max_pages, min_articles=1,
+        snapshot_path=snapshot_path,
+    )
+
+
+def test_chunk_cut_short_by_max_pages_is_not_served_until_caught_up():
+    now = int(time.time())
+    fetch = FakeMarketAux([article(n, now - 3600 + n * 60) for n in range(7)])
+    news = ingester(fetch, max_pages=2)
+
+    asyncio.run(news.ingest())
+    assert len(news.index) == 4
+    assert news.behind == {0}
+    assert not news.covers("AAA")
+
+    # Each pass resumes from the newest article already indexed
+    passes = 1
+    while news.behind and passes < 5:
+        asyncio.run(news.ingest())
+        passes += 1
+    assert len(news.index) == 7
+    assert news.behind == set()
+    assert news.covers("AAA")
+    assert news.stats()["synced_symbols"] == 2
+
+
+def test_chunk_that_reaches_last_page_is_served():
+    now = int(time.time())
+    fetch = FakeMarketAux([article(n, now - 3600 + n * 60) for n in range(3)])
+    news = ingester(fetch, max_pages=3)
+
+    asyncio.run(news.ingest())
+    assert fetch.calls == 2
+    assert news.covers("AAA")
+    # Synced, but nothing indexed for it
+    assert not news.covers("BBB")
+
+
+def test_interval_fits_the_daily_allowance():
+    universe = [f"S{n:03d}" for n in range(418)]
+    news = NewsIngester(
+        NewsIndex(), FakeMarketAux([]), universe, TokenBucket.per_day("test", 60),
+        interval=3600, symbols_per_request=100, max_pages=3,
+    )
+    assert news.calls_per_pass == 15
+    # 60 calls a day at up to 15 per pass: a pass every 6 hours
+    assert news.interval == pytest.approx(6 * 3600)
+
+
+def test_restart_resumes_each_chunk_from_its_own_watermark(tmp_path):
+    now = int(time.time())
+    articles = [article(n, now - 3600 + n * 60, ("BBB",)) for n in range(5)]
+    # Newer than BBB's backlog, and indexed for BBB too, by AAA's chunk
+    articles.append(article(5, now - 60, ("AAA", "BBB")))
+    fetch = FakeMarketAux(articles)
+    path = str(tmp_path / "news_index.snapshot")
+
+    news = ingester(fetch, max_pages=2, symbols_per_request=1, snapshot_path=path)
+    asyncio.run(news.ingest())
+    assert news.behind == {1}
+    news.save()
+
+    restarted = ingester(fetch, max_pages=2, symbols_per_request=1, snapshot_path=path)
+    restarted.load()
+    assert restarted.published_after(1) == news.watermarks[1]
+    asyncio.run(restarted.ingest())
+    assert restarted.behind == set()
+    assert len(restarted.index) == 6
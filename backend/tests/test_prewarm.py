@@ -0,0 +1,38 @@
+import asyncio
+
+from prewarm import DemandTracker, PrewarmScheduler, WarmTarget
+from upstream import TokenBucket
+
+
+class EmptyCache:
+    async def peek_expiry(self, key):
+        return None
+
+
+def test_refresh_many_missed_symbols_count_as_failures():
+    refreshed = []
+
+    async def refresh_many(symbols, charge):
+        await charge()
+        refreshed.append(symbols)
+        return [symbol for symbol in symbols if symbol != "AAPL"]
+
+    async def refresh(symbol):
+        raise AssertionError("refresh_many targets refresh in batches")
+
+    target = WarmTarget(
+        "search", EmptyCache(), lambda symbol: symbol, refresh,
+        TokenBucket("test", 100.0, 10), refresh_many=refresh_many, batch_size=8,
+    )
+    scheduler = PrewarmScheduler([target], ["AAPL", "MSFT", "NVDA"], DemandTracker(), interval=60.0)
+
+    async def run():
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert refreshed == [["AAPL", "MSFT", "NVDA"]]
+    assert (target.refreshed, target.failures) == (1, 2)
+    # Missed symbols wait out retry_after like any failed refresh
+    assert asyncio.run(scheduler.due(target)) == []
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from budget import BudgetExhausted
+from cache_backends import MemoryBackend
+from sentiment import (
+    SENTIMENT_ERROR_MESSAGE,
+    LLMGate,
+    SentimentBatcher,
+    SentimentMemo,
+    analyze_with_memo,
+)
+
+HEADLINES = ["Acme beats estimates", "Acme raises guidance"]
+
+
+class Completions:
+    """client.chat.completions stand-in that fails every call"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        raise ConnectionError("connection reset")
+
+
+class Client:
+    def __init__(self):
+        self.completions = Completions()
+        self.chat = self
+
+
+class Budget:
+    """LLMGate budget that sheds every call"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        raise BudgetExhausted("openai", 30)
+
+
+def memo(name):
+    return MemoryBackend(name, 60, 100, 1024 * 1024)
+
+
+def test_api_error_returns_error_message_and_is_not_memoized():
+    sentiment_memo = SentimentMemo(memo("sentiment"))
+    client = Client()
+    result = asyncio.run(analyze_with_memo(client, LLMGate(2), sentiment_memo, "Acme", HEADLINES))
+    assert result == SENTIMENT_ERROR_MESSAGE
+    assert asyncio.run(sentiment_memo.get_set("Acme", HEADLINES)) is None
+
+
+def test_budget_shed_propagates_and_is_not_memoized():
+    sentiment_memo = SentimentMemo(memo("sentiment"))
+    client, budget = Client(), Budget()
+    with pytest.raises(BudgetExhausted):
+        asyncio.run(analyze_with_memo(client, LLMGate(2, budget=budget), sentiment_memo, "Acme", HEADLINES))
+    assert client.completions.calls == 0
+    assert asyncio.run(sentiment_memo.get_set("Acme", HEADLINES)) is None
+
+
+def test_batcher_does_not_fall_back_after_a_shed():
+    client, budget = Client(), Budget()
+    batcher = SentimentBatcher(
+        client, LLMGate(2, budget=budget), SentimentMemo(memo("sentiment")),
+        max_companies=2,
+    )
+    items = {f"Company {n}": HEADLINES for n in range(4)}
+    with pytest.raises(BudgetExhausted):
+        asyncio.run(batcher.analyze_many(items))
+    # One attempt per group, no single-company retries
+    assert budget.calls == 2
+    assert batcher.fallbacks == 0
@@ -0,0 +1,83 @@
+from symbols import SymbolIndex, load_aliases
+
+NAMES = {
+    "APP": "Zeta Labs",
+    "APPN": "Northwind",
+    "AAPL": "Apple Inc.",
+    "AMAT": "Applied Materials",
+    "BAPP": "Big Apple Bakery",
+    "META": "Meta",
+    "CSCO": "Cisco Systems",
+    "XOM": "Exxon Mobil",
+    "SNAP": "Snap",
+    "KO": "Coca-Cola",
+    "NVDA": "Nvidia",
+}
+
+
+def write_csv(tmp_path, cells):
+    path = tmp_path / "companies.csv"
+    path.write_text(",".join(cells) + "\n")
+    return str(path)
+
+
+def test_ranking_order():
+    index = SymbolIndex(NAMES)
+    results = index.suggest("app")
+    assert [(r["symbol"], r["match"]) for r in results] == [
+        ("APP", "exact"),
+        ("APPN", "symbol"),
+        # Shorter name first
+        ("AAPL", "name"),
+        ("AMAT", "name"),
+        ("BAPP", "word"),
+    ]
+
+
+def test_fuzzy_only_without_prefix_hits():
+    index = SymbolIndex(NAMES)
+    results = index.suggest("nvidai")
+    assert [(r["symbol"], r["match"]) for r in results] == [("NVDA", "fuzzy")]
+    assert 0.3 <= results[0]["score"] < 1.0
+
+
+def test_short_queries_skip_fuzzy_matching():
+    index = SymbolIndex(NAMES)
+    calls = []
+    fuzzy = index.fuzzy
+    index.fuzzy = lambda query, limit: calls.append(query) or fuzzy(query, limit)
+
+    assert index.suggest("qz") == []
+    assert index.suggest(" QZ ") == []
+    assert calls == []
+    index.suggest("qzx")
+    assert calls == ["qzx"]
+
+
+def test_load_aliases_maps_csv_names(tmp_path):
+    path = write_csv(tmp_path, [
+        "Meta Platforms",  # starts with the canonical name's words
+        "Cisco",  # the one canonical name starting with it
+        "ExxonMobil",  # same letters
+        '"Coca-Cola Company (The)"',  # same words once suffixes are dropped
+        "Apple Inc.",  # the canonical name itself
+        "Snap-on",  # not Snap
+        "Zoetis",  # not tracked
+    ])
+    assert load_aliases(path, NAMES) == {
+        "META": ["Meta Platforms"],
+        "CSCO": ["Cisco"],
+        "XOM": ["ExxonMobil"],
+        "KO": ["Coca-Cola Company (The)"],
+    }
+
+
+def test_load_aliases_missing_file(tmp_path):
+    assert load_aliases(str(tmp_path / "missing.csv"), NAMES) == {}
+
+
+def test_aliases_are_searchable(tmp_path):
+    index = SymbolIndex(NAMES, load_aliases(write_csv(tmp_path, ["Meta Platforms"]), NAMES))
+    assert [r["symbol"] for r in index.suggest("meta platf")] == ["META"]
+    # Results show the canonical name
+    assert index.suggest("meta platf")[0]["name"] == "Meta"
@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+import pytest
+
+from deadline import DEADLINE_MARGIN_SECONDS, DeadlineExceeded, deadline_scope
+from upstream import HostConfig, UpstreamPool
+
+
+class SlowBudget:
+    """UpstreamBudget stand-in whose every acquire waits ``delay`` seconds"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def acquire(self, name, cost=1.0):
+        await asyncio.sleep(self.delay)
+
+
+def pool(budget):
+    sent = []
+
+    def handler(request):
+        sent.append(request.extensions["timeout"])
+        return httpx.Response(200, json={"ok": True})
+
+    config = HostConfig("test", timeout=10.0, http2=False)
+    config.build_client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return UpstreamPool({"test": config}, budget=budget), sent
+
+
+def request_within(upstreams, seconds):
+    async def run():
+        with deadline_scope(seconds):
+            return await upstreams.get("test", "http://test/")
+    return asyncio.run(run())
+
+
+def test_timeout_is_capped_after_the_budget_wait():
+    upstreams, sent = pool(SlowBudget(0.3))
+    request_within(upstreams, 1.0)
+    # 1.0s deadline - 0.3s in the budget queue - margin, not 1.0s - margin
+    assert sent[0]["read"] <= 1.0 - 0.3 - DEADLINE_MARGIN_SECONDS + 0.05
+
+
+def test_deadline_spent_in_the_budget_queue_fails_fast():
+    upstreams, sent = pool(SlowBudget(0.3))
+    with pytest.raises(DeadlineExceeded):
+        request_within(upstreams, DEADLINE_MARGIN_SECONDS + 0.2)
+    assert sent == []
@@ -0,0 +1,345 @@
+import asyncio
+import importlib.util
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+from breaker import CircuitBreaker, CircuitOpen
+from deadline import DeadlineExceeded, call_timeout, remaining
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class HostConfig:
+    """Connection-pool and timeout settings for one upstream host.
+
+    Every field can be overridden with UPSTREAM_<NAME>_<FIELD> environment
+    variables, e.g. UPSTREAM_FINNHUB_MAX_CONNECTIONS=20.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0,
+        hedge: bool = False,
+    ):
+        prefix = f"UPSTREAM_{name.upper()}_"
+        self.name = name
+        self.timeout = env_float(prefix + "TIMEOUT", timeout)
+        self.connect_timeout = env_float(prefix + "CONNECT_TIMEOUT", connect_timeout)
+        self.max_connections = env_int(prefix + "MAX_CONNECTIONS", max_connections)
+        self.max_keepalive = env_int(prefix + "MAX_KEEPALIVE", max_keepalive)
+        self.keepalive_expiry = env_float(prefix + "KEEPALIVE_EXPIRY", keepalive_expiry)
+        self.http2 = env_bool(prefix + "HTTP2", http2) and HTTP2_AVAILABLE
+        self.breaker_failures = env_int(prefix + "BREAKER_FAILURES", breaker_failures)
+        self.breaker_reset = env_float(prefix + "BREAKER_RESET", breaker_reset)
+        self.hedge = env_bool(prefix + "HEDGE", hedge)
+
+    def build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            http2=self.http2,
+        )
+
+
+# Hedging needs this many recent latencies before it trusts the p95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+
+
+class HostStats:
+    __slots__ = ("requests", "errors", "in_flight", "max_in_flight",
+                 "queue_wait_total", "queue_wait_max", "latency_total",
+                 "latencies", "hedges", "hedge_wins")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.latency_total = 0.0
+        self.latencies: Deque[float] = deque(maxlen=200)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class UpstreamPool:
+    """Application-scoped httpx clients, one per upstream host.
+
+    Clients are created in the app lifespan and reused for every request, so
+    TCP/TLS connections stay warm between cache misses. With a ``budget``
+    (see budget.UpstreamBudget) each request first spends one token of its
+    host's rate budget. A per-host CircuitBreaker fails calls fast while
+    the host keeps timing out or returning 5xx.
+
+    Timeouts are capped by what is left of the current request's deadline
+    (deadline.py) once the budget has granted the call.
+    GETs to hosts with ``hedge`` set send a second attempt once the first
+    has taken longer than the host's recent p95 latency, if the budget has
+    a spare token and the deadline leaves room, and use whichever answers
+    first.
+    """
+
+    def __init__(self, hosts: Dict[str, HostConfig], budget: Optional[Any] = None):
+        self.hosts = hosts
+        self.budget = budget
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, HostStats] = {name: HostStats() for name in hosts}
+        self.breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name, config.breaker_failures, config.breaker_reset)
+            for name, config in hosts.items()
+        }
+
+    async def start(self) -> None:
+        for name, config in self.hosts.items():
+            if name not in self._clients:
+                self._clients[name] = config.build_client()
+        print(f"Upstream clients started: {', '.join(self._clients)}")
+
+    async def close(self) -> None:
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def client(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None:
+            # Outside the lifespan (scripts, tests) build the client on demand
+            client = self.hosts[name].build_client()
+            self._clients[name] = client
+        return client
+
+    async def request(self, name: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a request on the named host's pooled client, recording pool stats"""
+        config = self.hosts[name]
+        kwargs["timeout"] = kwargs.get("timeout") or config.timeout
+        # Fail fast before spending budget; _send caps the timeout after the wait
+        call_timeout(kwargs["timeout"])
+        if method == "GET" and config.hedge:
+            return await self._hedged(name, method, url, kwargs)
+        return await self._send(name, method, url, kwargs)
+
+    async def _hedged(self, name: str, method: str, url: str, kwargs: Dict[str, Any]) -> httpx.Response:
+        stats = self._stats[name]
+        delay = stats.p95()
+        first = asyncio.ensure_future(self._send(name, method, url, kwargs))
+        second: Optional[asyncio.Future] = None
+        try:
+            if delay is None:
+                return await first
+            done, _ = await asyncio.wait({first}, timeout=max(delay, HEDGE_MIN_DELAY))
+            left = remaining()
+            if done or (left is not None and left < 2 * delay):
+                return await first
+            if self.budget is not None and not self.budget.try_acquire(name):
+                return await first
+            try:
+                self.breakers[name].before_call()
+            except CircuitOpen:
+                return await first
+            stats.hedges += 1
+            second = asyncio.ensure_future(self._send(name, method, url, kwargs, spent=True))
+            pending = {first, second}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [attempt for attempt in done if attempt.exception() is None]
+                if winners or not pending:
+                    attempt = winners[0] if winners else done.pop()
+                    if attempt is second:
+                        stats.hedge_wins += 1
+                    return attempt.result()
+        finally:
+            for attempt in (first, second):
+                if attempt is not None and not attempt.done():
+                    attempt.cancel()
+
+    async def _send(self, name: str, method: str, url: str, kwargs: Dict[str, Any],
+                    spent: bool = False) -> httpx.Response:
+        """One attempt; ``spent`` when the breaker and budget were already checked"""
+        kwargs = dict(kwargs)
+        breaker = self.breakers[name]
+        if not spent:
+            breaker.before_call()
+            if self.budget is not None:
+                try:
+                    await self.budget.acquire(name)
+                except BaseException:
+                    breaker.release()
+                    raise
+        # Capped by what is left of the deadline after any wait for the budget
+        try:
+            timeout = call_timeout(kwargs["timeout"])
+        except DeadlineExceeded:
+            breaker.release()
+            raise
+        connect_timeout = self.hosts[name].connect_timeout
+        kwargs["timeout"] = httpx.Timeout(timeout, connect=min(connect_timeout, timeout))
+        stats = self._stats[name]
+        started = time.perf_counter()
+        first_event: Dict[str, float] = {}
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            # The first connection event marks the end of waiting for a pool slot
+            if "started" in event_name and "wait" not in first_event:
+                first_event["wait"] = time.perf_counter() - started
+
+        extensions = dict(kwargs.pop("extensions", None) or {})
+        extensions["trace"] = trace
+
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        try:
+            response = await self.client(name).request(method, url, extensions=extensions, **kwargs)
+        except httpx.TransportError:
+            stats.errors += 1
+            breaker.record_failure()
+            raise
+        except BaseException as e:
+            if isinstance(e, Exception):
+                stats.errors += 1
+            breaker.release()
+            raise
+        else:
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+                stats.latencies.append(time.perf_counter() - started)
+            return response
+        finally:
+            stats.in_flight -= 1
+            stats.latency_total += time.perf_counter() - started
+            wait = first_event.get("wait", 0.0)
+            stats.queue_wait_total += wait
+            stats.queue_wait_max = max(stats.queue_wait_max, wait)
+
+    async def get(self, name: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request(name, "GET", url, **kwargs)
+
+    def _pool_connections(self, name: str) -> Optional[Dict[str, int]]:
+        client = self._clients.get(name)
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return None
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    def stats(self) -> Dict[str, Any]:
+        hosts = {}
+        for name, config in self.hosts.items():
+            stats = self._stats[name]
+            completed = max(stats.requests - stats.in_flight, 1)
+            hosts[name] = {
+                "http2": config.http2,
+                "timeout": config.timeout,
+                "max_connections": config.max_connections,
+                "max_keepalive": config.max_keepalive,
+                "connections": self._pool_connections(name),
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "in_flight": stats.in_flight,
+                "max_in_flight": stats.max_in_flight,
+                "avg_queue_wait_ms": round(stats.queue_wait_total / completed * 1000, 3),
+                "max_queue_wait_ms": round(stats.queue_wait_max * 1000, 3),
+                "avg_latency_ms": round(stats.latency_total / completed * 1000, 3),
+                "p95_latency_ms": round(p95 * 1000, 3) if (p95 := stats.p95()) is not None else None,
+                "hedge": config.hedge,
+                "hedges": stats.hedges,
+                "hedge_wins": stats.hedge_wins,
+                "breaker": self.breakers[name].stats(),
+            }
+        return hosts
+
+
+class TokenBucket:
+    """Token bucket rate budget for an upstream provider"""
+
+    def __init__(self, name: str, rate_per_second: float, capacity: float):
+        self.name = name
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.granted = 0
+
+    @classmethod
+    def per_minute(cls, name: str, calls: float, burst: Optional[float] = None) -> "TokenBucket":
+        return cls(name, calls / 60.0, burst if burst is not None else calls)
+
+    @classmethod
+    def per_day(cls, name: str, calls: float, burst: float = 5) -> "TokenBucket":
+        return cls(name, calls / 86400.0, burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    async def acquire(self, cost: float = 1.0) -> None:
+        """Wait until cost tokens are available, then take them"""
+        async with self._lock:
+            self._refill()
+            while self.tokens < cost:
+                await asyncio.sleep((cost - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= cost
+            self.granted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_minute": round(self.rate * 60, 3),
+            "capacity": self.capacity,
+            "available": round(self.available(), 3),
+            "granted": self.granted,
+        }
@@ -1,8 +1,5 @@
 from fastapi import HTTPException, Request
 from datetime import datetime, timedelta
-from starlette.middleware.base import BaseHTTPMiddleware
-import asyncio
-from fastapi.responses import JSONResponse 
 from typing import Optional, Tuple
 
 VALID_SYMBOLS = {
@@ -492,6 +489,11 @@ def validate_symbol(symbol: str) -> str:
 
 VALID_TIMEFRAMES = {'1Min', '5Min', '15Min', '1Hour', '1Day', '1Week'}
 
+# Longest window per intraday timeframe: ranges are fetched as ~10000-bar
+# shards (6 days of 1Min, 34 of 5Min), and about 30 shards is what fits in
+# the request timeout. Coarser timeframes cover the full 10 years.
+MAX_RANGE_DAYS = {'1Min': 180, '5Min': 900}
+
 def validate_stocks_request(
     request: Request,
     symbol: str,
@@ -525,9 +527,61 @@ def validate_stocks_request(
             status_code=400,
             detail=f"Invalid timeframe. Must be one of: {', '.join(VALID_TIMEFRAMES)}"
         )
+
+    max_days = MAX_RANGE_DAYS.get(timeframe)
+    if max_days is not None and (end_date - start_date).days >= max_days:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range too long for {timeframe} bars (max {max_days} days)"
+        )
     
     return symbol, start, end, timeframe
 
+VALID_BAR_FIELDS = ('o', 'h', 'l', 'c', 'v', 'n', 'vw')
+VALID_SESSIONS = {'all', 'regular'}
+MAX_POINTS_RANGE = (10, 10000)
+
+def validate_bar_options(
+    fields: Optional[str],
+    max_points: Optional[int],
+    session: Optional[str]
+) -> tuple:
+    """Validate /stocks projection, downsampling and session options"""
+
+    if fields is not None:
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+        invalid = [field for field in requested if field != 't' and field not in VALID_BAR_FIELDS]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid fields: {', '.join(invalid)}. Must be from: t, {', '.join(VALID_BAR_FIELDS)}"
+            )
+        # Keep Alpaca's field order so cache keys don't depend on the client's order
+        fields = tuple(field for field in VALID_BAR_FIELDS if field in requested)
+
+    if max_points is not None and not MAX_POINTS_RANGE[0] <= max_points <= MAX_POINTS_RANGE[1]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"max_points must be between {MAX_POINTS_RANGE[0]} and {MAX_POINTS_RANGE[1]}"
+        )
+
+    session = (session or 'all').strip().lower()
+    if session not in VALID_SESSIONS:
+        raise HTTPException(status_code=400, detail="Invalid session. Must be 'all' or 'regular'")
+
+    return fields, max_points, session
+
+VALID_STREAM_FORMATS = {'ndjson', 'sse'}
+
+def validate_stream_format(stream: Optional[str]) -> Optional[str]:
+    """None for a plain JSON response, otherwise the streaming format"""
+    if stream is None:
+        return None
+    stream = stream.strip().lower()
+    if stream not in VALID_STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid stream format. Must be 'ndjson' or 'sse'")
+    return stream
+
 
 def validate_news_request(
     request: Request,
@@ -577,15 +631,24 @@ def validate_search_request(request: Request, company: str) -> str:
     return company
 
 
-class TimeoutMiddleware(BaseHTTPMiddleware):
-    """Middleware to enforce request timeout"""
-    
-    async def dispatch(self, request: Request, call_next):
-        try:
-            # 30 second timeout for all requests
-            return await asyncio.wait_for(call_next(request), timeout=30.0)
-        except asyncio.TimeoutError:
-            return JSONResponse(
-                status_code=504,
-                content={"detail": "Request timeout"}
-            )
\ No newline at end of file
+MAX_SUGGEST_QUERY_LENGTH = 64
+SUGGEST_LIMIT_RANGE = (1, 25)
+
+def validate_suggest_request(q: str, limit: int) -> tuple:
+    """Validate /symbols/suggest query and result limit"""
+
+    q = q.strip()
+
+    if not q:
+        raise HTTPException(status_code=400, detail="Query required")
+
+    if len(q) > MAX_SUGGEST_QUERY_LENGTH:
+        raise HTTPException(status_code=400, detail="Query too long")
+
+    if not SUGGEST_LIMIT_RANGE[0] <= limit <= SUGGEST_LIMIT_RANGE[1]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit must be between {SUGGEST_LIMIT_RANGE[0]} and {SUGGEST_LIMIT_RANGE[1]}"
+        )
+
+    return q, limit
@@ -4,18 +4,22 @@ import { LineChart, Line, XAxis, YAxis, Tooltip, ResponsiveContainer, CartesianG
 import { addFavorite, removeFavorite, checkIsFavorited } from './supabaseFavorites';
 
 const TIME_PERIODS = {
-  '1D': { days: 1, timeframe: '5Min', label: '1 Day' },
-  '5D': { days: 5, timeframe: '15Min', label: '5 Days' },
+  '1D': { days: 1, timeframe: '5Min', label: '1 Day', session: 'regular' },
+  '5D': { days: 5, timeframe: '15Min', label: '5 Days', session: 'regular' },
   '1M': { days: 30, timeframe: '1Hour', label: '1 Month' },
   '6M': { days: 180, timeframe: '1Day', label: '6 Months' },
   '1Y': { days: 365, timeframe: '1Day', label: '1 Year' },
   '5Y': { days: 1825, timeframe: '1Week', label: '5 Years' }
 };
 
-const fetchAlpacaStockData = async (symbol, start, end, timeframe) => {
+// The chart only plots close prices; the backend trims and downsamples bars
+const MAX_CHART_POINTS = 500;
+
+const fetchAlpacaStockData = async (symbol, start, end, timeframe, session = 'all') => {
   try {
-    const response = await fetch(`https://scoutnew-production.up.railway.app/stocks/${symbol}?start=${start}&end=${end}&timeframe=${timeframe}`);
-    /* const response = await fetch(`http://127.0.0.1:8000/stocks/${symbol}?start=${start}&end=${end}&timeframe=${timeframe}`); */
+    const options = `fields=c&max_points=${MAX_CHART_POINTS}&session=${session}`;
+    const response = await fetch(`https://scoutnew-production.up.railway.app/stocks/${symbol}?start=${start}&end=${end}&timeframe=${timeframe}&${options}`);
+    /* const response = await fetch(`http://127.0.0.1:8000/stocks/${symbol}?start=${start}&end=${end}&timeframe=${timeframe}&${options}`); */
     
     if (!response.ok) {
       const errorText = await response.text();
@@ -50,14 +54,19 @@ const isMarketOpen = (easternTime) => {
   return true;
 };
 
-const filterToMarketHours = (data) => {
+const TIMEFRAME_MINUTES = { '1Min': 1, '5Min': 5, '15Min': 15, '1Hour': 60 };
+const MARKET_OPEN_MINUTE = 9 * 60 + 30;
+const MARKET_CLOSE_MINUTE = 16 * 60;
+
+// Keep bars that overlap 09:30-16:00 ET, so an hourly bar starting at 09:00 stays
+const filterToMarketHours = (data, timeframe) => {
+  const duration = TIMEFRAME_MINUTES[timeframe] || 1;
   return data.filter(point => {
     const date = new Date(point.t);
     const easternTime = new Date(date.toLocaleString("en-US", {timeZone: "America/New_York"}));
-    const hour = easternTime.getHours();
-    const minute = easternTime.getMinutes();
+    const minuteOfDay = easternTime.getHours() * 60 + easternTime.getMinutes();
     
-    return (hour > 9 || (hour === 9 && minute >= 30)) && (hour < 16 || (hour === 16 && minute === 0));
+    return minuteOfDay < MARKET_CLOSE_MINUTE && minuteOfDay + duration > MARKET_OPEN_MINUTE;
   });
 };
 
@@ -85,7 +94,7 @@ const TimePeriodToggle = ({ selectedPeriod, onPeriodChange, loading }) => {
 };
 
 const StockChart = ({ data, title, period, selectedPeriod, onPeriodChange, loading, previousClose, logo, industry, symbol, companyName }) => {
-  const filteredData = (period === '1D' || period === '5D') ? filterToMarketHours(data) : data;
+  const filteredData = (period === '1D' || period === '5D') ? filterToMarketHours(data, TIME_PERIODS[period].timeframe) : data;
 
   const calculateYAxisDomain = () => {
     if (!filteredData || filteredData.length === 0) return ['dataMin - 5', 'dataMax + 5'];
@@ -518,7 +527,7 @@ const StockDashboard = ({ symbol = 'AAPL', companyName = 'Apple Inc.', className
         // console.log(`Trading days range: ${startDate.toDateString()} to ${endDate.toDateString()}`);
       }
       
-      const data = await fetchAlpacaStockData(symbol, startDateStr, endDateStr, config.timeframe);
+      const data = await fetchAlpacaStockData(symbol, startDateStr, endDateStr, config.timeframe, config.session);
       setStockData(data);
 
       if (period === '1D') {